@@ -0,0 +1,131 @@
+import asyncio
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_async_db, get_current_user_async, require_dev
+from app.core.config import Settings, get_settings
+from app.core import session_reaper
+from app.core.security import hash_password_async
+from app.core.serialization import FAST_JSON, TRANSACTION_PAGE, json_response, row_dicts
+from app.crud import transactions_async, user_async
+from app.crud.transactions import decode_cursor
+from app.models.user import User
+from app.schemas.auth import AuthRefreshRead, LogoutRequest, Token
+from app.schemas.transaction import (TransactionBulkResult, TransactionCreate, TransactionFilter, TransactionPage,
+                                     TransactionRead)
+from app.schemas.user import Principal, UserCreate, UserRead
+"""ASYNC ROUTES
+
+registered ahead of the sync routes in app.main when DB_MODE=async, so they take over the
+same paths. endpoints not listed here keep running on the sync engine in the threadpool
+"""
+
+router = APIRouter()
+
+
+@router.post("/users", response_model=UserRead)
+async def create_user(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = User(
+        email = user_in.email,
+        hashed_password = await hash_password_async(user_in.password),
+        is_active=user_in.is_active,
+        )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+@router.post("/auth/login", response_model=Token)
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(),
+                db: AsyncSession = Depends(get_async_db)):
+    """OAuth2 endpoint"""
+    user = await user_async.authenticate_user(db, email=form_data.username, password=form_data.password)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect Email or Password",
+            headers={"WWW-Authenticate":"Bearer"},
+        )
+    return await user_async.update_auth_session(user=user, db=db, request=request)
+
+@router.get("/me", response_model=UserRead)
+async def get_me(current_user: Principal = Depends(get_current_user_async)) -> Principal:
+    return current_user
+
+@router.get("/protected/ping")
+async def enforce_auth(current_user: Principal = Depends(get_current_user_async)):
+    return {"ok":True}
+
+@router.post("/auth/refresh", response_model=Token)
+async def refresh_auth_session(request: Request, body: AuthRefreshRead,
+                               db: AsyncSession = Depends(get_async_db)) -> Token:
+    token = await user_async.verify_session_refresh(db=db, refresh_token=body.refresh_token, request=request)
+    if token is None:
+        raise HTTPException(status_code=401,
+                            detail="Invalid Refresh Token",
+                            headers={"WWW-Authenticate":"Bearer"})
+    return token
+
+@router.post("/auth/logout")
+async def logout_request(body: LogoutRequest, current_user: Principal = Depends(get_current_user_async),
+                         db: AsyncSession = Depends(get_async_db)) -> dict:
+    result = await user_async.revoke_refresh_session(db=db, refresh_token=body.refresh_token,
+                                                     user_id=current_user.id)
+    if not result:
+        raise HTTPException(status_code=401,
+                            detail="Token Not Found",
+                            headers={"WWW-Authenticate": "bearer"})
+    return {"ok":result}
+
+@router.post("/debug/cleanup-sessions", dependencies=[Depends(require_dev)])
+async def debug_cleanup(current_user: Principal = Depends(get_current_user_async), grace_days: int = 2) -> dict:
+    result = await asyncio.to_thread(session_reaper.reaper, grace_days)
+    return {"deleted": result.deleted, "seconds": result.seconds}
+
+@router.get("/transactions", response_model=TransactionPage)
+async def get_transactions(filters: TransactionFilter = Depends(), cursor: str | None = None, limit: int = 50,
+                           db: AsyncSession = Depends(get_async_db),
+                           current_user: Principal = Depends(get_current_user_async)):
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if after is None:
+            raise HTTPException(status_code=400,
+                                detail="Invalid Cursor")
+    items, next_cursor = await transactions_async.list_transactions(db, user_id=current_user.id, filters=filters,
+                                                                    after=after, limit=limit, rows=FAST_JSON)
+    if FAST_JSON:
+        return json_response(TRANSACTION_PAGE, {"items": row_dicts(items), "next_cursor": next_cursor})
+    return TransactionPage(items=items, next_cursor=next_cursor)
+
+@router.post("/transactions", response_model=TransactionRead)
+async def new_transaction(body: TransactionCreate, db: AsyncSession = Depends(get_async_db),
+                          current_user: Principal = Depends(get_current_user_async)):
+    txn = await transactions_async.create_new_transaction(db, desc=body.desc, amount_cents=body.amount,
+                                                          txn_type=body.txn_type,
+                                                          transaction_date=body.transaction_date,
+                                                          user_id=current_user.id)
+    if txn is None:
+        raise HTTPException(status_code=400,
+                            detail="Incorrect Transaction Data")
+    return txn
+
+@router.post("/transactions/bulk", response_model=TransactionBulkResult)
+async def new_transactions_bulk(body: list[dict[str, Any]], chunk_size: int | None = None,
+                                settings: Settings = Depends(get_settings),
+                                db: AsyncSession = Depends(get_async_db),
+                                current_user: Principal = Depends(get_current_user_async)):
+    return await transactions_async.create_transactions_bulk(
+        db, items=body, user_id=current_user.id,
+        chunk_size=chunk_size or settings.bulk_chunk_size)
+
+@router.delete("/transactions/{txn_id}")
+async def remove_transaction(txn_id: int, db: AsyncSession = Depends(get_async_db),
+                             current_user: Principal = Depends(get_current_user_async)) -> dict:
+    if not await transactions_async.delete_transaction(db, txn_id=txn_id, user_id=current_user.id):
+        raise HTTPException(status_code=404,
+                            detail="Transaction Not Found")
+    return {"ok":True}
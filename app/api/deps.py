@@ -1,26 +1,42 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from sqlalchemy.orm import Session
-from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, Request
 from fastapi.security import OAuth2PasswordBearer
-from app.db.session import SessionLocal
-from app.crud.user import get_user_by_email
+from app.db.session import SessionLocal, ReadSessionLocal, AsyncSessionLocal
+from app.crud.user import get_principal
+from app.crud.user_async import get_principal as get_principal_async
 from app.core.security import decode_access_token
-from app.models.user  import User
+from app.schemas.user import Principal
 from fastapi.exceptions import HTTPException
-from dotenv import dotenv_values
+from app.core.config import Settings, get_settings
 """FAST API DEPENDECIES"""
 
 
-def get_db()->Generator[Session,  None, None]:
-    db=SessionLocal()
+def get_db(request: Request)->Generator[Session,  None, None]:
+    db=SessionLocal(info={"request_state": request.state})
     try:
         yield db
     finally:
         db.close()
 
+def get_read_db(request: Request)->Generator[Session,  None, None]:
+    """reads from the replica when one is configured, the primary for a user who just wrote"""
+    db=ReadSessionLocal(info={"request_state": request.state})
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db()->AsyncGenerator[AsyncSession, None]:
+    """only usable with DB_MODE=async"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme))-> User:
+def get_current_user(request: Request, db: Session = Depends(get_db),
+                     token: str = Depends(oauth2_scheme))-> Principal:
     decoded = decode_access_token(encoded_token=token)
 
     if not decoded:
@@ -29,8 +45,23 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
                             headers={'WWW-Authenticate':'Bearer'}
                             )
    
-    current_user = get_user_by_email(db, email=decoded.sub)
+    current_user = check_principal(get_principal(db, email=decoded.sub))
+    #lets the db sessions of this request tell who wrote, for read-your-writes
+    request.state.principal_id = current_user.id
+    return current_user
+
+async def get_current_user_async(db: AsyncSession = Depends(get_async_db),
+                                 token: str = Depends(oauth2_scheme))-> Principal:
+    decoded = decode_access_token(encoded_token=token)
 
+    if not decoded:
+        raise HTTPException(status_code=401,
+                            detail='Not Authenticated',
+                            headers={'WWW-Authenticate':'Bearer'}
+                            )
+    return check_principal(await get_principal_async(db, email=decoded.sub))
+
+def check_principal(current_user: Principal | None)-> Principal:
     if not current_user:
         raise HTTPException(status_code=401,
                             detail='Credentials No Longer Valid',
@@ -43,6 +74,13 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
                             )
     return current_user 
 
-def dev_access()->bool:
-    dev = True if dotenv_values(".env").get("DEVELOPMENT") == "True" else False
-    return dev
+def dev_access(settings: Settings = Depends(get_settings))->bool:
+    return settings.development
+
+def require_dev(dev: bool = Depends(dev_access))->None:
+    """route dependency for the /debug endpoints, they only exist in development"""
+    if not dev:
+        raise HTTPException(status_code=401,
+                            detail="User is Unauthorized",
+                            headers={"WWW-Authenticate":"bearer"}
+                            )
@@ -0,0 +1,46 @@
+import argparse
+from datetime import datetime
+
+from app.core.archiver import ARCHIVE_AFTER_DAYS, run_archival
+from app.crud.archive import restore_partitions
+from app.db.session import SessionLocal
+from app.db.shards import shard_session
+from app.init_db import init_db
+
+"""archive old transactions into compressed monthly partitions, or bring them back
+
+python -m app.archive_transactions [--older-than-days DAYS]
+python -m app.archive_transactions --restore --user-id ID [--month YYYY-MM]
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move old transactions to cold partitions and back")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="archive whole months older than this (default: ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--restore", action="store_true", help="move a user's partitions back into transactions")
+    parser.add_argument("--user-id", type=int, default=None, help="user to restore")
+    parser.add_argument("--month", default=None, help="only restore this month, YYYY-MM")
+    args = parser.parse_args()
+
+    init_db()
+    if not args.restore:
+        result = run_archival(older_than_days=args.older_than_days)
+        print(f"archived {result.rows} transactions of {result.users} users into {result.partitions} partitions"
+              f" ({result.raw_bytes} -> {result.stored_bytes} bytes, {result.bytes_saved} saved)"
+              f" newest page {result.probe_before_ms} -> {result.probe_after_ms} ms")
+        return
+
+    if args.user_id is None:
+        parser.error("--restore needs --user-id")
+    month = datetime.strptime(args.month, "%Y-%m").date() if args.month else None
+    db = SessionLocal()
+    try:
+        restored = restore_partitions(shard_session(db, args.user_id), user_id=args.user_id, month=month)
+    finally:
+        db.close()
+    print(f"restored {restored} transactions")
+
+
+if __name__ == "__main__":
+    main()
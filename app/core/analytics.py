@@ -0,0 +1,105 @@
+from datetime import date
+
+import numpy as np
+
+from app.core.money import CENTS_PER_UNIT
+from app.schemas.analytics import AnalyticsResponse, DailyPoint, ProjectedPoint, WeeklyPoint
+
+"""VECTORIZED CASH FLOW ANALYTICS
+
+works on three parallel arrays (day, amount_cents, is_income) for one user. every transaction is
+binned onto a dense per day axis with bincount, after that balances, rolling means, weekly
+buckets and the trend line are whole array operations. everything is computed in cents (sums are
+exact in float64 below 2**53) and only turned into major units when the response is built
+"""
+
+DAYS_PER_MONTH = 365.25 / 12
+ROLLING_WINDOWS = (7, 30)
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """trailing mean over window days, nan where fewer than window days are available"""
+    out = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        sums = np.cumsum(np.concatenate(([0.0], values)))
+        out[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return out
+
+def monday_offset(day: np.datetime64) -> int:
+    #day 0 of datetime64 is thursday 1970-01-01
+    return int((day.astype(np.int64) + 3) % 7)
+
+def _units(values: np.ndarray) -> list:
+    return [None if np.isnan(value) else value for value in np.round(values / CENTS_PER_UNIT, 2).tolist()]
+
+def _unit(cents: float) -> float:
+    return round(float(cents) / CENTS_PER_UNIT, 2)
+
+def compute_analytics(days: np.ndarray, amounts_cents: np.ndarray, is_income: np.ndarray, as_of: date,
+                      window_days: int, horizon_days: int) -> AnalyticsResponse:
+    """
+    days is datetime64[D], amounts_cents are positive and is_income picks the sign. window_days is the
+    trailing window (ending at as_of) used for the daily series, weekly buckets, rates and trend,
+    horizon_days how far past as_of the trend is projected. transactions dated after as_of are not
+    part of the balance yet and are left out
+    """
+    today = np.datetime64(as_of, "D")
+    if len(days):
+        current_rows = days <= today
+        days, amounts_cents, is_income = days[current_rows], amounts_cents[current_rows], is_income[current_rows]
+    start = min(days.min(), today) if len(days) else today
+    span = int((today - start).astype(np.int64)) + 1
+    offsets = (days - start).astype(np.int64)
+
+    income = np.bincount(offsets, weights=np.where(is_income, amounts_cents, 0), minlength=span)
+    outcome = np.bincount(offsets, weights=np.where(is_income, 0, amounts_cents), minlength=span)
+    net = income - outcome
+    balance = np.cumsum(net)
+    averages = [rolling_mean(net, window) for window in ROLLING_WINDOWS]
+
+    #trailing window ending today
+    last = span - 1
+    first = max(0, last - window_days + 1)
+    window = slice(first, last + 1)
+    income_rate = float(income[window].mean())
+    burn_rate = float(outcome[window].mean())
+    current = float(balance[last])
+    net_rate = income_rate - burn_rate
+    runway = None if net_rate >= 0 else max(0.0, current) / -net_rate
+
+    trend_days = np.arange(last + 1 - first, dtype=np.float64)
+    if len(trend_days) >= 2:
+        slope, intercept = np.polyfit(trend_days, balance[window], 1)
+    else:
+        slope, intercept = 0.0, current
+    ahead = np.arange(1, horizon_days + 1)
+    projected = intercept + slope * (trend_days[-1] + ahead)
+
+    #whole weeks back to the monday on or before the window start, where the history reaches that far
+    week_first = max(0, first - monday_offset(start + first))
+    weeks = (np.arange(week_first, last + 1) + monday_offset(start)) // 7
+    weekly_net = np.bincount(weeks - weeks[0], weights=net[week_first:])
+    weekly_balance = balance[week_first] - net[week_first] + np.cumsum(weekly_net)
+    first_week = start + week_first
+    week_starts = first_week - monday_offset(first_week) + np.arange(len(weekly_net)) * 7
+
+    axis = start + np.arange(first, last + 1)
+    daily_columns = zip(axis.tolist(), _units(income[window]), _units(outcome[window]),
+                        _units(net[window]), _units(balance[window]),
+                        _units(averages[0][window]), _units(averages[1][window]))
+    return AnalyticsResponse(
+        as_of=as_of,
+        balance=_unit(current),
+        window_days=last + 1 - first,
+        income_rate_daily=_unit(income_rate),
+        burn_rate_daily=_unit(burn_rate),
+        burn_rate_monthly=_unit(burn_rate * DAYS_PER_MONTH),
+        runway_days=None if runway is None else round(runway, 1),
+        trend_per_day=_unit(slope),
+        daily=[DailyPoint(day=day, income=inc, outcome=out, net=n, balance=bal, avg_7d=a7, avg_30d=a30)
+               for day, inc, out, n, bal, a7, a30 in daily_columns],
+        weekly=[WeeklyPoint(week_start=week, net=n, balance=bal)
+                for week, n, bal in zip(week_starts.tolist(), _units(weekly_net), _units(weekly_balance))],
+        projection=[ProjectedPoint(day=day, balance=bal)
+                    for day, bal in zip((today + ahead).tolist(), _units(projected))],
+    )
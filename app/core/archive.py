@@ -0,0 +1,34 @@
+import zlib
+from collections import namedtuple
+from collections.abc import Sequence
+from datetime import datetime
+
+import orjson
+
+"""COLD PARTITION FORMAT
+
+a partition holds one user's transactions for one month as a columnar orjson document
+(one list per column, so similar values sit next to each other) compressed with zlib. rows are
+stored oldest first in (transaction_date, id) order and keep their original ids
+"""
+
+FORMAT_VERSION = 1
+ARCHIVE_COLUMNS = ("id", "transaction_date", "txn_type", "amount_cents", "desc", "created_at")
+ArchivedRow = namedtuple("ArchivedRow", ARCHIVE_COLUMNS)
+
+
+def encode_partition(rows: Sequence[ArchivedRow], level: int = 6) -> tuple[bytes, int]:
+    """returns (compressed data, uncompressed size)"""
+    values = [list(column) for column in zip(*rows)] or [[] for _ in ARCHIVE_COLUMNS]
+    raw = orjson.dumps({"version": FORMAT_VERSION, "columns": ARCHIVE_COLUMNS, "values": values})
+    return zlib.compress(raw, level), len(raw)
+
+def _datetime(value: str | None) -> datetime | None:
+    return None if value is None else datetime.fromisoformat(value)
+
+def decode_partition(data: bytes) -> list[ArchivedRow]:
+    document = orjson.loads(zlib.decompress(data))
+    columns = dict(zip(document["columns"], document["values"]))
+    columns["transaction_date"] = [datetime.fromisoformat(value) for value in columns["transaction_date"]]
+    columns["created_at"] = [_datetime(value) for value in columns["created_at"]]
+    return [ArchivedRow._make(row) for row in zip(*(columns[name] for name in ARCHIVE_COLUMNS))]
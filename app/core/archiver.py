@@ -0,0 +1,114 @@
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.periodic import PeriodicJob
+from app.crud.archive import archive_user
+from app.crud.transactions import DEFAULT_PAGE_SIZE, transaction_page_statement
+from app.db.shards import shard_router
+from app.models.transactions import Transaction
+
+"""BACKGROUND TRANSACTION ARCHIVER
+
+moves whole months older than ARCHIVE_AFTER_DAYS out of the hot transactions table into
+compressed per user partitions (app.crud.archive), one commit per user and month so the
+writer is never held for long. every archived user's newest page query is timed before and
+after, the means are exported so the effect on the hot table shows up next to the bytes saved
+"""
+
+ARCHIVE_ENABLED = settings.archive_enabled
+ARCHIVE_AFTER_DAYS = settings.archive_after_days
+ARCHIVE_INTERVAL_SECONDS = settings.archive_interval_seconds
+
+logger = logging.getLogger("app.archiver")
+
+ARCHIVE_SECONDS = registry.histogram("txn_archive_run_seconds", "duration of an archival run")
+PROBE_SECONDS = registry.gauge("txn_archive_probe_seconds",
+                               "mean newest page query time of the users archived in the last run",
+                               labels=("phase",))
+
+
+@dataclass
+class ArchiveResult:
+    users: int
+    partitions: int
+    rows: int
+    raw_bytes: int
+    stored_bytes: int
+    probe_before_ms: float | None
+    probe_after_ms: float | None
+    seconds: float
+    finished_at: datetime
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.raw_bytes - self.stored_bytes
+
+
+def archive_cutoff(older_than_days: int, today: date | None = None) -> date:
+    """first day of the month that contains today - older_than_days, only months before it are archived"""
+    day = (today or datetime.utcnow().date()) - timedelta(days=older_than_days)
+    return date(day.year, day.month, 1)
+
+def _probe(db: Session, user_id: int) -> float:
+    started = time.perf_counter()
+    db.execute(transaction_page_statement(user_id, limit=DEFAULT_PAGE_SIZE)).all()
+    elapsed = time.perf_counter() - started
+    db.rollback()
+    return elapsed
+
+def run_archival(older_than_days: int = ARCHIVE_AFTER_DAYS, today: date | None = None) -> ArchiveResult:
+    started = time.perf_counter()
+    before = archive_cutoff(older_than_days, today)
+    users = partitions = rows = raw_bytes = stored_bytes = 0
+    probes_before: list[float] = []
+    probes_after: list[float] = []
+
+    for shard in range(shard_router.size):
+        #reads and deletes of one month share a writer transaction, probes go through the readers like the API
+        db = Session(bind=shard_router.engines(shard)[1], autoflush=False)
+        probe_db = shard_router.session(shard)
+        try:
+            candidates = db.execute(select(Transaction.user_id)
+                                    .where(Transaction.transaction_date < before).distinct()).scalars().all()
+            db.rollback()
+            for user_id in candidates:
+                probe_before = _probe(probe_db, user_id)
+                written = archive_user(db, user_id, before)
+                db.rollback()
+                if not written:
+                    continue
+                probes_before.append(probe_before)
+                probes_after.append(_probe(probe_db, user_id))
+                users += 1
+                partitions += len(written)
+                rows += sum(write.rows for write in written)
+                raw_bytes += sum(write.raw_bytes for write in written)
+                stored_bytes += sum(write.stored_bytes for write in written)
+        finally:
+            probe_db.close()
+            db.close()
+
+    elapsed = time.perf_counter() - started
+    ARCHIVE_SECONDS.observe(value=elapsed)
+    probe_before_ms = probe_after_ms = None
+    if probes_before:
+        PROBE_SECONDS.set("before", value=sum(probes_before) / len(probes_before))
+        PROBE_SECONDS.set("after", value=sum(probes_after) / len(probes_after))
+        probe_before_ms = round(1000 * sum(probes_before) / len(probes_before), 3)
+        probe_after_ms = round(1000 * sum(probes_after) / len(probes_after), 3)
+    result = ArchiveResult(users=users, partitions=partitions, rows=rows, raw_bytes=raw_bytes,
+                           stored_bytes=stored_bytes, probe_before_ms=probe_before_ms,
+                           probe_after_ms=probe_after_ms, seconds=round(elapsed, 4),
+                           finished_at=datetime.utcnow())
+    logger.info("archived %d transactions of %d users into %d partitions in %.3fs, %d bytes saved",
+                rows, users, partitions, elapsed, result.bytes_saved)
+    return result
+
+archiver = PeriodicJob("transaction-archiver", run_archival, ARCHIVE_INTERVAL_SECONDS, enabled=ARCHIVE_ENABLED)
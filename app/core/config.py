@@ -0,0 +1,98 @@
+import os
+from functools import lru_cache
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+"""APPLICATION SETTINGS
+
+read once from the environment, .env.shared and .env (later sources win, real environment
+variables win over both). import `settings` or depend on get_settings instead of reading files
+"""
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=(".env.shared", ".env"), env_file_encoding="utf-8",
+                                      case_sensitive=False, extra="ignore")
+
+    development: bool = False
+
+    #database
+    database_url: str = "sqlite:///./finance.db"
+    async_database_url: str | None = None
+    db_mode: str = "sync" #sync | async
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    create_schema_on_startup: bool = True
+    read_database_url: str | None = None #replica for get_read_db, e.g. sqlite:///file:finance.db?mode=ro&uri=true
+    read_your_writes_seconds: float = 5 #how long a user who wrote reads from the primary instead of the replica
+    shard_count: int = 0 #0 keeps transactions in database_url, N spreads them over N shard databases
+    shard_url_template: str = "sqlite:///./finance_shard{shard}.db"
+
+    #sqlite profile
+    sqlite_profile: bool = True
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size: int = -65536 #negative = KiB, 64 MiB
+    sqlite_mmap_size: int = 268435456 #256 MiB
+    sqlite_temp_store: str = "MEMORY"
+
+    #auth
+    secret_key: str | None = None
+    algorithm: str = "HS256"
+    access_token_expire_minutes: int = 30
+    refresh_token_expire_days: int = 7
+    principal_cache_size: int = 10000
+    principal_cache_ttl_seconds: float = 30
+    token_cache_size: int = 10000 #verified access tokens kept until they expire, 0 turns the cache off
+
+    #password hashing
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = min(4, os.cpu_count() or 1)
+    password_hash_max_pending: int = 32
+    password_hash_retry_after: int = 1
+
+    #transactions
+    bulk_chunk_size: int = 500
+    import_batch_size: int = 500
+    group_commit_enabled: bool = False
+    group_commit_window_ms: float = 2
+    group_commit_max_batch: int = 256
+
+    #archival
+    archive_enabled: bool = False
+    archive_after_days: int = 365 #whole months older than this move to compressed partitions
+    archive_interval_seconds: float = 86400
+    archive_compression_level: int = 6
+
+    #recurring transactions
+    recurring_enabled: bool = False
+    recurring_interval_seconds: float = 60
+    recurring_batch_size: int = 500 #rules read and transactions written per commit
+
+    #analytics
+    analytics_cache_size: int = 1000
+    analytics_cache_ttl_seconds: float = 300
+
+    #responses
+    fast_json: bool = True
+
+    #instrumentation
+    metrics_enabled: bool = True
+    slow_query_ms: float = 200
+
+    #session reaper
+    session_reaper_enabled: bool = True
+    session_reaper_interval_seconds: float = 3600
+    session_reaper_batch_size: int = 500
+    session_reaper_pause_ms: float = 50
+    session_reaper_grace_days: int = 2
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+settings = get_settings()
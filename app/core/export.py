@@ -0,0 +1,65 @@
+import csv
+import io
+from collections.abc import Collection, Iterable, Iterator, Sequence
+from decimal import Decimal
+
+import orjson
+
+from app.core.money import cents_to_decimal
+
+"""TRANSACTION EXPORT FORMATTERS
+
+turn chunks of column tuples into text chunks, one output chunk per input chunk so the
+response is flushed in reasonably sized pieces without buffering the whole export
+"""
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _json_default(value):
+    #orjson handles datetimes itself, only types it does not know end up here
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+def csv_chunks(columns: Sequence[str], chunks: Iterable[Sequence[tuple]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def ndjson_chunks(columns: Sequence[str], chunks: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield b"".join(orjson.dumps(dict(zip(columns, row)), default=_json_default,
+                                    option=orjson.OPT_APPEND_NEWLINE)
+                       for row in chunk)
+
+def cents_as_decimal(columns: Sequence[str], chunks: Iterable[Sequence[tuple]],
+                     cents_columns: Collection[str]) -> Iterator[list[tuple]]:
+    """rewrite integer cents columns as Decimals (12.30), other values pass through untouched"""
+    positions = [index for index, column in enumerate(columns) if column in cents_columns]
+    for chunk in chunks:
+        rows = []
+        for row in chunk:
+            row = list(row)
+            for index in positions:
+                row[index] = cents_to_decimal(row[index])
+            rows.append(tuple(row))
+        yield rows
+
+def export_chunks(fmt: str, columns: Sequence[str], chunks: Iterable[Sequence[tuple]],
+                  cents_columns: Collection[str] = ("amount",)) -> Iterator[str | bytes]:
+    if cents_columns:
+        chunks = cents_as_decimal(columns, chunks, cents_columns)
+    if fmt == "csv":
+        return csv_chunks(columns, chunks)
+    return ndjson_chunks(columns, chunks)
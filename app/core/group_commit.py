@@ -0,0 +1,110 @@
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+
+from app.core.metrics import COUNT_BUCKETS, registry
+
+"""GROUP COMMIT WRITE BUFFER
+
+callers enqueue an already validated row and wait on a future. one flusher thread takes the
+first queued row, keeps collecting for up to window seconds or until max_batch rows are queued,
+then writes the whole batch in one transaction (one journal sync instead of one per row) and
+resolves every caller's future with its id once the commit has returned
+"""
+
+logger = logging.getLogger("app.group_commit")
+
+BATCH_SIZE = registry.histogram("txn_group_commit_batch_rows", "rows written per group commit",
+                                buckets=COUNT_BUCKETS + (200, 500, 1000))
+FLUSH_SECONDS = registry.histogram("txn_group_commit_flush_seconds", "insert + commit time of a group commit")
+QUEUE_WAIT_SECONDS = registry.histogram("txn_group_commit_wait_seconds",
+                                        "time from enqueue until the caller's row was committed")
+FLUSH_ERRORS = registry.counter("txn_group_commit_errors_total", "group commits that failed and were retried row by row")
+
+_STOP = object()
+
+
+class GroupCommitBuffer:
+    def __init__(self, write_batch: Callable[[list[dict]], list[int]], window_seconds: float, max_batch: int):
+        """write_batch inserts and commits the rows, returning their ids in order, or raises"""
+        self.write_batch = write_batch
+        self.window_seconds = window_seconds
+        self.max_batch = max(1, max_batch)
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                    self._thread.start()
+
+    def submit(self, row: dict) -> Future:
+        """queue a row, the future resolves to its id after the commit that contains it"""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((row, future, time.perf_counter()))
+        return future
+
+    def insert(self, row: dict) -> int:
+        return self.submit(row).result()
+
+    def close(self) -> None:
+        """flush whatever is queued and stop the flusher"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _collect(self, first) -> tuple[list, bool]:
+        batch = [first]
+        deadline = time.perf_counter() + self.window_seconds
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stopping = self._collect(first)
+            self._flush(batch)
+
+    def _flush(self, batch: list) -> None:
+        started = time.perf_counter()
+        try:
+            ids = self.write_batch([row for row, _, _ in batch])
+        except Exception:
+            #one bad row must not fail everyone else's insert, retry them one at a time
+            FLUSH_ERRORS.inc()
+            logger.exception("group commit of %d rows failed, retrying row by row", len(batch))
+            for row, future, queued_at in batch:
+                try:
+                    row_id = self.write_batch([row])[0]
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(row_id)
+                    QUEUE_WAIT_SECONDS.observe(value=time.perf_counter() - queued_at)
+            return
+        finished = time.perf_counter()
+        BATCH_SIZE.observe(value=len(batch))
+        FLUSH_SECONDS.observe(value=finished - started)
+        for (_, future, queued_at), row_id in zip(batch, ids):
+            QUEUE_WAIT_SECONDS.observe(value=finished - queued_at)
+            future.set_result(row_id)
@@ -0,0 +1,251 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+"""INSTRUMENTATION
+
+process local counters / gauges / histograms rendered in the prometheus text format, an ASGI
+middleware timing every request by route template and engine hooks counting queries per request.
+nothing here is wired up when METRICS_ENABLED=False
+"""
+
+METRICS_ENABLED = settings.metrics_enabled
+SLOW_QUERY_MS = settings.slow_query_ms
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_query_log = logging.getLogger("app.db.slow_query")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_text(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_label_text(self.labels, key)} {_number(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+        #per label set: [count per bucket (+inf last), sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, *labels, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = self.header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(float(bound))
+                labels = _label_text(self.labels, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.counter("http_requests_total", "HTTP requests by route template and status",
+                            ("method", "route", "status"))
+REQUEST_LATENCY = registry.histogram("http_request_duration_seconds", "HTTP request latency",
+                                     ("method", "route"))
+IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being served",
+                           ("method", "route"))
+QUERIES = registry.counter("db_queries_total", "SQL statements executed", ("statement",))
+QUERY_LATENCY = registry.histogram("db_query_duration_seconds", "SQL statement latency", ("statement",))
+SLOW_QUERIES = registry.counter("db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS")
+REQUEST_QUERIES = registry.histogram("http_request_db_queries", "SQL statements per request",
+                                     ("method", "route"), buckets=COUNT_BUCKETS)
+REQUEST_DB_TIME = registry.histogram("http_request_db_duration_seconds", "time spent in SQL per request",
+                                     ("method", "route"))
+
+
+@dataclass
+class RequestStats:
+    route: str
+    queries: int = 0
+    db_seconds: float = 0.0
+
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def instrument_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        QUERIES.inc(kind)
+        QUERY_LATENCY.observe(kind, value=elapsed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            SLOW_QUERIES.inc()
+            slow_query_log.warning("slow query %.1f ms route=%s: %s", elapsed * 1000,
+                                   stats.route if stats else "-", " ".join(statement.split())[:500])
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+class MetricsMiddleware:
+    """pure ASGI so streaming responses are timed until their last chunk"""
+    MAX_CACHED_ROUTES = 1024
+
+    def __init__(self, app):
+        self.app = app
+        self._route_cache: dict[tuple[str, str], str] = {}
+
+    def _route_for(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        cached = self._route_cache.get(key)
+        if cached is not None:
+            return cached
+        from starlette.routing import Match
+        route_name = "<unmatched>"
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                route_name = getattr(route, "path", route_name)
+                break
+        if len(self._route_cache) < self.MAX_CACHED_ROUTES:
+            self._route_cache[key] = route_name
+        return route_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_for(scope)
+        stats = RequestStats(route=route)
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec(method, route)
+            REQUESTS.inc(method, route, str(status))
+            REQUEST_LATENCY.observe(method, route, value=elapsed)
+            REQUEST_QUERIES.observe(method, route, value=stats.queries)
+            REQUEST_DB_TIME.observe(method, route, value=stats.db_seconds)
+            current_request.reset(token)
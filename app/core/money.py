@@ -0,0 +1,45 @@
+from decimal import Decimal, InvalidOperation
+
+"""MONEY
+
+amounts are integer minor units (cents) everywhere below the API. the helpers here are the
+only place decimal text, floats and Decimals are turned into cents and back
+"""
+
+CENTS_PER_UNIT = 100
+MAX_CENTS = 10**15 #well inside int64 and inside float64's exact integer range for sums
+_CENT = Decimal("0.01")
+MAX_AMOUNT = Decimal(MAX_CENTS) / CENTS_PER_UNIT
+
+
+def to_cents(value) -> int:
+    """
+    exact conversion of a decimal amount (str, int, float or Decimal, in major units) to cents.
+    floats go through their shortest repr so 19.99 is 1999, not 1998. raises ValueError for text
+    that is not a number, non finite values and more than two decimal places
+    """
+    if isinstance(value, bool):
+        raise ValueError("amount must be a number")
+    if isinstance(value, float):
+        value = repr(value)
+    elif isinstance(value, str):
+        value = value.strip()
+    try:
+        amount = Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise ValueError("amount must be a number")
+    if not amount.is_finite():
+        raise ValueError("amount must be finite")
+    #checked before quantize, which raises InvalidOperation (not a ValueError) past the context precision
+    if abs(amount) >= MAX_AMOUNT:
+        raise ValueError("amount is too large")
+    if amount != amount.quantize(_CENT, rounding="ROUND_DOWN"):
+        raise ValueError("amount can have at most two decimal places")
+    return int(amount * CENTS_PER_UNIT)
+
+def cents_to_decimal(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+def cents_to_number(cents: int) -> float:
+    """for JSON output, cents / 100 is the double nearest the exact amount so it prints as 12.34"""
+    return cents / CENTS_PER_UNIT
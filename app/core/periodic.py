@@ -0,0 +1,53 @@
+import asyncio
+import logging
+import random
+from collections.abc import Callable
+from typing import Any
+
+"""PERIODIC BACKGROUND JOBS
+
+a job is a plain function that does one run and returns its result. the app lifespan starts every
+enabled job as a task that calls it on a worker thread every interval_seconds, so the event loop
+never waits on its database work. a failed run is logged and the next one still happens
+"""
+
+logger = logging.getLogger("app.periodic")
+
+
+class PeriodicJob:
+    """calling the job runs it now (the loop, a debug endpoint) and keeps what it returned as last_result"""
+    def __init__(self, name: str, run: Callable[..., Any], interval_seconds: float, enabled: bool = True):
+        self.name = name
+        self.run = run
+        self.interval_seconds = interval_seconds
+        self.enabled = enabled
+        self.last_result: Any = None
+
+    def __call__(self, *args, **kw) -> Any:
+        self.last_result = self.run(*args, **kw)
+        return self.last_result
+
+
+async def run_periodic(job: PeriodicJob) -> None:
+    #jitter so several workers started together do not run the job at the same moment
+    await asyncio.sleep(random.uniform(0, min(job.interval_seconds, 60)))
+    while True:
+        try:
+            await asyncio.to_thread(job)
+        except Exception:
+            logger.exception("%s run failed", job.name)
+        await asyncio.sleep(job.interval_seconds)
+
+def start_periodic(job: PeriodicJob) -> asyncio.Task | None:
+    if not job.enabled:
+        return None
+    return asyncio.create_task(run_periodic(job), name=job.name)
+
+async def stop_periodic(task: asyncio.Task | None) -> None:
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
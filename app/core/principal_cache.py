@@ -0,0 +1,15 @@
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.schemas.user import Principal
+
+"""PRINCIPAL CACHE
+
+used to keep resolved principals around so authenticated requests skip the user lookup.
+entries expire after ttl seconds and the least recently used entry is dropped once full
+"""
+
+#resolved principals by token subject (email)
+principal_cache: TTLCache[Principal] = TTLCache(
+    maxsize=settings.principal_cache_size,
+    ttl=settings.principal_cache_ttl_seconds,
+)
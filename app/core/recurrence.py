@@ -0,0 +1,137 @@
+import calendar
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+"""RECURRENCE RULES
+
+the subset of RFC 5545 RRULE that recurring transactions need, no dateutil:
+
+    FREQ=DAILY|WEEKLY|MONTHLY|YEARLY   required
+    INTERVAL=n                         every n-th day / week / month / year (default 1)
+    BYDAY=MO,WE,FR                     WEEKLY only, weekdays in the week (default: dtstart's)
+    BYMONTHDAY=1,15,-1                 MONTHLY only, -1 is the last day (default: dtstart's day)
+    COUNT=n | UNTIL=YYYYMMDD[THHMMSS[Z]]
+
+occurrences carry dtstart's time of day. like RFC 5545, days a month does not have (the 31st,
+February 29th) are skipped rather than moved, and weeks start on monday
+"""
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+#a rule whose periods can never hold a day (FREQ=MONTHLY;INTERVAL=12;BYMONTHDAY=30 from february) ends here
+MAX_EMPTY_PERIODS = 1000
+
+
+@dataclass(frozen=True)
+class Recurrence:
+    freq: str
+    interval: int = 1
+    by_day: tuple[int, ...] = ()
+    by_month_day: tuple[int, ...] = ()
+    count: int | None = None
+    until: datetime | None = None
+
+
+def _parse_until(value: str) -> datetime:
+    value = value.rstrip("Z")
+    for pattern in ("%Y%m%dT%H%M%S", "%Y%m%d"):
+        try:
+            parsed = datetime.strptime(value, pattern)
+        except ValueError:
+            continue
+        #a bare date includes the whole day
+        return parsed if "T" in value else datetime.combine(parsed.date(), time.max)
+    raise ValueError(f"UNTIL must be YYYYMMDD or YYYYMMDDTHHMMSS, got {value!r}")
+
+def _positive(name: str, value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise ValueError(f"{name} must be at least 1")
+    return number
+
+def parse_rrule(text: str) -> Recurrence:
+    """raises ValueError naming the part of the rule that is not supported"""
+    parts: dict[str, str] = {}
+    for part in text.strip().removeprefix("RRULE:").split(";"):
+        name, sep, value = part.partition("=")
+        if not sep or not value:
+            raise ValueError(f"expected NAME=VALUE, got {part!r}")
+        parts[name.strip().upper()] = value.strip().upper()
+
+    freq = parts.pop("FREQ", None)
+    if freq not in FREQUENCIES:
+        raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+    interval = _positive("INTERVAL", parts.pop("INTERVAL", "1"))
+    by_day: tuple[int, ...] = ()
+    if "BYDAY" in parts:
+        if freq != "WEEKLY":
+            raise ValueError("BYDAY is only supported with FREQ=WEEKLY")
+        days = parts.pop("BYDAY").split(",")
+        if any(day not in WEEKDAYS for day in days):
+            raise ValueError(f"BYDAY takes {','.join(WEEKDAYS)}")
+        by_day = tuple(sorted({WEEKDAYS.index(day) for day in days}))
+    by_month_day: tuple[int, ...] = ()
+    if "BYMONTHDAY" in parts:
+        if freq != "MONTHLY":
+            raise ValueError("BYMONTHDAY is only supported with FREQ=MONTHLY")
+        by_month_day = tuple(int(day) for day in parts.pop("BYMONTHDAY").split(","))
+        if any(day == 0 or not -31 <= day <= 31 for day in by_month_day):
+            raise ValueError("BYMONTHDAY days are 1..31 or -31..-1")
+    count = _positive("COUNT", parts.pop("COUNT")) if "COUNT" in parts else None
+    until = _parse_until(parts.pop("UNTIL")) if "UNTIL" in parts else None
+    if count is not None and until is not None:
+        raise ValueError("COUNT and UNTIL cannot be combined")
+    if parts:
+        raise ValueError(f"unsupported rule parts: {', '.join(sorted(parts))}")
+    return Recurrence(freq=freq, interval=interval, by_day=by_day, by_month_day=by_month_day,
+                      count=count, until=until)
+
+def _period(freq: str, day: date) -> int:
+    if freq == "DAILY":
+        return day.toordinal()
+    if freq == "WEEKLY":
+        return (day.toordinal() - 1) // 7 #ordinal 1 is a monday
+    if freq == "MONTHLY":
+        return day.year * 12 + day.month - 1
+    return day.year
+
+def _period_days(rule: Recurrence, dtstart: datetime, period: int) -> list[date]:
+    """the days of one period that match the rule, in order"""
+    if rule.freq == "DAILY":
+        return [date.fromordinal(period)]
+    if rule.freq == "WEEKLY":
+        monday = date.fromordinal(period * 7 + 1)
+        return [monday + timedelta(days=weekday) for weekday in rule.by_day or (dtstart.weekday(),)]
+    if rule.freq == "MONTHLY":
+        year, month = divmod(period, 12)
+        month += 1
+        length = calendar.monthrange(year, month)[1]
+        days = {day if day > 0 else length + day + 1 for day in rule.by_month_day or (dtstart.day,)}
+        return [date(year, month, day) for day in sorted(days) if 1 <= day <= length]
+    if dtstart.month == 2 and dtstart.day == 29 and not calendar.isleap(period):
+        return []
+    return [date(period, dtstart.month, dtstart.day)]
+
+def iter_occurrences(rule: Recurrence, dtstart: datetime, start: datetime | None = None) -> Iterator[datetime]:
+    """
+    occurrences at or after start (default dtstart) in order, ending at UNTIL. COUNT is left to
+    the caller, which knows how many occurrences came before start
+    """
+    start = max(start or dtstart, dtstart)
+    first = _period(rule.freq, dtstart.date())
+    #the period holding start, rounded down onto the INTERVAL grid that dtstart's period begins
+    period = first + (_period(rule.freq, start.date()) - first) // rule.interval * rule.interval
+    empty = 0
+    while empty < MAX_EMPTY_PERIODS:
+        found = False
+        for day in _period_days(rule, dtstart, period):
+            occurrence = datetime.combine(day, dtstart.time())
+            if occurrence < start:
+                continue
+            if rule.until is not None and occurrence > rule.until:
+                return
+            found = True
+            yield occurrence
+        empty = 0 if found else empty + 1
+        period += rule.interval
@@ -0,0 +1,61 @@
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.metrics import COUNT_BUCKETS, registry
+from app.core.periodic import PeriodicJob
+from app.crud.recurring import materialize_due
+from app.db.shards import shard_router
+
+"""BACKGROUND RECURRING TRANSACTION SCHEDULER
+
+started from the app lifespan, writes the occurrences of every user's recurring rules that have
+come due as ordinary transactions (app.crud.recurring.materialize_due), shard by shard in
+batched inserts. a restart loses nothing, the first run afterwards catches up what was missed
+"""
+
+RECURRING_ENABLED = settings.recurring_enabled
+RECURRING_INTERVAL_SECONDS = settings.recurring_interval_seconds
+RECURRING_BATCH_SIZE = settings.recurring_batch_size
+
+logger = logging.getLogger("app.recurring_scheduler")
+
+MATERIALIZED = registry.counter("recurring_occurrences_total", "recurring rule occurrences written as transactions")
+RUN_OCCURRENCES = registry.histogram("recurring_run_occurrences", "occurrences written by one scheduler run",
+                                     buckets=COUNT_BUCKETS + (200, 500, 1000, 10000))
+RUN_SECONDS = registry.histogram("recurring_run_seconds", "duration of a scheduler run")
+
+
+@dataclass
+class RecurringRunResult:
+    rules: int
+    occurrences: int
+    seconds: float
+    finished_at: datetime
+
+
+def run_recurring(now: datetime | None = None, batch_size: int = RECURRING_BATCH_SIZE) -> RecurringRunResult:
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    rules = occurrences = 0
+    for shard in range(shard_router.size):
+        db = shard_router.session(shard)
+        try:
+            result = materialize_due(db, now=now, batch_size=batch_size)
+        finally:
+            db.close()
+        rules += result.rules
+        occurrences += result.occurrences
+
+    elapsed = time.perf_counter() - started
+    MATERIALIZED.inc(amount=occurrences)
+    RUN_OCCURRENCES.observe(value=occurrences)
+    RUN_SECONDS.observe(value=elapsed)
+    logger.info("recurring scheduler wrote %d occurrences of %d rules in %.3fs", occurrences, rules, elapsed)
+    return RecurringRunResult(rules=rules, occurrences=occurrences, seconds=round(elapsed, 4),
+                              finished_at=datetime.utcnow())
+
+#overlapping runs (several workers, a debug run) are safe, see app.crud.recurring
+scheduler = PeriodicJob("recurring-scheduler", run_recurring, RECURRING_INTERVAL_SECONDS, enabled=RECURRING_ENABLED)
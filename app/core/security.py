@@ -1,32 +1,62 @@
 from passlib.context import CryptContext
 
+import base64
 import hashlib
+import hmac
+import time
+
+import orjson
 
 from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
-from dotenv import dotenv_values
+from app.core.config import settings
 from app.schemas.auth import TokenData
+from app.core.cache import TTLCache
+from app.core.worker_pool import BoundedProcessPool, PoolSaturated
 import secrets
 
 #create endpoint that uses the crypt context and save the password in the table
 #each time a login takes place verify the password with the hash
-CONFIG = {
-    **dotenv_values(".env.shared"),
-    **dotenv_values(".env")
-    }
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated = "auto")
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+#min_rounds makes needs_update() flag hashes made with a lower cost so they get rehashed on login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated = "auto",
+                           bcrypt__rounds=BCRYPT_ROUNDS, bcrypt__min_rounds=BCRYPT_ROUNDS)
+
+password_pool = BoundedProcessPool(
+    workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+    retry_after=settings.password_hash_retry_after,
+)
+
+#worker side, must stay module level so the process pool can pickle them
+def _hash_password(password: str)->str:
+    return pwd_context.hash(password)
 
+def _verify_and_update(plain_password: str, hashed_password: str)->tuple[bool, str | None]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
 
 def hash_password(password: str)->str:
-    return pwd_context.hash(password)
+    """raises PoolSaturated when too many hashes are already queued"""
+    return password_pool.run(_hash_password, password)
 
 def verify_password(plain_password: str, hashed_password: str)->bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    valid, _ = verify_and_update_password(plain_password, hashed_password)
+    return valid
+
+def verify_and_update_password(plain_password: str, hashed_password: str)->tuple[bool, str | None]:
+    """returns (valid, new_hash), new_hash is set when the stored hash should be replaced"""
+    return password_pool.run(_verify_and_update, plain_password, hashed_password)
+
+async def hash_password_async(password: str)->str:
+    return await password_pool.run_async(_hash_password, password)
 
-SECRET_KEY = get_secret = CONFIG.get("SECRET_KEY", 'None')
-ALGORITHM = get_algorithm = CONFIG.get("ALGORITHM", 'HS256')
-ACCESS_TOKEN_EXPIRE_MINUTES  = int(CONFIG.get("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+async def verify_and_update_password_async(plain_password: str, hashed_password: str)->tuple[bool, str | None]:
+    return await password_pool.run_async(_verify_and_update, plain_password, hashed_password)
+
+SECRET_KEY = get_secret = settings.secret_key or 'None'
+ALGORITHM = get_algorithm = settings.algorithm
+ACCESS_TOKEN_EXPIRE_MINUTES  = settings.access_token_expire_minutes
+REFRESH_PEPPER = (settings.secret_key or "").encode("utf-8")
                                    
 def create_access_token(subject:str, expires_delta: timedelta  | None = None)->str:
     """
@@ -48,7 +78,8 @@ def create_access_token(subject:str, expires_delta: timedelta  | None = None)->s
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def decode_access_token(encoded_token:str)->TokenData | None:
+def decode_access_token_jose(encoded_token:str)->TokenData | None:
+    """the generic python-jose path, used for algorithms other than HS256"""
     if not encoded_token:
         return None
     try:
@@ -66,11 +97,87 @@ def decode_access_token(encoded_token:str)->TokenData | None:
     
     return TokenData(sub=sub, exp=exp)
 
+#HS256 fast path: the key schedule is computed once and copied per token
+_HS256_KEY = hmac.new(SECRET_KEY.encode("utf-8"), digestmod=hashlib.sha256)
+#header segments already checked to say alg HS256, our tokens all share one
+_hs256_headers: set[str] = set()
+MAX_KNOWN_HEADERS = 16
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+def _hs256_header(segment: str) -> bool:
+    if segment in _hs256_headers:
+        return True
+    try:
+        header = orjson.loads(_b64decode(segment))
+    except (ValueError, orjson.JSONDecodeError):
+        return False
+    if not isinstance(header, dict) or header.get("alg") != "HS256" or header.get("typ", "JWT") != "JWT" \
+            or "crit" in header:
+        return False
+    if len(_hs256_headers) < MAX_KNOWN_HEADERS:
+        _hs256_headers.add(segment)
+    return True
+
+def verify_hs256(encoded_token:str)->TokenData | None:
+    """
+    HS256 only: signature, exp and nbf checked straight on the token segments, without the
+    generic JOSE dispatch. same result as decode_access_token_jose for HS256 tokens
+    """
+    try:
+        header, payload, signature = encoded_token.split(".")
+        if not _hs256_header(header):
+            return None
+        mac = _HS256_KEY.copy()
+        mac.update(f"{header}.{payload}".encode("ascii"))
+        if not hmac.compare_digest(mac.digest(), _b64decode(signature)):
+            return None
+        claims = orjson.loads(_b64decode(payload))
+    except (ValueError, orjson.JSONDecodeError):
+        return None
+    if not isinstance(claims, dict):
+        return None
+    sub = claims.get("sub")
+    exp = claims.get("exp")
+    nbf = claims.get("nbf")
+    now_ts = int(time.time())
+    if not isinstance(sub, str) or not sub:
+        return None
+    if not isinstance(exp, int) or isinstance(exp, bool) or exp <= now_ts:
+        return None
+    if nbf is not None and (not isinstance(nbf, int) or nbf > now_ts):
+        return None
+    return TokenData(sub=sub, exp=exp)
+
+#signature -> (token, claims) until exp, the same token is presented on every request of its life
+token_cache: TTLCache[tuple[str, TokenData]] = TTLCache(
+    maxsize=settings.token_cache_size,
+    ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+_verify_token = verify_hs256 if ALGORITHM == "HS256" else decode_access_token_jose
+
+def decode_access_token(encoded_token:str)->TokenData | None:
+    if not encoded_token:
+        return None
+    signature = encoded_token.rpartition(".")[2]
+    cached = token_cache.get(signature)
+    if cached is not None:
+        token, claims = cached
+        #the signature only stands for the token it was computed over. plain ==, compare_digest
+        #raises on non-ascii str and the signature already matched in constant time when cached
+        if token == encoded_token and claims.exp > time.time():
+            return claims
+    claims = _verify_token(encoded_token)
+    if claims is not None:
+        token_cache.set(signature, (encoded_token, claims), ttl=claims.exp - time.time())
+    return claims
+
 def generate_refresh_token() -> str:
    return secrets.token_urlsafe(32)
 
 def hash_refresh_token(token:str) -> str:
-    pepper = (CONFIG.get("SECRET_KEY") or "").encode("utf-8")
+    pepper = REFRESH_PEPPER
     token_bytes = token.encode("utf-8") 
     return hashlib.sha256(token_bytes + pepper).hexdigest()
 
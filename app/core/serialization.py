@@ -0,0 +1,28 @@
+from collections.abc import Iterable
+
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import TypeAdapter
+
+from app.core.config import settings
+from app.schemas.transaction import TransactionRowPage, TransactionRowSearchPage
+
+"""FAST JSON RESPONSES
+
+with FAST_JSON on, responses that go through response_model are rendered by orjson instead of
+the stdlib encoder. list endpoints skip response_model altogether: the CRUD layer hands back
+column tuples and a TypeAdapter built once at import dumps them straight to bytes, so rows are
+never validated into models (twice) and never pass through jsonable_encoder
+"""
+
+FAST_JSON = settings.fast_json
+DEFAULT_RESPONSE_CLASS = ORJSONResponse if FAST_JSON else JSONResponse
+
+TRANSACTION_PAGE = TypeAdapter(TransactionRowPage)
+TRANSACTION_SEARCH_PAGE = TypeAdapter(TransactionRowSearchPage)
+
+
+def row_dicts(rows: Iterable) -> list[dict]:
+    return [row._asdict() for row in rows]
+
+def json_response(adapter: TypeAdapter, content) -> Response:
+    return Response(adapter.dump_json(content), media_type="application/json")
@@ -0,0 +1,52 @@
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.periodic import PeriodicJob
+from app.crud.user import cleanup_session
+from app.db.session import SessionLocal
+
+"""BACKGROUND SESSION REAPER
+
+started from the app lifespan, periodically removes expired/revoked auth sessions in small
+batches so the table stays bounded without one long delete holding the sqlite write lock
+"""
+
+REAPER_ENABLED = settings.session_reaper_enabled
+REAPER_INTERVAL_SECONDS = settings.session_reaper_interval_seconds
+REAPER_BATCH_SIZE = settings.session_reaper_batch_size
+REAPER_PAUSE_SECONDS = settings.session_reaper_pause_ms / 1000
+REAPER_GRACE_DAYS = settings.session_reaper_grace_days
+
+logger = logging.getLogger("app.session_reaper")
+
+REAPED = registry.counter("session_reaper_deleted_total", "auth sessions deleted by the reaper")
+REAP_SECONDS = registry.histogram("session_reaper_run_seconds", "duration of a reaper run")
+
+
+@dataclass
+class ReapResult:
+    deleted: int
+    seconds: float
+    finished_at: datetime
+
+
+def reap_sessions(grace_days: int = REAPER_GRACE_DAYS, batch_size: int = REAPER_BATCH_SIZE,
+                  pause_seconds: float = REAPER_PAUSE_SECONDS) -> ReapResult:
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        deleted = cleanup_session(db=db, now=datetime.utcnow(), grace_days=grace_days,
+                                  batch_size=batch_size, pause_seconds=pause_seconds)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - started
+    REAPED.inc(amount=deleted)
+    REAP_SECONDS.observe(value=elapsed)
+    logger.info("session reaper deleted %d sessions in %.3fs", deleted, elapsed)
+    return ReapResult(deleted=deleted, seconds=round(elapsed, 4), finished_at=datetime.utcnow())
+
+reaper = PeriodicJob("session-reaper", reap_sessions, REAPER_INTERVAL_SECONDS, enabled=REAPER_ENABLED)
@@ -0,0 +1,209 @@
+import csv
+import re
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import TextIO
+
+from sqlalchemy.orm import Session
+
+from app.core.money import to_cents
+from app.crud.transactions import insert_transaction_rows, validate_transaction
+from app.db.shards import shard_session
+from app.schemas.transaction import TransactionImportEvent
+
+"""STREAMING BANK STATEMENT IMPORT
+
+parse -> normalize -> validate -> batch insert, every stage is a generator so only
+one batch of rows is alive at a time regardless of the size of the uploaded file
+"""
+
+SUPPORTED_FORMATS = {"csv", "ofx"}
+DEFAULT_IMPORT_BATCH_SIZE = 500
+OFX_READ_SIZE = 64 * 1024
+
+CSV_COLUMNS = {
+    "transaction_date": ("transaction_date", "date", "posted", "posted_date", "booking_date"),
+    "amount": ("amount", "amt", "value"),
+    "desc": ("desc", "description", "memo", "name", "payee"),
+    "txn_type": ("txn_type", "type"),
+}
+TYPE_ALIASES = {
+    "income": "income", "credit": "income", "deposit": "income", "dep": "income",
+    "outcome": "outcome", "debit": "outcome", "withdrawal": "outcome", "payment": "outcome",
+}
+DATE_FORMATS = ("%m/%d/%Y", "%Y/%m/%d", "%d.%m.%Y", "%m/%d/%y")
+OFX_DATE_FORMATS = {8: "%Y%m%d", 12: "%Y%m%d%H%M", 14: "%Y%m%d%H%M%S"}
+
+_OFX_TOKEN = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(filename: str | None, requested: str | None = None) -> str | None:
+    if requested:
+        return requested.lower() if requested.lower() in SUPPORTED_FORMATS else None
+    suffix = (filename or "").rsplit(".", 1)[-1].lower()
+    if suffix in {"ofx", "qfx"}:
+        return "ofx"
+    if suffix in {"csv", "txt"}:
+        return "csv"
+    return None
+
+#parse stage
+def parse_csv(stream: TextIO) -> Iterator[tuple[int, dict]]:
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames:
+        return
+    lookup = {name.strip().lower().replace(" ", "_"): name for name in reader.fieldnames}
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        columns[field] = next((lookup[alias] for alias in aliases if alias in lookup), None)
+    missing = [field for field in ("transaction_date", "amount", "desc") if columns[field] is None]
+    if missing:
+        raise RowError(f"missing csv columns: {', '.join(missing)}")
+
+    for record in reader:
+        yield reader.line_num, {field: record.get(column) if column else None
+                                for field, column in columns.items()}
+
+def _ofx_tokens(stream: TextIO) -> Iterator[tuple[bool, str, str]]:
+    buffer = ""
+    while True:
+        chunk = stream.read(OFX_READ_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+        #a token is only complete once the next tag has started
+        cut = buffer.rfind("<")
+        if cut <= 0:
+            continue
+        for match in _OFX_TOKEN.finditer(buffer, 0, cut):
+            yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+        buffer = buffer[cut:]
+    for match in _OFX_TOKEN.finditer(buffer):
+        yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+
+def parse_ofx(stream: TextIO) -> Iterator[tuple[int, dict]]:
+    current: dict | None = None
+    count = 0
+    for closing, tag, value in _ofx_tokens(stream):
+        if tag == "STMTTRN":
+            if closing and current is not None:
+                count += 1
+                yield count, {
+                    "transaction_date": current.get("DTPOSTED"),
+                    "amount": current.get("TRNAMT"),
+                    "desc": current.get("NAME") or current.get("MEMO"),
+                    "txn_type": None,
+                }
+                current = None
+            elif not closing:
+                current = {}
+        elif current is not None and not closing and value:
+            current[tag] = value
+
+#normalize stage
+def _parse_amount(raw: str | None) -> Decimal:
+    if raw is None or not str(raw).strip():
+        raise RowError("amount is required")
+    text = str(raw).strip().replace(",", "").replace("$", "").replace(" ", "")
+    negative = text.startswith("(") and text.endswith(")")
+    try:
+        amount = Decimal(text.strip("()"))
+    except InvalidOperation:
+        raise RowError(f"invalid amount: {raw}")
+    return -amount if negative else amount
+
+def _parse_date(raw: str | None) -> datetime:
+    if raw is None or not str(raw).strip():
+        raise RowError("transaction_date is required")
+    text = str(raw).strip()
+    digits = text[:14]
+    if digits.isdigit() and len(digits) in OFX_DATE_FORMATS:
+        try:
+            return datetime.strptime(digits, OFX_DATE_FORMATS[len(digits)])
+        except ValueError:
+            raise RowError(f"invalid transaction_date: {raw}")
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    raise RowError(f"invalid transaction_date: {raw}")
+
+def normalize_row(raw: dict) -> dict:
+    amount = _parse_amount(raw.get("amount"))
+    txn_type = raw.get("txn_type")
+    if txn_type:
+        txn_type = TYPE_ALIASES.get(txn_type.strip().lower(), txn_type.strip().lower())
+    else:
+        txn_type = "outcome" if amount < 0 else "income"
+    try:
+        amount_cents = to_cents(abs(amount))
+    except ValueError as exc:
+        raise RowError(f"invalid amount: {raw.get('amount')} ({exc})")
+    return {
+        "desc": (raw.get("desc") or "").strip(),
+        "amount_cents": amount_cents,
+        "txn_type": txn_type,
+        "transaction_date": _parse_date(raw.get("transaction_date")),
+    }
+
+#validate stage
+def validated_rows(parsed: Iterable[tuple[int, dict]]) -> Iterator[tuple[int, dict | None, str | None]]:
+    for row_number, raw in parsed:
+        try:
+            row = normalize_row(raw)
+        #RowError or a ValueError escaping a parser, either way only this row is rejected
+        except ValueError as exc:
+            yield row_number, None, str(exc)
+            continue
+        reason = validate_transaction(**row)
+        yield row_number, (None if reason else row), reason
+
+#batch insert stage
+def import_statement(db: Session, stream: TextIO, fmt: str, user_id: int,
+                     batch_size: int = DEFAULT_IMPORT_BATCH_SIZE) -> Iterator[TransactionImportEvent]:
+    """
+    import a statement and yield progress / row error events as it goes.
+    every batch is committed on its own so progress reflects rows that are already stored
+    """
+    parser = parse_ofx if fmt == "ofx" else parse_csv
+    db = shard_session(db, user_id)
+    batch_size = max(1, batch_size)
+    rows_read = inserted = rejected = 0
+    batch: list[dict] = []
+    now = datetime.utcnow()
+
+    def flush() -> TransactionImportEvent:
+        nonlocal inserted
+        inserted += len(insert_transaction_rows(db, batch))
+        db.commit()
+        batch.clear()
+        return TransactionImportEvent(event="progress", rows_read=rows_read, inserted=inserted, rejected=rejected)
+
+    try:
+        for row_number, row, reason in validated_rows(parser(stream)):
+            rows_read += 1
+            if reason:
+                rejected += 1
+                yield TransactionImportEvent(event="error", row=row_number, reason=reason)
+                continue
+            batch.append({**row, "user_id": user_id, "created_at": now})
+            if len(batch) >= batch_size:
+                yield flush()
+        if batch:
+            yield flush()
+    except (RowError, csv.Error, UnicodeDecodeError) as exc:
+        db.rollback()
+        rejected += len(batch)
+        yield TransactionImportEvent(event="error", row=rows_read, reason=str(exc))
+
+    yield TransactionImportEvent(event="done", rows_read=rows_read, inserted=inserted, rejected=rejected)
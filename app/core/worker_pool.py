@@ -0,0 +1,69 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Callable
+from typing import Any
+
+"""BOUNDED PROCESS POOL
+
+cpu heavy work (bcrypt) runs in worker processes so it does not hold the GIL of the
+api process. admission is bounded: once max_pending calls are queued or running new
+calls fail fast with PoolSaturated instead of piling up behind the others
+"""
+
+
+class PoolSaturated(Exception):
+    def __init__(self, retry_after: int = 1):
+        super().__init__("worker pool is saturated")
+        self.retry_after = retry_after
+
+
+class BoundedProcessPool:
+    def __init__(self, workers: int, max_pending: int, retry_after: int = 1):
+        self.workers = workers
+        self.max_pending = max(1, max_pending)
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    #spawn, forking a threaded server process is not safe
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                         mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """run fn(*args), in a worker process when workers > 0 or inline otherwise"""
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PoolSaturated(retry_after=self.retry_after)
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    async def run_async(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """same as run but awaits the worker instead of blocking the event loop"""
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PoolSaturated(retry_after=self.retry_after)
+        try:
+            if self.workers <= 0:
+                return await asyncio.to_thread(fn, *args)
+            return await asyncio.wrap_future(self._get_executor().submit(fn, *args))
+        finally:
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,106 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from datetime import date, datetime, UTC
+
+import numpy as np
+from sqlalchemy import Date, String, cast, event, func, select
+from sqlalchemy.orm import Session
+
+from app.core.analytics import compute_analytics
+from app.core.config import settings
+from app.core.cache import TTLCache
+from app.crud.archive import archive_months, cold_partitions
+from app.db.shards import shard_session
+from app.models.transactions import Transaction
+from app.schemas.analytics import AnalyticsResponse
+"""ANALYTICS LOADING + MEMO
+
+results are cached per user under a generation number. any commit that wrote one of the user's
+transactions bumps it, so older entries are never read again and age out of the LRU. a result
+computed from a snapshot taken before that commit lands under the old generation and is skipped.
+generations come from one process wide counter and are never reused, so a user whose last bump
+is older than the cache ttl can be forgotten: every entry keyed under it has expired
+"""
+
+DEFAULT_WINDOW_DAYS = 90
+MAX_WINDOW_DAYS = 3650
+DEFAULT_HORIZON_DAYS = 30
+MAX_HORIZON_DAYS = 365
+STALE_USERS_KEY = "analytics_stale_users"
+
+analytics_cache: TTLCache[AnalyticsResponse] = TTLCache(
+    maxsize=settings.analytics_cache_size,
+    ttl=settings.analytics_cache_ttl_seconds,
+)
+#user -> (generation, monotonic time of the bump), oldest bump first
+_generations: OrderedDict[int, tuple[int, float]] = OrderedDict()
+_next_generation = itertools.count(1)
+_generations_lock = threading.Lock()
+
+def mark_analytics_stale(db: Session, user_ids: Iterable[int]) -> None:
+    """remember users whose transactions this session wrote, their memo is dropped once it commits"""
+    db.info.setdefault(STALE_USERS_KEY, set()).update(user_ids)
+
+def invalidate_analytics(user_id: int) -> None:
+    now = time.monotonic()
+    with _generations_lock:
+        _generations[user_id] = (next(_next_generation), now)
+        _generations.move_to_end(user_id)
+        while _generations and next(iter(_generations.values()))[1] <= now - analytics_cache.ttl:
+            _generations.popitem(last=False)
+    analytics_cache.note_invalidation()
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for user_id in session.info.pop(STALE_USERS_KEY, ()):
+        invalidate_analytics(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(STALE_USERS_KEY, None)
+
+def _day_column(dialect: str):
+    #sqlite hands back ISO strings that numpy parses in one go, skip the per row date conversion
+    if dialect == "sqlite":
+        return func.date(Transaction.transaction_date, type_=String)
+    return cast(Transaction.transaction_date, Date)
+
+def load_user_flows(db: Session, user_id: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(day datetime64[D], amount_cents int64, is_income bool) for every transaction of the user"""
+    db = shard_session(db, user_id)
+    stmt = select(_day_column(db.get_bind().dialect.name),
+                  Transaction.amount_cents,
+                  Transaction.txn_type == "income") \
+                .where(Transaction.user_id == user_id)
+    rows = db.execute(stmt).all()
+    #archived months, partitions hold datetimes so they become their own arrays
+    cold = [row for partition in cold_partitions(db, user_id, archive_months(db, user_id), path="analytics")
+            for row in partition]
+    if not rows and not cold:
+        return np.array([], dtype="datetime64[D]"), np.array([], dtype=np.int64), np.array([], dtype=bool)
+    days, amounts, is_income = zip(*rows) if rows else ((), (), ())
+    return (np.concatenate((np.array(days, dtype="datetime64[D]"),
+                            np.array([row.transaction_date.date() for row in cold], dtype="datetime64[D]"))),
+            np.array(amounts + tuple(row.amount_cents for row in cold), dtype=np.int64),
+            np.array(is_income + tuple(row.txn_type == "income" for row in cold), dtype=bool))
+
+def get_analytics(db: Session, user_id: int, window_days: int = DEFAULT_WINDOW_DAYS,
+                  horizon_days: int = DEFAULT_HORIZON_DAYS, as_of: date | None = None) -> AnalyticsResponse:
+    window_days = min(max(1, window_days), MAX_WINDOW_DAYS)
+    horizon_days = min(max(1, horizon_days), MAX_HORIZON_DAYS)
+    as_of = as_of or datetime.now(UTC).date()
+    with _generations_lock:
+        generation = _generations.get(user_id, (0, 0.0))[0]
+    key = f"{user_id}:{generation}:{as_of.isoformat()}:{window_days}:{horizon_days}"
+
+    result = analytics_cache.get(key)
+    if result is not None:
+        return result
+    days, amounts_cents, is_income = load_user_flows(db, user_id)
+    result = compute_analytics(days, amounts_cents, is_income, as_of=as_of,
+                               window_days=window_days, horizon_days=horizon_days)
+    analytics_cache.set(key, result)
+    return result
@@ -0,0 +1,220 @@
+import math
+import time
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.archive import ARCHIVE_COLUMNS, ArchivedRow, decode_partition, encode_partition
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.money import CENTS_PER_UNIT
+from app.models.transaction_archive import TransactionArchive
+from app.models.transactions import Transaction
+from app.schemas.transaction import TransactionFilter
+"""COLD TRANSACTION PARTITIONS
+
+old months of a user's transactions leave the hot table and live on as one compressed partition
+per (user, month) in transaction_archives, on the same database (shard) as the user's hot rows.
+monthly_rollups keep covering archived months, so /summary never reads a partition. listing,
+export and analytics merge partitions back in only when the requested range reaches them
+"""
+
+ARCHIVE_COMPRESSION_LEVEL = settings.archive_compression_level
+ID_CHUNK_SIZE = 500
+
+ARCHIVED_ROWS = registry.counter("txn_archive_rows_total", "transactions moved into cold partitions")
+RESTORED_ROWS = registry.counter("txn_archive_restored_rows_total", "transactions moved back into the hot table")
+RAW_BYTES = registry.counter("txn_archive_raw_bytes_total", "uncompressed size of the rows archived")
+STORED_BYTES = registry.counter("txn_archive_stored_bytes_total", "compressed size of the rows archived")
+BYTES_SAVED = registry.counter("txn_archive_bytes_saved_total", "uncompressed minus compressed size of the rows archived")
+COLD_READS = registry.counter("txn_archive_partitions_read_total", "cold partitions decoded to serve a read",
+                              labels=("path",))
+COLD_READ_SECONDS = registry.histogram("txn_archive_read_seconds", "load + decode time of one cold partition",
+                                       labels=("path",))
+
+
+@dataclass
+class PartitionWrite:
+    rows: int
+    raw_bytes: int
+    stored_bytes: int
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def _month_start(value: datetime | date) -> date:
+    return date(value.year, value.month, 1)
+
+def _delete_ids(db: Session, ids: Sequence[int]) -> None:
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        db.execute(delete(Transaction).where(Transaction.id.in_(ids[start:start + ID_CHUNK_SIZE])))
+
+def archive_user_month(db: Session, user_id: int, month: date) -> PartitionWrite | None:
+    """
+    move the user's hot rows dated in month into that month's partition, merging with one that
+    already exists, in one commit. the partition is built from what DELETE ... RETURNING took out
+    of transactions, so a row deleted meanwhile is either gone from both or was never archived
+    """
+    in_month = (Transaction.user_id == user_id) & (Transaction.transaction_date >= month) \
+        & (Transaction.transaction_date < next_month(month))
+    columns = [getattr(Transaction, column) for column in ARCHIVE_COLUMNS]
+    if db.get_bind().dialect.delete_returning:
+        taken = db.execute(delete(Transaction).where(in_month).returning(*columns)
+                           .execution_options(synchronize_session=False))
+        rows = [ArchivedRow._make(row) for row in taken]
+    else:
+        rows = [ArchivedRow._make(row) for row in db.execute(select(*columns).where(in_month).with_for_update())]
+        _delete_ids(db, [row.id for row in rows])
+    if not rows:
+        db.rollback()
+        return None
+    rows.sort(key=lambda row: (row.transaction_date, row.id))
+
+    #delete_archived_row rewrites partitions too
+    partition = db.get(TransactionArchive, (user_id, month), with_for_update=True)
+    previous_raw = previous_stored = 0
+    archived = rows
+    if partition is not None:
+        previous_raw, previous_stored = partition.raw_bytes, partition.stored_bytes
+        archived = sorted(decode_partition(partition.data) + rows, key=lambda row: (row.transaction_date, row.id))
+    data, raw_bytes = encode_partition(archived, level=ARCHIVE_COMPRESSION_LEVEL)
+    values = {"row_count": len(archived), "raw_bytes": raw_bytes, "stored_bytes": len(data),
+              "data": data, "archived_at": datetime.utcnow()}
+    if partition is None:
+        db.add(TransactionArchive(user_id=user_id, month=month, **values))
+    else:
+        for name, value in values.items():
+            setattr(partition, name, value)
+    db.commit()
+
+    written = PartitionWrite(rows=len(rows), raw_bytes=raw_bytes - previous_raw,
+                             stored_bytes=len(data) - previous_stored)
+    ARCHIVED_ROWS.inc(amount=written.rows)
+    RAW_BYTES.inc(amount=written.raw_bytes)
+    STORED_BYTES.inc(amount=written.stored_bytes)
+    BYTES_SAVED.inc(amount=written.raw_bytes - written.stored_bytes)
+    return written
+
+def archive_user(db: Session, user_id: int, before: date) -> list[PartitionWrite]:
+    """archive every month of the user that ends before `before` (a first of month), one commit per month"""
+    written = []
+    oldest = select(func.min(Transaction.transaction_date)) \
+                .where(Transaction.user_id == user_id, Transaction.transaction_date < before)
+    first = db.execute(oldest).scalar()
+    while first is not None:
+        month = _month_start(first)
+        result = archive_user_month(db, user_id, month)
+        if result is not None:
+            written.append(result)
+        first = db.execute(oldest.where(Transaction.transaction_date >= next_month(month))).scalar()
+    return written
+
+def restore_partitions(db: Session, user_id: int, month: date | None = None) -> int:
+    """
+    move the user's partitions (or just one month) back into the hot table, one commit per month.
+    rows keep their id unless it has been taken since, then the database assigns a new one.
+    returns the rows restored
+    """
+    months = select(TransactionArchive.month).where(TransactionArchive.user_id == user_id)
+    if month is not None:
+        months = months.where(TransactionArchive.month == _month_start(month))
+    restored = 0
+    for partition_month in db.execute(months.order_by(TransactionArchive.month)).scalars().all():
+        partition = db.get(TransactionArchive, (user_id, partition_month))
+        rows = decode_partition(partition.data)
+        ids = [row.id for row in rows]
+        taken = set()
+        for start in range(0, len(ids), ID_CHUNK_SIZE):
+            taken.update(db.execute(select(Transaction.id)
+                                    .where(Transaction.id.in_(ids[start:start + ID_CHUNK_SIZE]))).scalars())
+        values = []
+        for row in rows:
+            value = {**row._asdict(), "user_id": user_id}
+            if row.id in taken:
+                del value["id"]
+            values.append(value)
+        #split by shape, executemany needs the same keys in every row
+        with_ids = [value for value in values if "id" in value]
+        without_ids = [value for value in values if "id" not in value]
+        for batch in (with_ids, without_ids):
+            if batch:
+                db.execute(insert(Transaction), batch)
+        db.delete(partition)
+        db.commit()
+        restored += len(rows)
+    RESTORED_ROWS.inc(amount=restored)
+    return restored
+
+def delete_archived_row(db: Session, user_id: int, txn_id: int) -> ArchivedRow | None:
+    """
+    take one row out of the user's partition that holds it, the partition is re-encoded or dropped
+    once empty. returns the row so the caller can adjust the rollups in the same transaction, does
+    not commit. db has to be on the writer already (delete_transaction's hot DELETE puts it there),
+    so two deletes of the same archived row cannot both find it
+    """
+    months = db.execute(select(TransactionArchive.month).where(TransactionArchive.user_id == user_id)
+                        .order_by(TransactionArchive.month.desc())).scalars().all()
+    for month in months:
+        started = time.perf_counter()
+        partition = db.get(TransactionArchive, (user_id, month), with_for_update=True)
+        rows = decode_partition(partition.data)
+        COLD_READS.inc("delete")
+        COLD_READ_SECONDS.observe("delete", value=time.perf_counter() - started)
+        deleted = next((row for row in rows if row.id == txn_id), None)
+        if deleted is None:
+            continue
+        kept = [row for row in rows if row.id != txn_id]
+        if kept:
+            data, raw_bytes = encode_partition(kept, level=ARCHIVE_COMPRESSION_LEVEL)
+            partition.row_count, partition.raw_bytes = len(kept), raw_bytes
+            partition.stored_bytes, partition.data = len(data), data
+        else:
+            db.delete(partition)
+        db.flush()
+        return deleted
+    return None
+
+def archive_months(db: Session, user_id: int, filters: TransactionFilter | None = None,
+                   until: datetime | None = None, descending: bool = False) -> list[date]:
+    """months with a partition for the user that can hold rows in the filter's date range (and not after until)"""
+    stmt = select(TransactionArchive.month).where(TransactionArchive.user_id == user_id)
+    if filters is not None and filters.date_from is not None:
+        stmt = stmt.where(TransactionArchive.month >= _month_start(filters.date_from))
+    if filters is not None and filters.date_to is not None:
+        stmt = stmt.where(TransactionArchive.month <= _month_start(filters.date_to))
+    if until is not None:
+        stmt = stmt.where(TransactionArchive.month <= _month_start(until))
+    order = TransactionArchive.month.desc() if descending else TransactionArchive.month
+    return list(db.execute(stmt.order_by(order)).scalars().all())
+
+def row_matches(row: ArchivedRow, filters: TransactionFilter | None) -> bool:
+    """transaction_conditions for a decoded row"""
+    if filters is None:
+        return True
+    if filters.date_from is not None and row.transaction_date < filters.date_from:
+        return False
+    if filters.date_to is not None and row.transaction_date > filters.date_to:
+        return False
+    if filters.txn_type is not None and row.txn_type != filters.txn_type:
+        return False
+    if filters.min_amount is not None and row.amount_cents < math.ceil(filters.min_amount * CENTS_PER_UNIT):
+        return False
+    if filters.max_amount is not None and row.amount_cents > math.floor(filters.max_amount * CENTS_PER_UNIT):
+        return False
+    return True
+
+def cold_partitions(db: Session, user_id: int, months: Sequence[date], filters: TransactionFilter | None = None,
+                    path: str = "list") -> Iterator[list[ArchivedRow]]:
+    """the matching rows of each month in turn, oldest first within a month. partitions are loaded one at a time"""
+    for month in months:
+        started = time.perf_counter()
+        data = db.execute(select(TransactionArchive.data)
+                          .where(TransactionArchive.user_id == user_id, TransactionArchive.month == month)).scalar()
+        rows = [] if data is None else [row for row in decode_partition(data) if row_matches(row, filters)]
+        COLD_READS.inc(path)
+        COLD_READ_SECONDS.observe(path, value=time.perf_counter() - started)
+        yield rows
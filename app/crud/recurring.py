@@ -0,0 +1,144 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.core.recurrence import Recurrence, iter_occurrences, parse_rrule
+from app.crud.transactions import insert_transaction_rows, transaction_row, validate_transaction
+from app.db.shards import shard_session
+from app.models.recurring_rule import RecurringRule
+from app.schemas.recurring import RecurringRuleCreate, RecurringRuleUpdate
+"""RECURRING TRANSACTION RULES
+
+a rule lives on the same database (shard) as its user's transactions, so the scheduler can insert
+a rule's due occurrences and move its next_due_at past them in one commit. the UPDATE that moves
+next_due_at only matches while it still holds the value the occurrences were computed from, a
+second scheduler (another worker, or a run that overlaps a restart) that read the same rule
+matches nothing and skips it. an occurrence is therefore written exactly once however often the
+scheduler runs, and occurrences missed while nothing ran are caught up by the next run
+"""
+
+DEFAULT_MATERIALIZE_BATCH_SIZE = 500
+
+logger = logging.getLogger("app.recurring")
+
+
+@dataclass
+class MaterializeResult:
+    rules: int = 0 #distinct rules that wrote occurrences
+    occurrences: int = 0
+
+
+def next_due(schedule: Recurrence, dtstart: datetime, occurrences: int, start: datetime | None = None) -> datetime | None:
+    """first occurrence at or after start not beyond COUNT/UNTIL, None when the rule is finished"""
+    if schedule.count is not None and occurrences >= schedule.count:
+        return None
+    return next(iter_occurrences(schedule, dtstart, start), None)
+
+def create_rule(db: Session, body: RecurringRuleCreate, user_id: int) -> RecurringRule | None:
+    if validate_transaction(desc=body.desc, amount_cents=body.amount, txn_type=body.txn_type,
+                            transaction_date=body.dtstart):
+        return None
+    db = shard_session(db, user_id)
+    rule = RecurringRule(user_id=user_id, amount_cents=body.amount, txn_type=body.txn_type, desc=body.desc,
+                         rrule=body.rrule, dtstart=body.dtstart, occurrences=0, active=True,
+                         next_due_at=next_due(parse_rrule(body.rrule), body.dtstart, 0))
+    db.add(rule)
+    db.commit()
+    db.refresh(rule)
+    return rule
+
+def list_rules(db: Session, user_id: int) -> list[RecurringRule]:
+    db = shard_session(db, user_id)
+    return list(db.execute(select(RecurringRule).where(RecurringRule.user_id == user_id)
+                           .order_by(RecurringRule.id)).scalars().all())
+
+def get_rule(db: Session, rule_id: int, user_id: int) -> RecurringRule | None:
+    db = shard_session(db, user_id)
+    return db.execute(select(RecurringRule).where((RecurringRule.id == rule_id) &
+                                                  (RecurringRule.user_id == user_id))).scalar()
+
+def update_rule(db: Session, rule: RecurringRule, changes: RecurringRuleUpdate) -> RecurringRule | None:
+    """None when the changed rule would not make a valid transaction"""
+    values = changes.model_dump(exclude_unset=True, exclude_none=True)
+    amount_cents = values.pop("amount", rule.amount_cents)
+    if validate_transaction(desc=values.get("desc", rule.desc), amount_cents=amount_cents,
+                            txn_type=values.get("txn_type", rule.txn_type), transaction_date=rule.dtstart):
+        return None
+    active = values.pop("active", rule.active)
+    db = shard_session(db, rule.user_id)
+    if active != rule.active:
+        #resuming starts from now, occurrences that fell while paused are skipped rather than caught up
+        rule.next_due_at = next_due(parse_rrule(rule.rrule), rule.dtstart, rule.occurrences,
+                                    start=datetime.utcnow()) if active else None
+        rule.active = active
+    rule.amount_cents = amount_cents
+    for name, value in values.items():
+        setattr(rule, name, value)
+    db.commit()
+    db.refresh(rule)
+    return rule
+
+def delete_rule(db: Session, rule_id: int, user_id: int) -> bool:
+    """transactions the rule already wrote are kept"""
+    rule = get_rule(db, rule_id=rule_id, user_id=user_id)
+    if rule is None:
+        return False
+    db = shard_session(db, user_id)
+    db.delete(rule)
+    db.commit()
+    return True
+
+def _due_occurrences(rule: RecurringRule, now: datetime, limit: int) -> tuple[list[datetime], datetime | None]:
+    """up to limit occurrences from next_due_at until now, and the next_due_at that follows them"""
+    schedule = parse_rrule(rule.rrule)
+    due: list[datetime] = []
+    for occurrence in iter_occurrences(schedule, rule.dtstart, rule.next_due_at):
+        if schedule.count is not None and rule.occurrences + len(due) >= schedule.count:
+            return due, None
+        if occurrence > now or len(due) == limit:
+            return due, occurrence
+        due.append(occurrence)
+    return due, None
+
+def materialize_due(db: Session, now: datetime,
+                    batch_size: int = DEFAULT_MATERIALIZE_BATCH_SIZE) -> MaterializeResult:
+    """
+    write every occurrence due by now on one storage session, batch_size rules per pass read
+    through the next_due_at index and about batch_size transactions per commit. a rule far
+    behind is caught up over several passes
+    """
+    result = MaterializeResult()
+    advanced: set[int] = set()
+    while True:
+        rules = db.execute(select(RecurringRule).where(RecurringRule.next_due_at <= now)
+                           .order_by(RecurringRule.next_due_at, RecurringRule.id)
+                           .limit(batch_size)).scalars().all()
+        if not rules:
+            result.rules = len(advanced)
+            return result
+        rows: list[dict] = []
+        for rule in rules:
+            if len(rows) >= batch_size:
+                break
+            try:
+                due, following = _due_occurrences(rule, now, limit=batch_size)
+            except ValueError:
+                logger.exception("recurring rule %d has an unreadable rrule %r, stopping it", rule.id, rule.rrule)
+                due, following = [], None
+            claim = update(RecurringRule) \
+                        .where((RecurringRule.id == rule.id) & (RecurringRule.next_due_at == rule.next_due_at)) \
+                        .values(next_due_at=following, occurrences=RecurringRule.occurrences + len(due),
+                                last_materialized_at=now) \
+                        .execution_options(synchronize_session=False)
+            if db.execute(claim).rowcount != 1:
+                continue #moved on by another scheduler since it was read
+            rows.extend(transaction_row(rule.desc, rule.amount_cents, rule.txn_type, occurrence, rule.user_id)
+                        for occurrence in due)
+            if due:
+                advanced.add(rule.id)
+        insert_transaction_rows(db, rows)
+        db.commit()
+        result.occurrences += len(rows)
@@ -0,0 +1,174 @@
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import date, datetime
+
+from sqlalchemy import Date, cast, delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.archive import decode_partition
+from app.core.money import cents_to_number
+from app.crud.analytics import mark_analytics_stale
+from app.db.shards import shard_session, storage_sessions
+from app.models.monthly_rollup import MonthlyRollup
+from app.models.transaction_archive import TransactionArchive
+from app.models.transactions import Transaction
+from app.schemas.summary import MonthlySummary, SummaryResponse
+"""MONTHLY ROLLUPS
+
+(user, month, txn_type) -> total_cents, count. written in the same db transaction as the
+transactions they summarize so /summary never has to aggregate the transactions table
+"""
+
+RollupKey = tuple[int, date, str]
+REBUILD_CHUNK_SIZE = 5000
+
+_UPSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+
+def month_start(value: datetime | date) -> date:
+    return date(value.year, value.month, 1)
+
+def rollup_deltas(rows: Iterable[dict], sign: int = 1) -> dict[RollupKey, list]:
+    """fold transaction rows into [total_cents, count] deltas per rollup key, sign=-1 for deletes"""
+    deltas: dict[RollupKey, list] = defaultdict(lambda: [0, 0])
+    for row in rows:
+        key = (row["user_id"], month_start(row["transaction_date"]), row["txn_type"])
+        deltas[key][0] += sign * row["amount_cents"]
+        deltas[key][1] += sign
+    return deltas
+
+def apply_rollup_deltas(db: Session, deltas: dict[RollupKey, list]) -> None:
+    """upsert the deltas, does not commit so the caller's transaction covers both tables"""
+    if not deltas:
+        return
+    #every transaction write passes through here, so it is also where cached analytics go stale
+    mark_analytics_stale(db, {user_id for user_id, _, _ in deltas})
+    values = [{"user_id": user_id, "month": month, "txn_type": txn_type, "total_cents": total, "count": count}
+              for (user_id, month, txn_type), (total, count) in deltas.items()]
+
+    upsert = _UPSERTS.get(db.get_bind().dialect.name)
+    if upsert is not None:
+        stmt = upsert(MonthlyRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MonthlyRollup.user_id, MonthlyRollup.month, MonthlyRollup.txn_type],
+            set_={"total_cents": MonthlyRollup.total_cents + stmt.excluded.total_cents,
+                  "count": MonthlyRollup.count + stmt.excluded.count},
+        )
+        db.execute(stmt, values)
+        return
+
+    for value in values:
+        rollup = db.get(MonthlyRollup, (value["user_id"], value["month"], value["txn_type"]))
+        if rollup is None:
+            db.add(MonthlyRollup(**value))
+        else:
+            rollup.total_cents += value["total_cents"]
+            rollup.count += value["count"]
+    db.flush()
+
+def _month_column(dialect: str):
+    if dialect == "sqlite":
+        return func.date(Transaction.transaction_date, "start of month")
+    if dialect == "postgresql":
+        return cast(func.date_trunc("month", Transaction.transaction_date), Date)
+    return None
+
+def rebuild_rollups(db: Session, user_id: int | None = None) -> int:
+    """recompute rollups from the transactions table, for every user or a single one. returns rows written"""
+    if user_id is not None:
+        return _rebuild_rollups(shard_session(db, user_id), user_id)
+    return sum(_rebuild_rollups(storage, None) for storage in storage_sessions(db))
+
+def _rebuild_rollups(db: Session, user_id: int | None) -> int:
+    clear = delete(MonthlyRollup)
+    source = select(Transaction.user_id, Transaction.transaction_date, Transaction.txn_type, Transaction.amount_cents)
+    if user_id is not None:
+        clear = clear.where(MonthlyRollup.user_id == user_id)
+        source = source.where(Transaction.user_id == user_id)
+    db.execute(clear)
+
+    month = _month_column(db.get_bind().dialect.name)
+    if month is not None:
+        grouped = select(Transaction.user_id, month, Transaction.txn_type,
+                         func.sum(Transaction.amount_cents), func.count(Transaction.id)) \
+                    .group_by(Transaction.user_id, month, Transaction.txn_type)
+        if user_id is not None:
+            grouped = grouped.where(Transaction.user_id == user_id)
+        result = db.execute(insert(MonthlyRollup).from_select(
+            ["user_id", "month", "txn_type", "total_cents", "count"], grouped))
+        apply_rollup_deltas(db, _archived_deltas(db, user_id))
+        db.commit()
+        return result.rowcount or 0
+
+    #no date truncation available, fold the rows in python without loading them all
+    deltas: dict[RollupKey, list] = defaultdict(lambda: [0, 0])
+    for partition in db.execute(source.execution_options(yield_per=REBUILD_CHUNK_SIZE)).mappings().partitions():
+        for key, (total, count) in rollup_deltas(partition).items():
+            deltas[key][0] += total
+            deltas[key][1] += count
+    for key, (total, count) in _archived_deltas(db, user_id).items():
+        deltas[key][0] += total
+        deltas[key][1] += count
+    apply_rollup_deltas(db, deltas)
+    db.commit()
+    return len(deltas)
+
+def _archived_deltas(db: Session, user_id: int | None) -> dict[RollupKey, list]:
+    """archived months are no longer in transactions but still count, fold their partitions in one at a time"""
+    deltas: dict[RollupKey, list] = defaultdict(lambda: [0, 0])
+    partitions = select(TransactionArchive.user_id, TransactionArchive.data)
+    if user_id is not None:
+        partitions = partitions.where(TransactionArchive.user_id == user_id)
+    for owner, data in db.execute(partitions.execution_options(yield_per=1)):
+        rows = ({"user_id": owner, **row._asdict()} for row in decode_partition(data))
+        for key, (total, count) in rollup_deltas(rows).items():
+            deltas[key][0] += total
+            deltas[key][1] += count
+    return deltas
+
+def get_summary(db: Session, user_id: int, month_from: date | None = None,
+                month_to: date | None = None) -> SummaryResponse:
+    """monthly income/outcome and running balance read from the rollups only, summed as integer cents"""
+    db = shard_session(db, user_id)
+    opening = 0
+    if month_from is not None:
+        month_from = month_start(month_from)
+        before = select(MonthlyRollup.txn_type, func.sum(MonthlyRollup.total_cents)) \
+                    .where((MonthlyRollup.user_id == user_id) & (MonthlyRollup.month < month_from)) \
+                    .group_by(MonthlyRollup.txn_type)
+        for txn_type, total in db.execute(before):
+            opening += (total or 0) * (1 if txn_type == "income" else -1)
+
+    stmt = select(MonthlyRollup.month, MonthlyRollup.txn_type, MonthlyRollup.total_cents, MonthlyRollup.count) \
+                .where(MonthlyRollup.user_id == user_id) \
+                .order_by(MonthlyRollup.month)
+    if month_from is not None:
+        stmt = stmt.where(MonthlyRollup.month >= month_from)
+    if month_to is not None:
+        stmt = stmt.where(MonthlyRollup.month <= month_start(month_to))
+
+    per_month: dict[date, dict] = {}
+    for month, txn_type, total, count in db.execute(stmt):
+        bucket = per_month.setdefault(month, {"income": 0, "outcome": 0,
+                                              "income_count": 0, "outcome_count": 0})
+        if txn_type in ("income", "outcome"):
+            bucket[txn_type] += total or 0
+            bucket[f"{txn_type}_count"] += count
+
+    balance = opening
+    total_income = total_outcome = 0
+    months = []
+    for month, bucket in per_month.items():
+        net = bucket["income"] - bucket["outcome"]
+        balance += net
+        total_income += bucket["income"]
+        total_outcome += bucket["outcome"]
+        months.append(MonthlySummary(month=month, income=cents_to_number(bucket["income"]),
+                                     outcome=cents_to_number(bucket["outcome"]),
+                                     income_count=bucket["income_count"], outcome_count=bucket["outcome_count"],
+                                     net=cents_to_number(net), balance=cents_to_number(balance)))
+    return SummaryResponse(months=months, opening_balance=cents_to_number(opening),
+                           total_income=cents_to_number(total_income),
+                           total_outcome=cents_to_number(total_outcome), balance=cents_to_number(balance))
@@ -1,27 +1,344 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import Select, column, delete, func, insert, literal_column, select, table, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from pydantic import ValidationError
+from collections import namedtuple
+from collections.abc import Iterator, Sequence
 from app.models.transactions import Transaction
+from app.crud.rollups import apply_rollup_deltas, rollup_deltas
+from app.crud.archive import archive_months, cold_partitions, delete_archived_row, next_month
+from app.db.fts import FTS_TABLE, sqlite_fts_ready
+from app.core.money import CENTS_PER_UNIT
+from app.core.config import settings
+from app.core.group_commit import GroupCommitBuffer
+from app.db.session import mark_written
+from app.db.shards import shard_router, shard_session
+from app.schemas.transaction import TransactionCreate, TransactionBulkResult, TransactionReject, TransactionFilter
 from datetime import datetime
+from functools import partial
+from itertools import islice
+import base64
+import heapq
 import math
+import re
 
-def create_new_transaction(db:Session,desc:str, amount:float, txn_type: str, transaction_date:datetime, user_id:int)->Transaction | None:
-    if txn_type not in {"income", "outcome"}:
-        return None
+TXN_TYPES = {"income", "outcome"}
+DEFAULT_BULK_CHUNK_SIZE = 500
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_COLUMNS = ("id", "transaction_date", "txn_type", "amount", "desc", "created_at")
+#amount is exported from the integer column, app.core.export formats it back to a decimal
+EXPORT_EXPRESSIONS = {"amount": Transaction.amount_cents.label("amount")}
+SEARCH_TERM = re.compile(r"(\w+)(\*?)")
+
+transactions_fts = table(FTS_TABLE, column("rowid"), column("rank"))
+
+#TransactionRead as plain columns (TransactionRow), amount stays in cents until it is written out
+TRANSACTION_ROW_COLUMNS = (Transaction.amount_cents.label("amount"), Transaction.txn_type,
+                           Transaction.desc, Transaction.transaction_date, Transaction.id, Transaction.created_at)
+TransactionRowTuple = namedtuple("TransactionRowTuple", [column.key for column in TRANSACTION_ROW_COLUMNS])
+#where an archived row keeps each EXPORT_COLUMNS value
+ARCHIVED_EXPORT_FIELDS = tuple("amount_cents" if column == "amount" else column for column in EXPORT_COLUMNS)
+
+def validate_transaction(desc:str, amount_cents:int, txn_type:str, transaction_date:datetime)->str | None:
+    """returns the reason a transaction is rejected, None when it is valid"""
+    if txn_type not in TXN_TYPES:
+        return "txn_type must be income or outcome"
     if not desc:
-        return None
-    if amount is None or amount  <= 0 or math.isinf(amount):
-        return None
+        return "desc is required"
+    if amount_cents is None or amount_cents <= 0:
+        return "amount must be a positive number"
     if transaction_date is None:
+        return "transaction_date is required"
+    return None
+
+def write_transaction_batch(shard:int, rows:list[dict])->list[int]:
+    """group commit flush: every queued row of one shard in one transaction on the flusher's own session"""
+    db = shard_router.session(shard)
+    try:
+        mark_written(db, {row["user_id"] for row in rows})
+        ids = insert_transaction_rows(db, rows)
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+GROUP_COMMIT = settings.group_commit_enabled
+#one buffer per shard so a batch never spans two databases
+write_buffers = [GroupCommitBuffer(partial(write_transaction_batch, shard),
+                                   window_seconds=settings.group_commit_window_ms / 1000,
+                                   max_batch=settings.group_commit_max_batch)
+                 for shard in range(shard_router.size)]
+
+def write_buffer_for(user_id:int)->GroupCommitBuffer:
+    return write_buffers[shard_router.shard_for(user_id)]
+
+def close_write_buffers()->None:
+    for buffer in write_buffers:
+        buffer.close()
+
+def transaction_row(desc:str, amount_cents:int, txn_type:str, transaction_date:datetime, user_id:int)->dict:
+    return {"user_id": user_id, "amount_cents": amount_cents, "txn_type": txn_type,
+            "transaction_date": transaction_date, "desc": desc, "created_at": datetime.utcnow()}
+
+def create_new_transaction(db:Session,desc:str, amount_cents:int, txn_type: str, transaction_date:datetime, user_id:int)->Transaction | None:
+    """
+    with GROUP_COMMIT the row joins the write buffer instead of committing on db, the returned
+    Transaction is detached and only comes back once the batch holding it has committed
+    """
+    if validate_transaction(desc=desc, amount_cents=amount_cents, txn_type=txn_type, transaction_date=transaction_date):
         return None
+    if GROUP_COMMIT:
+        row = transaction_row(desc, amount_cents, txn_type, transaction_date, user_id)
+        return Transaction(id=write_buffer_for(user_id).insert(row), **row)
 
+    db = shard_session(db, user_id)
     new_transaction = Transaction(
         user_id = user_id,
-        amount = amount,
+        amount_cents = amount_cents,
         txn_type = txn_type,
         transaction_date = transaction_date,
         desc = desc
     )
     db.add(new_transaction)
+    apply_rollup_deltas(db, rollup_deltas([{"user_id": user_id, "amount_cents": amount_cents,
+                                            "txn_type": txn_type, "transaction_date": transaction_date}]))
     db.commit()
     db.refresh(new_transaction)
     return new_transaction
-    
\ No newline at end of file
+
+def insert_transaction_rows(db:Session, rows:list[dict])->list[int]:
+    """one executemany INSERT for already validated rows plus their rollups, returns ids in row order. does not commit"""
+    if not rows:
+        return []
+    stmt = insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True)
+    ids = list(db.execute(stmt, rows).scalars().all())
+    apply_rollup_deltas(db, rollup_deltas(rows))
+    return ids
+
+def delete_transaction_statement(txn_id:int, user_id:int):
+    """
+    DELETE ... RETURNING on the writer, only the request whose delete removed the row gets it back
+    and subtracts it from the rollups, a concurrent delete of the same id gets nothing
+    """
+    return delete(Transaction) \
+                .where((Transaction.id == txn_id) & (Transaction.user_id == user_id)) \
+                .returning(Transaction.amount_cents, Transaction.txn_type, Transaction.transaction_date) \
+                .execution_options(synchronize_session=False)
+
+def delete_transaction(db:Session, txn_id:int, user_id:int)->bool:
+    """deletes a hot row, or one that GET /transactions served from an archive partition"""
+    db = shard_session(db, user_id)
+    deleted = db.execute(delete_transaction_statement(txn_id, user_id)).mappings().first()
+    if deleted is None:
+        archived = delete_archived_row(db, user_id, txn_id)
+        if archived is None:
+            db.rollback()
+            return False
+        deleted = archived._asdict()
+    apply_rollup_deltas(db, rollup_deltas([{"user_id": user_id, **deleted}], sign=-1))
+    db.commit()
+    return True
+
+def create_transactions_bulk(db:Session, items:Sequence[dict | TransactionCreate], user_id:int,
+                             chunk_size:int = DEFAULT_BULK_CHUNK_SIZE)->TransactionBulkResult:
+    """
+    insert many transactions with one executemany INSERT per chunk and a single commit.
+    invalid items are reported back by index instead of aborting the batch
+    """
+    db = shard_session(db, user_id)
+    chunk_size = max(1, chunk_size)
+    created_ids: list[int] = []
+    rejected: list[TransactionReject] = []
+    now = datetime.utcnow()
+
+    rows: list[dict] = []
+    for index, item in enumerate(items):
+        try:
+            txn = item if isinstance(item, TransactionCreate) else TransactionCreate.model_validate(item)
+        except ValidationError as exc:
+            rejected.append(TransactionReject(index=index, reason=exc.errors()[0]["msg"]))
+            continue
+        reason = validate_transaction(desc=txn.desc, amount_cents=txn.amount, txn_type=txn.txn_type,
+                                      transaction_date=txn.transaction_date)
+        if reason:
+            rejected.append(TransactionReject(index=index, reason=reason))
+            continue
+        rows.append({
+            "user_id": user_id,
+            "amount_cents": txn.amount,
+            "txn_type": txn.txn_type,
+            "transaction_date": txn.transaction_date,
+            "desc": txn.desc,
+            "created_at": now,
+        })
+
+    try:
+        for start in range(0, len(rows), chunk_size):
+            created_ids.extend(insert_transaction_rows(db, rows[start:start + chunk_size]))
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+    db.commit()
+    return TransactionBulkResult(created_ids=created_ids, rejected=rejected)
+
+def encode_cursor(transaction_date:datetime, txn_id:int)->str:
+    raw = f"{transaction_date.isoformat()}|{txn_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor:str)->tuple[datetime, int] | None:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        date_part, id_part = raw.rsplit("|", 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (ValueError, UnicodeError):
+        return None
+
+def transaction_conditions(user_id:int, filters:TransactionFilter | None = None)->list:
+    """WHERE clauses shared by listing and export, user_id first so the composite index applies"""
+    conditions = [Transaction.user_id == user_id]
+    if filters is None:
+        return conditions
+    if filters.date_from is not None:
+        conditions.append(Transaction.transaction_date >= filters.date_from)
+    if filters.date_to is not None:
+        conditions.append(Transaction.transaction_date <= filters.date_to)
+    if filters.txn_type is not None:
+        conditions.append(Transaction.txn_type == filters.txn_type)
+    if filters.min_amount is not None:
+        conditions.append(Transaction.amount_cents >= math.ceil(filters.min_amount * CENTS_PER_UNIT))
+    if filters.max_amount is not None:
+        conditions.append(Transaction.amount_cents <= math.floor(filters.max_amount * CENTS_PER_UNIT))
+    return conditions
+
+def transaction_page_statement(user_id:int, filters:TransactionFilter | None = None,
+                               after:tuple[datetime, int] | None = None,
+                               limit:int = DEFAULT_PAGE_SIZE, rows:bool = False)->Select:
+    """one row past limit so the caller can tell whether another page follows"""
+    conditions = transaction_conditions(user_id, filters)
+    if after is not None:
+        conditions.append(tuple_(Transaction.transaction_date, Transaction.id) < tuple_(*after))
+    stmt = select(*TRANSACTION_ROW_COLUMNS) if rows else select(Transaction)
+    return stmt.where(*conditions) \
+                .order_by(Transaction.transaction_date.desc(), Transaction.id.desc()) \
+                .limit(limit + 1)
+
+def keyset_page(items:list, limit:int)->tuple[list, str | None]:
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    last = items[-1]
+    return items, encode_cursor(last.transaction_date, last.id)
+
+def list_transactions(db:Session, user_id:int, filters:TransactionFilter | None = None,
+                      after:tuple[datetime, int] | None = None,
+                      limit:int = DEFAULT_PAGE_SIZE, rows:bool = False)->tuple[list, str | None]:
+    """
+    newest first page of a user's transactions using keyset pagination on (transaction_date, id).
+    returns the page and the cursor for the next one, None when there are no more rows.
+    rows=True returns TRANSACTION_ROW_COLUMNS tuples instead of Transaction objects
+    """
+    limit = min(max(1, limit), MAX_PAGE_SIZE)
+    db = shard_session(db, user_id)
+    result = db.execute(transaction_page_statement(user_id, filters, after, limit, rows=rows))
+    items = list(result.all() if rows else result.scalars().all())
+    return keyset_page(with_archived_rows(db, user_id, items, filters, after, limit, rows), limit)
+
+def with_archived_rows(db:Session, user_id:int, items:list, filters:TransactionFilter | None,
+                       after:tuple[datetime, int] | None, limit:int, rows:bool)->list:
+    """
+    merge cold partition rows into a newest first page of hot rows. partitions are decoded newest
+    month first and only until limit + 1 of their rows are in hand, nothing older can make the page
+    """
+    months = archive_months(db, user_id, filters, until=after[0] if after else None, descending=True)
+    if not months:
+        return items
+    if len(items) > limit and items[-1].transaction_date.date() >= next_month(months[0]):
+        return items
+    cold = []
+    for partition in cold_partitions(db, user_id, months, filters, path="list"):
+        cold.extend(row for row in reversed(partition)
+                    if after is None or (row.transaction_date, row.id) < after)
+        if len(cold) > limit:
+            break
+    if rows:
+        cold_items = [TransactionRowTuple(amount=row.amount_cents, txn_type=row.txn_type, desc=row.desc,
+                                          transaction_date=row.transaction_date, id=row.id,
+                                          created_at=row.created_at) for row in cold]
+    else:
+        cold_items = [Transaction(user_id=user_id, **row._asdict()) for row in cold]
+    merged = sorted(items + cold_items, key=lambda item: (item.transaction_date, item.id), reverse=True)
+    return merged[:limit + 1]
+
+def iter_transaction_rows(db:Session, user_id:int, filters:TransactionFilter | None = None,
+                          chunk_size:int = EXPORT_CHUNK_SIZE)->Iterator[Sequence]:
+    """
+    yields chunks of plain column tuples (EXPORT_COLUMNS order) oldest first. rows are pulled
+    from a server side cursor chunk_size at a time and never enter the identity map. archived
+    months in range are merged in one partition at a time
+    """
+    db = shard_session(db, user_id)
+    stmt = select(*(EXPORT_EXPRESSIONS.get(column, getattr(Transaction, column)) for column in EXPORT_COLUMNS)) \
+                .where(*transaction_conditions(user_id, filters)) \
+                .order_by(Transaction.transaction_date, Transaction.id) \
+                .execution_options(yield_per=chunk_size, stream_results=True)
+    months = archive_months(db, user_id, filters)
+    result = db.execute(stmt)
+    try:
+        if not months:
+            yield from result.tuples().partitions()
+            return
+        hot = (row for chunk in result.tuples().partitions() for row in chunk)
+        cold = (tuple(getattr(row, field) for field in ARCHIVED_EXPORT_FIELDS)
+                for partition in cold_partitions(db, user_id, months, filters, path="export") for row in partition)
+        date_at, id_at = EXPORT_COLUMNS.index("transaction_date"), EXPORT_COLUMNS.index("id")
+        merged = heapq.merge(cold, hot, key=lambda row: (row[date_at], row[id_at]))
+        while chunk := list(islice(merged, chunk_size)):
+            yield chunk
+    finally:
+        result.close()
+
+
+def search_terms(q:str)->list[tuple[str, bool]]:
+    """words of a search query, a trailing * makes that word a prefix match. punctuation is dropped"""
+    return [(word, bool(star)) for word, star in SEARCH_TERM.findall(q)]
+
+def search_transactions(db:Session, user_id:int, q:str, filters:TransactionFilter | None = None,
+                        offset:int = 0, limit:int = DEFAULT_PAGE_SIZE, rows:bool = False)->tuple[list, int | None]:
+    """
+    best matching transactions whose desc contains every word of q. uses the FTS5 index on sqlite and
+    to_tsvector on postgres, any other backend (or sqlite without FTS5) falls back to ILIKE in date order.
+    returns the page and the offset of the next one, None when there are no more rows. rows works as in list_transactions
+    """
+    terms = search_terms(q)
+    if not terms:
+        return [], None
+    limit = min(max(1, limit), MAX_PAGE_SIZE)
+    offset = max(0, offset)
+    conditions = transaction_conditions(user_id, filters)
+    stmt = select(*TRANSACTION_ROW_COLUMNS) if rows else select(Transaction)
+    db = shard_session(db, user_id)
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite" and sqlite_fts_ready(db):
+        #quoted so words like AND/OR/NEAR are plain terms, bm25 rank is ascending
+        match = " ".join(f'"{word}"' + ("*" if prefix else "") for word, prefix in terms)
+        stmt = stmt.join(transactions_fts, transactions_fts.c.rowid == Transaction.id) \
+                    .where(literal_column(FTS_TABLE).match(match), *conditions) \
+                    .order_by(transactions_fts.c.rank, Transaction.id.desc())
+    elif dialect == "postgresql":
+        vector = func.to_tsvector("simple", Transaction.desc)
+        query = func.to_tsquery("simple", " & ".join(word + (":*" if prefix else "") for word, prefix in terms))
+        stmt = stmt.where(vector.op("@@")(query), *conditions) \
+                    .order_by(func.ts_rank(vector, query).desc(), Transaction.id.desc())
+    else:
+        conditions.extend(Transaction.desc.icontains(word, autoescape=True) for word, _ in terms)
+        stmt = stmt.where(*conditions) \
+                    .order_by(Transaction.transaction_date.desc(), Transaction.id.desc())
+
+    result = db.execute(stmt.offset(offset).limit(limit + 1))
+    items = list(result.all() if rows else result.scalars().all())
+    if len(items) <= limit:
+        return items, None
+    return items[:limit], offset + limit
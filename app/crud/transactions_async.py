@@ -0,0 +1,107 @@
+import asyncio
+from collections.abc import Sequence
+from datetime import datetime
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.archive import delete_archived_row
+from app.crud.rollups import apply_rollup_deltas, rollup_deltas
+from app.crud.transactions import (DEFAULT_BULK_CHUNK_SIZE, DEFAULT_PAGE_SIZE, GROUP_COMMIT, MAX_PAGE_SIZE,
+                                   delete_transaction_statement, keyset_page, transaction_page_statement,
+                                   transaction_row, validate_transaction, with_archived_rows, write_buffer_for)
+from app.models.transactions import Transaction
+from app.schemas.transaction import TransactionBulkResult, TransactionCreate, TransactionFilter, TransactionReject
+"""ASYNC DB OPERATION LAYER, mirrors app.crud.transactions for DB_MODE=async
+
+rollup upserts reuse the sync helpers through AsyncSession.run_sync so both modes
+write them the same way inside the same transaction
+"""
+
+
+async def create_new_transaction(db: AsyncSession, desc: str, amount_cents: int, txn_type: str,
+                                 transaction_date: datetime, user_id: int) -> Transaction | None:
+    if validate_transaction(desc=desc, amount_cents=amount_cents, txn_type=txn_type,
+                            transaction_date=transaction_date):
+        return None
+    if GROUP_COMMIT:
+        #the flusher commits on the sync writer, wait for it without blocking the loop
+        row = transaction_row(desc, amount_cents, txn_type, transaction_date, user_id)
+        return Transaction(id=await asyncio.wrap_future(write_buffer_for(user_id).submit(row)), **row)
+
+    new_transaction = Transaction(
+        user_id = user_id,
+        amount_cents = amount_cents,
+        txn_type = txn_type,
+        transaction_date = transaction_date,
+        desc = desc
+    )
+    db.add(new_transaction)
+    await db.run_sync(apply_rollup_deltas, rollup_deltas([{"user_id": user_id, "amount_cents": amount_cents,
+                                                            "txn_type": txn_type,
+                                                            "transaction_date": transaction_date}]))
+    await db.commit()
+    return new_transaction
+
+async def insert_transaction_rows(db: AsyncSession, rows: list[dict]) -> list[int]:
+    if not rows:
+        return []
+    stmt = insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True)
+    ids = list((await db.execute(stmt, rows)).scalars().all())
+    await db.run_sync(apply_rollup_deltas, rollup_deltas(rows))
+    return ids
+
+async def delete_transaction(db: AsyncSession, txn_id: int, user_id: int) -> bool:
+    deleted = (await db.execute(delete_transaction_statement(txn_id, user_id))).mappings().first()
+    if deleted is None:
+        archived = await db.run_sync(delete_archived_row, user_id, txn_id)
+        if archived is None:
+            await db.rollback()
+            return False
+        deleted = archived._asdict()
+    await db.run_sync(apply_rollup_deltas, rollup_deltas([{"user_id": user_id, **deleted}], sign=-1))
+    await db.commit()
+    return True
+
+async def create_transactions_bulk(db: AsyncSession, items: Sequence[dict | TransactionCreate], user_id: int,
+                                   chunk_size: int = DEFAULT_BULK_CHUNK_SIZE) -> TransactionBulkResult:
+    chunk_size = max(1, chunk_size)
+    created_ids: list[int] = []
+    rejected: list[TransactionReject] = []
+    now = datetime.utcnow()
+
+    rows: list[dict] = []
+    for index, item in enumerate(items):
+        try:
+            txn = item if isinstance(item, TransactionCreate) else TransactionCreate.model_validate(item)
+        except ValidationError as exc:
+            rejected.append(TransactionReject(index=index, reason=exc.errors()[0]["msg"]))
+            continue
+        reason = validate_transaction(desc=txn.desc, amount_cents=txn.amount, txn_type=txn.txn_type,
+                                      transaction_date=txn.transaction_date)
+        if reason:
+            rejected.append(TransactionReject(index=index, reason=reason))
+            continue
+        rows.append({"user_id": user_id, "amount_cents": txn.amount, "txn_type": txn.txn_type,
+                     "transaction_date": txn.transaction_date, "desc": txn.desc, "created_at": now})
+
+    try:
+        for start in range(0, len(rows), chunk_size):
+            created_ids.extend(await insert_transaction_rows(db, rows[start:start + chunk_size]))
+    except SQLAlchemyError:
+        await db.rollback()
+        raise
+    await db.commit()
+    return TransactionBulkResult(created_ids=created_ids, rejected=rejected)
+
+async def list_transactions(db: AsyncSession, user_id: int, filters: TransactionFilter | None = None,
+                            after: tuple[datetime, int] | None = None,
+                            limit: int = DEFAULT_PAGE_SIZE, rows: bool = False) -> tuple[list, str | None]:
+    limit = min(max(1, limit), MAX_PAGE_SIZE)
+    result = await db.execute(transaction_page_statement(user_id, filters, after, limit, rows=rows))
+    items = list(result.all() if rows else result.scalars().all())
+    #archived months are merged in by the sync helper, it only reads when the page reaches a partition
+    items = await db.run_sync(with_archived_rows, user_id, items, filters, after, limit, rows)
+    return keyset_page(items, limit)
@@ -1,21 +1,72 @@
 from sqlalchemy.orm import Session
 from app.models.user import User
 from app.models.auth_session import AuthSession
-from app.core.security import verify_password,hash_refresh_token, decode_access_token, create_access_token
+from app.core.security import verify_password, verify_and_update_password, hash_password, hash_refresh_token, decode_access_token, create_access_token, \
+    generate_refresh_token, verify_and_update_password_async
+from app.core.metrics import registry
+import logging
 from sqlalchemy import select, delete, update,Column
-from dotenv import load_dotenv,dotenv_values
+from app.core.config import settings
 from fastapi.requests import Request
+from fastapi.concurrency import run_in_threadpool
 from app.schemas.auth import Token
+from app.schemas.user import Principal
+from app.core.principal_cache import principal_cache
 from fastapi.exceptions import HTTPException
 from datetime import datetime, timedelta
+import time
 """DB OPERATION LAYER"""
 
-config = {
-    **dotenv_values(".env")
-}
+reuse_log = logging.getLogger("app.auth.refresh_reuse")
+REFRESH_REUSE = registry.counter("auth_refresh_reuse_total", "revoked refresh tokens presented again")
+
 def get_user_by_email(db: Session, email: str)-> User | None:
     return db.query(User).filter(User.email == email).first()
 
+def get_principal(db: Session, email: str)-> Principal | None:
+    """cached view of the user behind a token subject, only hits the db on a miss"""
+    principal = principal_cache.get(email)
+    if principal is not None:
+        return principal
+    user = get_user_by_email(db, email)
+    if not user:
+        return None
+    principal = Principal.model_validate(user)
+    principal_cache.set(email, principal)
+    return principal
+
+def invalidate_principal(email: str)->None:
+    principal_cache.invalidate(email)
+
+def set_user_active(db: Session, user_id: int, is_active: bool)-> User | None:
+    user = query_user_from_user_id(db=db, user_id=user_id)
+    if not user:
+        return None
+    user.is_active = is_active
+    if not is_active:
+        revoke_user_sessions(db=db, user_id=user.id)
+    db.commit()
+    invalidate_principal(user.email)
+    return user
+
+def change_user_password(db: Session, user_id: int, current_password: str, new_password: str)->bool:
+    user = query_user_from_user_id(db=db, user_id=user_id)
+    if not user or not verify_password(current_password, user.hashed_password):
+        return False
+    user.hashed_password = hash_password(new_password)
+    revoke_user_sessions(db=db, user_id=user.id)
+    db.commit()
+    invalidate_principal(user.email)
+    return True
+
+def revoke_user_sessions(db: Session, user_id: int)-> int:
+    """revoke every live refresh session of a user, does not commit"""
+    now = datetime.utcnow()
+    stmt = update(AuthSession).where((AuthSession.user_id == user_id) &
+                                     (AuthSession.revoked_at.is_(None)) &
+                                     (AuthSession.expires_at > now)).values(revoked_at = now)
+    return db.execute(stmt).rowcount or 0
+
 #returns full auth Session for said refresh hash
 def query_auth_session(db:Session, hashed_refresh_token: str)->AuthSession:
     from datetime import datetime, timezone
@@ -34,22 +85,13 @@ def query_user_from_user_id(db:Session, user_id:int)-> User | None:
     user = db.execute(stmt).scalar()
     return user
 
-def update_auth_session(user:User, db:Session, request:Request)->Token:
-    from datetime import datetime, timezone, timedelta
-    now = datetime.utcnow()
-
-    stmt = update(AuthSession).where((AuthSession.user_id == user.id) & 
-                                     (AuthSession.revoked_at.is_(None)) & 
-                                     (AuthSession.expires_at > now)).values(revoked_at = now)
-    db.execute(stmt)
-
-    from app.core.security import generate_refresh_token, hash_refresh_token
+def issue_auth_session(db:Session, user_id:int, email:str, request:Request, now:datetime)->Token:
+    """insert a new refresh session and commit, callers revoke the old ones first"""
     refresh_token = generate_refresh_token()
-    hashed_refresh_token = hash_refresh_token(refresh_token)
     auth_session = AuthSession(
-         user_id = user.id,
-         token_hash = hashed_refresh_token,
-         expires_at = now+timedelta(days=int(config.get('REFRESH_TOKEN_EXPIRE_DAYS'))),
+         user_id = user_id,
+         token_hash = hash_refresh_token(refresh_token),
+         expires_at = now+timedelta(days=settings.refresh_token_expire_days),
          last_used_at = now,
          revoked_at = None,
          ip = request.client.host if request.client else None
@@ -57,27 +99,99 @@ def update_auth_session(user:User, db:Session, request:Request)->Token:
     db.add(auth_session)
     db.commit()
 
-    new_access = create_access_token(subject=user.email)
+    new_access = create_access_token(subject=email)
     return Token(access_token=new_access, token_type="bearer", refresh_token=refresh_token)
 
+def update_auth_session(user:User, db:Session, request:Request)->Token:
+    now = datetime.utcnow()
+    revoke_user_sessions(db=db, user_id=user.id)
+    return issue_auth_session(db=db, user_id=user.id, email=user.email, request=request, now=now)
+
+def revoke_for_rotation(db:Session, session_id:int, user_id:int, now:datetime)->bool:
+    """
+    revoke every live session of the user and report whether session_id was still live,
+    False means another request rotated (or revoked) it first
+    """
+    live = (AuthSession.user_id == user_id) & (AuthSession.revoked_at.is_(None)) & (AuthSession.expires_at > now)
+    if db.get_bind().dialect.update_returning:
+        stmt = update(AuthSession).where(live).values(revoked_at = now) \
+                    .returning(AuthSession.id).execution_options(synchronize_session=False)
+        return session_id in db.execute(stmt).scalars().all()
+
+    claim = update(AuthSession).where((AuthSession.id == session_id) & live).values(revoked_at = now) \
+                .execution_options(synchronize_session=False)
+    if db.execute(claim).rowcount != 1:
+        return False
+    db.execute(update(AuthSession).where(live).values(revoked_at = now).execution_options(synchronize_session=False))
+    return True
+
 def authenticate_user(db:Session, email:str, password: str)->User | None:
     user = get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return None
-    
+    if new_hash:
+        #cost factor or scheme changed since this hash was made
+        user.hashed_password = new_hash
+        db.commit()
     return user
 
-def verify_session_refresh(db:Session, refresh_token: str, request:Request)->Token:
-    hashed = hash_refresh_token(refresh_token)
-    auth_session = query_auth_session(db=db, hashed_refresh_token=hashed)
-    user = query_user_from_user_id(db=db, user_id=auth_session.user_id)
+async def authenticate_user_async(db:Session, email:str, password: str)->User | None:
+    """
+    authenticate_user for async endpoints on a sync session: the lookup and the rehash commit run on
+    the threadpool, the bcrypt check waits on the password pool without holding a threadpool thread
+    """
+    user = await run_in_threadpool(get_user_by_email, db, email)
     if not user:
         return None
-    elif not user.is_active:
+    valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await run_in_threadpool(db.commit)
+    return user
+
+def add_user(db:Session, email:str, hashed_password:str, is_active:bool)->User:
+    user = User(email=email, hashed_password=hashed_password, is_active=is_active)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+def refresh_session_lookup(hashed_refresh_token:str):
+    """session and owner in one statement, revoked rows included so reuse can be told apart"""
+    return select(AuthSession.id, AuthSession.user_id, AuthSession.expires_at, AuthSession.revoked_at,
+                  User.email, User.is_active) \
+                .join(User, User.id == AuthSession.user_id) \
+                .where(AuthSession.token_hash == hashed_refresh_token)
+
+def report_refresh_reuse(user_id:int, request:Request)->None:
+    REFRESH_REUSE.inc()
+    reuse_log.warning("revoked refresh token presented again user_id=%s ip=%s", user_id,
+                      request.client.host if request.client else None)
+
+def verify_session_refresh(db:Session, refresh_token: str, request:Request)->Token | None:
+    """
+    rotate a refresh token: join lookup, one UPDATE ... RETURNING that revokes the user's live
+    sessions, insert of the new one and a single commit
+    """
+    now = datetime.utcnow()
+    row = db.execute(refresh_session_lookup(hash_refresh_token(refresh_token))).first()
+    if row is None:
+        return None
+    if row.revoked_at is not None:
+        report_refresh_reuse(row.user_id, request)
+        return None
+    if row.expires_at <= now or not row.is_active:
         return None
-    return update_auth_session(db=db, user=user, request=request)
+    if not revoke_for_rotation(db=db, session_id=row.id, user_id=row.user_id, now=now):
+        db.rollback()
+        report_refresh_reuse(row.user_id, request)
+        return None
+    return issue_auth_session(db=db, user_id=row.user_id, email=row.email, request=request, now=now)
 
 def revoke_refresh_session(db: Session, refresh_token: str, user_id: int)->bool:
     hashed = hash_refresh_token(refresh_token)
@@ -91,13 +205,25 @@ def revoke_refresh_session(db: Session, refresh_token: str, user_id: int)->bool:
     db.commit()
     return True if result.rowcount > 0 else False
 
-def cleanup_session(db:Session, now:datetime, grace_days: int = 2)-> int:
+def cleanup_session(db:Session, now:datetime, grace_days: int = 2, batch_size: int = 500,
+                    pause_seconds: float = 0.0)-> int:
+    """
+    delete sessions expired or revoked more than grace_days ago in batches of batch_size ids,
+    committing and pausing between batches so other writers get the lock in between
+    """
     grace = timedelta(days=grace_days)
     threshold = now - grace
-    stmt = delete(AuthSession).where((AuthSession.expires_at <= (threshold)) | 
-                                     (AuthSession.revoked_at <= (threshold))
-                                     )
-    result = db.execute(stmt)
-    db.commit()
-    return result.rowcount or 0
-    
\ No newline at end of file
+    stale = (AuthSession.expires_at <= (threshold)) | (AuthSession.revoked_at <= (threshold))
+    deleted = 0
+    while True:
+        ids = db.execute(select(AuthSession.id).where(stale).limit(batch_size)).scalars().all()
+        if not ids:
+            break
+        result = db.execute(delete(AuthSession).where(AuthSession.id.in_(ids)))
+        db.commit()
+        deleted += result.rowcount or 0
+        if len(ids) < batch_size:
+            break
+        if pause_seconds:
+            time.sleep(pause_seconds)
+    return deleted
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+
+from fastapi.requests import Request
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.security import (create_access_token, generate_refresh_token, hash_refresh_token,
+                               verify_and_update_password_async)
+from app.core.config import settings
+from app.crud.user import principal_cache, refresh_session_lookup, report_refresh_reuse
+from app.models.auth_session import AuthSession
+from app.models.user import User
+from app.schemas.auth import Token
+from app.schemas.user import Principal
+"""ASYNC DB OPERATION LAYER, mirrors app.crud.user for DB_MODE=async"""
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> User | None:
+    return (await db.execute(select(User).where(User.email == email))).scalars().first()
+
+async def get_principal(db: AsyncSession, email: str) -> Principal | None:
+    principal = principal_cache.get(email)
+    if principal is not None:
+        return principal
+    user = await get_user_by_email(db, email)
+    if not user:
+        return None
+    principal = Principal.model_validate(user)
+    principal_cache.set(email, principal)
+    return principal
+
+async def query_auth_session(db: AsyncSession, hashed_refresh_token: str) -> AuthSession | None:
+    now = datetime.utcnow()
+    stmt = select(AuthSession) \
+                .where((AuthSession.token_hash == hashed_refresh_token) &
+                       (AuthSession.revoked_at.is_(None)) &
+                       (AuthSession.expires_at > now))
+    return (await db.execute(stmt)).scalar()
+
+async def query_user_from_user_id(db: AsyncSession, user_id: int) -> User | None:
+    return (await db.execute(select(User).where(User.id == user_id))).scalar()
+
+async def update_auth_session(user: User, db: AsyncSession, request: Request) -> Token:
+    now = datetime.utcnow()
+    stmt = update(AuthSession).where((AuthSession.user_id == user.id) &
+                                     (AuthSession.revoked_at.is_(None)) &
+                                     (AuthSession.expires_at > now)).values(revoked_at = now)
+    await db.execute(stmt)
+
+    refresh_token = generate_refresh_token()
+    db.add(AuthSession(
+         user_id = user.id,
+         token_hash = hash_refresh_token(refresh_token),
+         expires_at = now+timedelta(days=settings.refresh_token_expire_days),
+         last_used_at = now,
+         revoked_at = None,
+         ip = request.client.host if request.client else None
+    ))
+    await db.commit()
+
+    new_access = create_access_token(subject=user.email)
+    return Token(access_token=new_access, token_type="bearer", refresh_token=refresh_token)
+
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> User | None:
+    user = await get_user_by_email(db, email)
+    if not user:
+        return None
+    valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
+
+async def revoke_for_rotation(db: AsyncSession, session_id: int, user_id: int, now: datetime) -> bool:
+    live = (AuthSession.user_id == user_id) & (AuthSession.revoked_at.is_(None)) & (AuthSession.expires_at > now)
+    if db.get_bind().dialect.update_returning:
+        stmt = update(AuthSession).where(live).values(revoked_at = now) \
+                    .returning(AuthSession.id).execution_options(synchronize_session=False)
+        return session_id in (await db.execute(stmt)).scalars().all()
+
+    claim = update(AuthSession).where((AuthSession.id == session_id) & live).values(revoked_at = now) \
+                .execution_options(synchronize_session=False)
+    if (await db.execute(claim)).rowcount != 1:
+        return False
+    await db.execute(update(AuthSession).where(live).values(revoked_at = now)
+                     .execution_options(synchronize_session=False))
+    return True
+
+async def verify_session_refresh(db: AsyncSession, refresh_token: str, request: Request) -> Token | None:
+    now = datetime.utcnow()
+    row = (await db.execute(refresh_session_lookup(hash_refresh_token(refresh_token)))).first()
+    if row is None:
+        return None
+    if row.revoked_at is not None:
+        report_refresh_reuse(row.user_id, request)
+        return None
+    if row.expires_at <= now or not row.is_active:
+        return None
+    if not await revoke_for_rotation(db=db, session_id=row.id, user_id=row.user_id, now=now):
+        await db.rollback()
+        report_refresh_reuse(row.user_id, request)
+        return None
+
+    refresh_token = generate_refresh_token()
+    db.add(AuthSession(
+         user_id = row.user_id,
+         token_hash = hash_refresh_token(refresh_token),
+         expires_at = now+timedelta(days=settings.refresh_token_expire_days),
+         last_used_at = now,
+         revoked_at = None,
+         ip = request.client.host if request.client else None
+    ))
+    await db.commit()
+    return Token(access_token=create_access_token(subject=row.email), token_type="bearer",
+                 refresh_token=refresh_token)
+
+async def revoke_refresh_session(db: AsyncSession, refresh_token: str, user_id: int) -> bool:
+    stmt = update(AuthSession).where(
+                                (AuthSession.user_id == user_id)
+                                & (AuthSession.token_hash == hash_refresh_token(refresh_token))
+                                & (AuthSession.revoked_at.is_(None))
+                                     ).values(revoked_at = datetime.utcnow())
+    result = await db.execute(stmt)
+    await db.commit()
+    return result.rowcount > 0
+
@@ -0,0 +1,72 @@
+import logging
+
+from sqlalchemy import column, inspect, literal, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+"""FULL TEXT SEARCH INDEX
+
+on sqlite transactions.desc is indexed by an external content FTS5 table, the text lives only
+in transactions and triggers keep the index in step with every insert, update and delete. on
+postgres a GIN index over to_tsvector('simple', desc) plays the same role
+"""
+
+logger = logging.getLogger("app.db.fts")
+
+FTS_TABLE = "transactions_fts"
+
+SQLITE_FTS_DDL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        "desc", content='transactions', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, "desc") VALUES (new.id, new."desc");
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_ad AFTER DELETE ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, "desc") VALUES ('delete', old.id, old."desc");
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_au AFTER UPDATE OF "desc" ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, "desc") VALUES ('delete', old.id, old."desc");
+        INSERT INTO {FTS_TABLE}(rowid, "desc") VALUES (new.id, new."desc");
+    END""",
+)
+
+POSTGRES_FTS_DDL = (
+    """CREATE INDEX IF NOT EXISTS ix_transactions_desc_fts
+        ON transactions USING GIN (to_tsvector('simple', "desc"))""",
+)
+
+#None until the first search checks whether the FTS5 table exists on this database
+_sqlite_fts_ready: bool | None = None
+
+def install_search_index(engine: Engine) -> None:
+    """create the search index for the engine's backend, backfilling it when it is new"""
+    global _sqlite_fts_ready
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        existed = inspect(engine).has_table(FTS_TABLE)
+        try:
+            with engine.begin() as conn:
+                for ddl in SQLITE_FTS_DDL:
+                    conn.exec_driver_sql(ddl)
+                if not existed:
+                    #rows written before the triggers existed
+                    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        except OperationalError:
+            logger.warning("sqlite was built without FTS5, /transactions/search falls back to LIKE")
+            _sqlite_fts_ready = False
+            return
+        _sqlite_fts_ready = True
+    elif dialect == "postgresql":
+        with engine.begin() as conn:
+            for ddl in POSTGRES_FTS_DDL:
+                conn.execute(text(ddl))
+
+def sqlite_fts_ready(db) -> bool:
+    """whether the FTS5 table exists, checked once per process. a Select so a routed session stays on its reader"""
+    global _sqlite_fts_ready
+    if _sqlite_fts_ready is None:
+        master = table("sqlite_master", column("type"), column("name"))
+        stmt = select(literal(1)).select_from(master) \
+                    .where(master.c.type == "table", master.c.name == FTS_TABLE)
+        _sqlite_fts_ready = db.execute(stmt).first() is not None
+    return _sqlite_fts_ready
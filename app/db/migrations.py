@@ -0,0 +1,80 @@
+import logging
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable
+
+from app.core.archive import decode_partition
+from app.models.transactions import Transaction
+from app.models.user import User
+
+"""IN PLACE SCHEMA MIGRATIONS
+
+create_all only adds missing tables, changes to existing ones are applied here by init_db.
+each step checks the live schema first so running it again is a no op
+"""
+
+logger = logging.getLogger("app.db.migrations")
+
+
+def _columns(inspector, table: str) -> set[str]:
+    return {column["name"] for column in inspector.get_columns(table)}
+
+def migrate_amount_cents(engine: Engine) -> bool:
+    """
+    transactions.amount NUMERIC(12,2) -> transactions.amount_cents BIGINT and drops the old
+    monthly_rollups (total NUMERIC) so create_all recreates it with total_cents. returns True
+    when anything changed, the caller then has to rebuild the rollups
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("transactions"):
+        return False
+    convert = "amount" in _columns(inspector, "transactions") and "amount_cents" not in _columns(inspector, "transactions")
+    drop_rollups = inspector.has_table("monthly_rollups") and "total" in _columns(inspector, "monthly_rollups")
+    if not (convert or drop_rollups):
+        return False
+
+    with engine.begin() as conn:
+        if convert:
+            conn.execute(text("ALTER TABLE transactions ADD COLUMN amount_cents BIGINT NOT NULL DEFAULT 0"))
+            result = conn.execute(text("UPDATE transactions SET amount_cents = CAST(ROUND(amount * 100) AS BIGINT)"))
+            #sqlite >= 3.35
+            conn.execute(text("ALTER TABLE transactions DROP COLUMN amount"))
+            logger.warning("converted %s transaction amounts to integer cents", result.rowcount)
+        if drop_rollups:
+            conn.execute(text("DROP TABLE monthly_rollups"))
+    return True
+
+def migrate_transaction_autoincrement(engine: Engine) -> bool:
+    """
+    sqlite only: rebuild transactions with AUTOINCREMENT. without it sqlite gives out max(id) + 1,
+    so the ids of the newest rows were handed out again once they moved into an archive partition.
+    the sequence starts past every id in use, archived ones included. the old table's indexes and
+    search triggers go with it, init_schema creates them again right after
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    inspector = inspect(engine)
+    if not inspector.has_table("transactions"):
+        return False
+    with engine.begin() as conn:
+        ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'transactions'")).scalar()
+        if "AUTOINCREMENT" in ddl.upper():
+            return False
+        metadata = MetaData()
+        User.__table__.to_metadata(metadata) #only so the foreign key compiles
+        rebuilt = Transaction.__table__.to_metadata(metadata, name="transactions_autoincrement")
+        columns = ", ".join(f'"{column.name}"' for column in rebuilt.columns)
+        conn.execute(CreateTable(rebuilt))
+        conn.execute(text(f"INSERT INTO transactions_autoincrement ({columns}) SELECT {columns} FROM transactions"))
+        conn.execute(text("DROP TABLE transactions"))
+        conn.execute(text("ALTER TABLE transactions_autoincrement RENAME TO transactions"))
+
+        last_id = conn.execute(text("SELECT max(id) FROM transactions")).scalar() or 0
+        if inspect(conn).has_table("transaction_archives"):
+            for data in conn.execute(text("SELECT data FROM transaction_archives")).scalars():
+                last_id = max([last_id] + [row.id for row in decode_partition(data)])
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name IN ('transactions', 'transactions_autoincrement')"))
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('transactions', :seq)"), {"seq": last_id})
+    logger.warning("rebuilt transactions with AUTOINCREMENT, ids continue after %s", last_id)
+    return True
@@ -1,34 +1,257 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from dotenv import dotenv_values
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.sql.dml import UpdateBase
 
 from app.db.base import Base
+from app.core.config import settings
+from app.db.sqlite_profile import apply_sqlite_profile, is_memory_url, sqlite_pragmas
+from app.core.metrics import METRICS_ENABLED, instrument_engine
+
+DATABASE_URL = settings.database_url
 
-config = {
-    **dotenv_values(".env.shared"),
-    **dotenv_values(".env")
+POOL_OPTIONS = {
+    "pool_size": settings.db_pool_size,
+    "max_overflow": settings.db_max_overflow,
+    "pool_timeout": settings.db_pool_timeout,
 }
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+#production profile: WAL + pragmas, pooled readers and a single serialized writer connection
+SQLITE_PROFILE = IS_SQLITE and settings.sqlite_profile and not is_memory_url(DATABASE_URL)
 
-DATABASE_URL = config.get("DATABASE_URL","sqlite:///./finance.db")
+pragmas = sqlite_pragmas(settings) if SQLITE_PROFILE else {}
 
-if DATABASE_URL.startswith("sqlite"):
+def create_engines(url: str) -> tuple[Engine, Engine]:
+    """(reader, writer) for a database url, the same engine twice unless the sqlite profile applies"""
+    if url.startswith("sqlite") and settings.sqlite_profile and not is_memory_url(url):
+        reader = create_engine(
+            url,
+            echo=False,
+            future=True,
+            connect_args={"check_same_thread":  False},
+            **POOL_OPTIONS,
+            ) ##read connections
+        writer = create_engine(
+            url,
+            echo=False,
+            future=True,
+            connect_args={"check_same_thread":  False},
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=POOL_OPTIONS["pool_timeout"],
+            ) ##the one write connection, writers queue on the pool instead of on the file lock
+        apply_sqlite_profile(writer, sqlite_pragmas(settings), writer=True)
+        apply_sqlite_profile(reader, sqlite_pragmas(settings), read_only=True)
+        return reader, writer
+    if url.startswith("sqlite"):
+        shared = create_engine(
+            url,
+            echo=False,
+            future=True,
+            connect_args={"check_same_thread":  False}
+            ) ##connection to DB
+    else:
+        shared = create_engine(
+            url,
+            echo=False,
+            future=True,
+            pool_pre_ping=True,
+            pool_recycle=settings.db_pool_recycle,
+            **POOL_OPTIONS,
+            ) ##connection to DB
+    return shared, shared
 
-    engine = create_engine(
-        DATABASE_URL,
-        echo=False,
-        future=True,
-        connect_args={"check_same_thread":  False}
-        ) ##connection to DB
+engine, writer_engine = create_engines(DATABASE_URL)
+
+#optional replica, only sessions from ReadSessionLocal (get_read_db) read from it
+READ_DATABASE_URL = settings.read_database_url
+READ_YOUR_WRITES_SECONDS = settings.read_your_writes_seconds
+if READ_DATABASE_URL:
+    if READ_DATABASE_URL.startswith("sqlite"):
+        replica_engine = create_engine(
+            READ_DATABASE_URL,
+            echo=False,
+            future=True,
+            connect_args={"check_same_thread":  False},
+            **POOL_OPTIONS,
+            )
+        apply_sqlite_profile(replica_engine, pragmas, read_only=True)
+    else:
+        replica_engine = create_engine(
+            READ_DATABASE_URL,
+            echo=False,
+            future=True,
+            pool_pre_ping=True,
+            pool_recycle=settings.db_pool_recycle,
+            **POOL_OPTIONS,
+            )
 else:
-    engine = create_engine(
-        DATABASE_URL,
-        echo=False,
-        future=True,
-        ) ##connection to DB
+    replica_engine = engine
+
+if METRICS_ENABLED:
+    instrument_engine(engine)
+    if writer_engine is not engine:
+        instrument_engine(writer_engine)
+    if replica_engine is not engine:
+        instrument_engine(replica_engine)
+
+#principal id -> monotonic time of their last committed write, oldest first, read-your-writes across requests
+_recent_writes: OrderedDict[int, float] = OrderedDict()
+_recent_writes_lock = threading.Lock()
+
+def note_write(principal_id: int) -> None:
+    now = time.monotonic()
+    with _recent_writes_lock:
+        _recent_writes[principal_id] = now
+        _recent_writes.move_to_end(principal_id)
+        #drop the ones past the read-your-writes window, principals that never read again included
+        while _recent_writes and next(iter(_recent_writes.values())) < now - READ_YOUR_WRITES_SECONDS:
+            _recent_writes.popitem(last=False)
+
+def wrote_recently(principal_id: int | None) -> bool:
+    if principal_id is None or replica_engine is engine:
+        return False
+    with _recent_writes_lock:
+        written_at = _recent_writes.get(principal_id)
+        if written_at is None:
+            return False
+        if time.monotonic() - written_at > READ_YOUR_WRITES_SECONDS:
+            del _recent_writes[principal_id]
+            return False
+        return True
+
+def session_principal(session: Session) -> int | None:
+    """set by get_current_user on the request state that get_db / get_read_db put in session.info"""
+    return getattr(session.info.get("request_state"), "principal_id", None)
+
+#principals a session writes for without a request of theirs, e.g. the users of a group commit batch
+WRITTEN_PRINCIPALS_KEY = "written_principals"
+
+def mark_written(session: Session, principal_ids: Iterable[int]) -> None:
+    """their reads go to the primary for a while once this session commits"""
+    session.info.setdefault(WRITTEN_PRINCIPALS_KEY, set()).update(principal_ids)
+
+
+#child sessions opened on other databases (app.db.shards), closed together with their parent
+CHILD_SESSIONS_KEY = "child_sessions"
+
+class RoutingSession(Session):
+    """
+    sends flushes and INSERT/UPDATE/DELETE to writer_engine and plain reads to engine.
+    once a transaction has written, the rest of it stays on the writer so it reads its own writes.
+    reader/writer swap in another database's pair, the shard sessions use that
+    """
+    _uses_writer = False
+    _wrote = False #the transaction flushed or executed INSERT/UPDATE/DELETE, whichever engine it ran on
+
+    def __init__(self, *args, reader: Engine | None = None, writer: Engine | None = None, **kw):
+        super().__init__(*args, **kw)
+        self.reader = reader or engine
+        self.writer = writer or writer_engine
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.writer is self.reader:
+            return self.reader
+        if self._uses_writer or self._flushing or isinstance(clause, (UpdateBase, TextClause)):
+            self._uses_writer = True
+            return self.writer
+        return self.reader
+
+    def close(self) -> None:
+        for child in self.info.pop(CHILD_SESSIONS_KEY, {}).values():
+            child.close()
+        super().close()
+
+@event.listens_for(RoutingSession, "after_flush")
+def flagged_flush(session, flush_context):
+    session._wrote = True
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def flagged_execute(orm_execute_state):
+    if isinstance(orm_execute_state.statement, (UpdateBase, TextClause)):
+        orm_execute_state.session._wrote = True
+
+@event.listens_for(RoutingSession, "after_commit")
+def remember_write(session):
+    principals = session.info.pop(WRITTEN_PRINCIPALS_KEY, set())
+    if not session._wrote or replica_engine is engine:
+        return
+    principal_id = session_principal(session)
+    if principal_id is not None:
+        principals.add(principal_id)
+    for principal_id in principals:
+        note_write(principal_id)
+
+@event.listens_for(RoutingSession, "after_rollback")
+def forget_written(session):
+    session.info.pop(WRITTEN_PRINCIPALS_KEY, None)
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def release_writer(session, transaction):
+    if transaction.parent is None:
+        session._uses_writer = False
+        session._wrote = False
+
+class ReadSession(RoutingSession):
+    """
+    for read only endpoints: reads go to replica_engine. a principal that committed a write in the
+    last READ_YOUR_WRITES_SECONDS keeps reading through the primary until the replica has caught up
+    """
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if replica_engine is engine or self._uses_writer or self._flushing \
+                or isinstance(clause, (UpdateBase, TextClause)) or wrote_recently(session_principal(self)):
+            return super().get_bind(mapper, clause, **kw)
+        return replica_engine
 
 SessionLocal = sessionmaker(
-    bind=engine,
+    class_=RoutingSession,
+    autoflush=False,
+    autocommit=False,
+    future=True
+)##factory for sessions
+ReadSessionLocal = sessionmaker(
+    class_=ReadSession,
     autoflush=False,
     autocommit=False,
     future=True
-)##factory for sessions
\ No newline at end of file
+)##factory for read only endpoints
+
+#opt-in async stack, the sync engine above stays available for scripts and sync routes
+DB_MODE = settings.db_mode.lower()
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def to_async_url(url: str)->str:
+    scheme, sep, rest = url.partition("://")
+    backend = scheme.split("+", 1)[0]
+    if backend not in ASYNC_DRIVERS or scheme.endswith(("aiosqlite", "asyncpg", "aiomysql")):
+        return url
+    return f"{ASYNC_DRIVERS[backend]}{sep}{rest}"
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_MODE == "async":
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_engine = create_async_engine(
+        to_async_url(settings.async_database_url or DATABASE_URL),
+        echo=False,
+        ) ##async connection to DB
+    if SQLITE_PROFILE:
+        apply_sqlite_profile(async_engine.sync_engine, pragmas)
+    if METRICS_ENABLED:
+        instrument_engine(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )##factory for async sessions
@@ -0,0 +1,128 @@
+import threading
+from collections.abc import Iterator
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import METRICS_ENABLED, instrument_engine
+from app.db.session import CHILD_SESSIONS_KEY, DATABASE_URL, DB_MODE, RoutingSession, create_engines, \
+    engine, writer_engine
+
+"""PER USER SHARDING
+
+with SHARD_COUNT=N the transactions, monthly_rollups, transaction_archives and recurring_rules tables live in N databases
+(SHARD_URL_TEMPLATE with {shard} = 0..N-1) and a user's rows always sit on the shard picked by a
+jump consistent hash of their id. users and auth_sessions stay in DATABASE_URL. every shard has
+its own writer connection, so commits of users on different shards never queue behind each other.
+SHARD_COUNT=0 (default) keeps everything in DATABASE_URL
+"""
+
+SHARD_KEY = "shard"
+SHARDED_TABLES = ("transactions", "monthly_rollups", "transaction_archives", "recurring_rules")
+
+ShardSessionLocal = sessionmaker(
+    class_=RoutingSession,
+    autoflush=False,
+    autocommit=False,
+    future=True
+)##factory for sessions on one shard, reader/writer are passed per call
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    jump consistent hash (Lamping & Veach): stable for a given bucket count and going from N to
+    N+1 buckets only moves 1/(N+1) of the keys, which keeps rebalancing cheap
+    """
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+class ShardRouter:
+    """
+    maps user ids to shard databases and opens sessions on them. count=0 is the unsharded
+    layout, a single "shard" that is DATABASE_URL itself on the main engines
+    """
+    def __init__(self, count: int, url_template: str):
+        self.count = max(0, count)
+        self.urls = [url_template.format(shard=shard) for shard in range(self.count)] or [DATABASE_URL]
+        self._engines: dict[int, tuple[Engine, Engine]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self.urls)
+
+    def shard_for(self, user_id: int) -> int:
+        return jump_hash(user_id, self.size)
+
+    def engines(self, shard: int) -> tuple[Engine, Engine]:
+        """(reader, writer) of a shard, created the first time it is used"""
+        if self.count == 0:
+            return engine, writer_engine
+        pair = self._engines.get(shard)
+        if pair is None:
+            with self._lock:
+                pair = self._engines.get(shard)
+                if pair is None:
+                    pair = create_engines(self.urls[shard])
+                    if METRICS_ENABLED:
+                        for created in {id(pair[0]): pair[0], id(pair[1]): pair[1]}.values():
+                            instrument_engine(created)
+                    self._engines[shard] = pair
+        return pair
+
+    def writers(self) -> Iterator[Engine]:
+        for shard in range(self.size):
+            yield self.engines(shard)[1]
+
+    def session(self, shard: int) -> Session:
+        reader, writer = self.engines(shard)
+        return ShardSessionLocal(reader=reader, writer=writer, info={SHARD_KEY: shard})
+
+    def dispose(self) -> None:
+        with self._lock:
+            pairs, self._engines = list(self._engines.values()), {}
+        for reader, writer in pairs:
+            reader.dispose()
+            if writer is not reader:
+                writer.dispose()
+
+
+shard_router = ShardRouter(settings.shard_count, settings.shard_url_template)
+SHARDED = shard_router.count > 0
+if SHARDED and DB_MODE == "async":
+    raise RuntimeError("SHARD_COUNT needs DB_MODE=sync, the async routes only know the main database")
+
+def _child(db: Session, shard: int) -> Session:
+    children = db.info.setdefault(CHILD_SESSIONS_KEY, {})
+    child = children.get(shard)
+    if child is None:
+        child = children[shard] = shard_router.session(shard)
+        #so its commits count as the request principal's writes (read-your-writes)
+        if "request_state" in db.info:
+            child.info["request_state"] = db.info["request_state"]
+    return child
+
+def shard_session(db: Session, user_id: int) -> Session:
+    """
+    the session holding user_id's transactions and rollups: db itself when sharding is off or db
+    already is a shard session, otherwise a session on the user's shard that is opened once per
+    db and closed together with it. commits on it do not commit db
+    """
+    if not SHARDED or SHARD_KEY in db.info:
+        return db
+    return _child(db, shard_router.shard_for(user_id))
+
+def storage_sessions(db: Session) -> Iterator[Session]:
+    """every session that holds transactions, for work that sweeps all users"""
+    if not SHARDED or SHARD_KEY in db.info:
+        yield db
+        return
+    for shard in range(shard_router.size):
+        yield _child(db, shard)
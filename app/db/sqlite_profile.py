@@ -0,0 +1,51 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import Settings
+
+"""SQLITE PERFORMANCE PROFILE
+
+pragmas applied to every new connection. WAL lets readers keep going while a write is
+in progress and synchronous=NORMAL only fsyncs the WAL at checkpoints instead of on
+every commit
+"""
+
+
+def sqlite_pragmas(settings: Settings) -> dict[str, str]:
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": str(settings.sqlite_busy_timeout_ms),
+        "cache_size": str(settings.sqlite_cache_size),
+        "mmap_size": str(settings.sqlite_mmap_size),
+        "temp_store": settings.sqlite_temp_store,
+    }
+
+def is_memory_url(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///") or ":memory:" in url or "mode=memory" in url
+
+def apply_sqlite_profile(engine: Engine, pragmas: dict[str, str], writer: bool = False,
+                         read_only: bool = False) -> None:
+    """
+    writer=True takes the write lock up front with BEGIN IMMEDIATE, so a transaction never
+    fails half way through trying to upgrade a read lock. read_only=True sets query_only so a
+    write that was routed to the wrong engine fails loudly
+    """
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+        finally:
+            cursor.close()
+        if writer:
+            #let sqlalchemy's begin event issue BEGIN instead of pysqlite's implicit one
+            dbapi_connection.isolation_level = None
+
+    if writer:
+        @event.listens_for(engine, "begin")
+        def begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
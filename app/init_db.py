@@ -1,9 +1,46 @@
+from sqlalchemy import Table
+from sqlalchemy.engine import Engine
+
 from app.db.base import Base
-from app.db.session import engine
+from app.db.session import SessionLocal, writer_engine
+from app.db.shards import SHARDED, SHARDED_TABLES, shard_router
+from app.db.fts import install_search_index
+from app.db.migrations import migrate_amount_cents, migrate_transaction_autoincrement
+from app.crud.rollups import rebuild_rollups
 from app.models.auth_session import AuthSession
 from app.models.transactions import Transaction
+from app.models.monthly_rollup import MonthlyRollup
+from app.models.transaction_archive import TransactionArchive
+from app.models.recurring_rule import RecurringRule
 
 from app.models.user import User
 
+def init_schema(bind: Engine, tables: list[Table] | None = None) -> bool:
+    """migrate, create and index one database. returns True when the rollups have to be rebuilt"""
+    migrated = migrate_amount_cents(bind)
+    migrate_transaction_autoincrement(bind)
+    Base.metadata.create_all(bind=bind, tables=tables)
+    #create_all skips tables that already exist, so add indexes introduced later on their own
+    for table in tables or Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    install_search_index(bind)
+    return migrated
+
 def init_db()->None:
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    migrated = init_schema(writer_engine)
+    if SHARDED:
+        #a shard only holds the per user tables, users and auth_sessions stay in the main database
+        shard_tables = [Base.metadata.tables[name] for name in SHARDED_TABLES]
+        for shard_writer in shard_router.writers():
+            migrated = init_schema(shard_writer, shard_tables) or migrated
+    if migrated:
+        db = SessionLocal()
+        try:
+            rebuild_rollups(db)
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    init_db()
@@ -1,44 +1,97 @@
-from dotenv import dotenv_values
 import os
 from fastapi import FastAPI, Header
-from typing import Annotated
+from typing import Annotated, Any
 from random import choice
 from pydantic import BaseModel
 from app.init_db import init_db
+from app.core.config import settings
+from app.db.session import DB_MODE, async_engine
 from sqlalchemy.orm import Session
-from sqlalchemy import delete,select, update
+from sqlalchemy import delete,select
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from app.crud.user import authenticate_user, verify_session_refresh,revoke_refresh_session,cleanup_session
-from app.crud.transactions import create_new_transaction
-from app.core.security import create_access_token, generate_refresh_token, hash_refresh_token, verify_refresh_token
+from fastapi.concurrency import run_in_threadpool
+from app.crud.user import authenticate_user_async, add_user, update_auth_session, verify_session_refresh,revoke_refresh_session, \
+    change_user_password, set_user_active, principal_cache
+from app.crud.transactions import create_new_transaction, create_transactions_bulk, list_transactions, decode_cursor, delete_transaction, \
+    iter_transaction_rows, search_transactions, close_write_buffers, EXPORT_COLUMNS
+from app.core.export import EXPORT_FORMATS, export_chunks
+from app.crud.rollups import get_summary
+from app.crud.analytics import get_analytics, DEFAULT_WINDOW_DAYS, DEFAULT_HORIZON_DAYS
+from app.core.statement_import import detect_format, import_statement
+from app.core.security import hash_password_async, password_pool
+from app.core.worker_pool import PoolSaturated
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.core.metrics import METRICS_ENABLED, MetricsMiddleware, registry
+from app.core.serialization import FAST_JSON, DEFAULT_RESPONSE_CLASS, TRANSACTION_PAGE, TRANSACTION_SEARCH_PAGE, \
+    json_response, row_dicts
+from app.core import session_reaper
+from app.core.periodic import start_periodic, stop_periodic
+from app.core.archiver import archiver
+from app.core.recurring_scheduler import scheduler
+from app.crud.recurring import create_rule, list_rules, get_rule, update_rule, delete_rule
+from contextlib import asynccontextmanager
 from app.schemas.auth import Token, AuthRefreshRead, LogoutRequest
-from app.schemas.transaction import TransactionRead,TransactionCreate
-from app.api.deps import get_db, get_current_user, dev_access
-from app.models.user import User
+from app.schemas.transaction import TransactionRead,TransactionCreate, TransactionBulkResult, TransactionFilter, TransactionPage, \
+    TransactionSearchPage
+from app.schemas.recurring import RecurringRuleCreate, RecurringRuleRead, RecurringRuleUpdate
+from app.api.deps import get_db, get_read_db, get_current_user, require_dev
 from app.models.transactions import Transaction
-from app.models.auth_session import AuthSession
-from app.schemas.user import UserCreate, UserRead
-from fastapi import Request
+from app.schemas.user import UserCreate, UserRead, Principal, PasswordChange
+from fastapi import Request, UploadFile, File
+from fastapi.responses import StreamingResponse
+import io
 from app.schemas.health import HealthResponse
 from app.schemas.info import InfoResponse
 from app.schemas.debug import DBVerify, DBVerify_in
+from app.schemas.summary import SummaryResponse
+from app.schemas.analytics import AnalyticsResponse
+from datetime import date
 
 
-config = {
-    **dotenv_values(".env")
-}
-app = FastAPI(title="Finance Tracker API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.create_schema_on_startup:
+        ##initialize DB
+        init_db()
+    reaper_task = start_periodic(session_reaper.reaper)
+    archiver_task = start_periodic(archiver)
+    scheduler_task = start_periodic(scheduler)
+    yield
+    await stop_periodic(reaper_task)
+    await stop_periodic(archiver_task)
+    await stop_periodic(scheduler_task)
+    close_write_buffers()
+    password_pool.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
 
-##initialize DB
-init_db()
+app = FastAPI(title="Finance Tracker API", version="0.1.0", lifespan=lifespan,
+              default_response_class=DEFAULT_RESPONSE_CLASS)
 
-is_dev = config.get("DEVELOPMENT", "False") == "True"
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+if DB_MODE == "async":
+    #first match wins, so these replace the sync versions of the same routes declared below
+    from app.api.async_routes import router as async_router
+    app.include_router(async_router)
+
+@app.exception_handler(PoolSaturated)
+def password_pool_saturated(request: Request, exc: PoolSaturated):
+    """password hashing queue is full, shed load instead of queueing behind it"""
+    return JSONResponse(status_code=503,
+                        content={"detail":"Server Busy, Try Again"},
+                        headers={"Retry-After": str(exc.retry_after)})
 
 
 @app.get("/health", response_model=HealthResponse)
 def health_Check():
-    enviroment = "Dev" if is_dev else "Production"
+    enviroment = "Dev" if settings.development else "Production"
     return HealthResponse(status="ok",
             service=app.title,
             version= app.version,
@@ -59,22 +112,11 @@ def get_info():
         
 
 @app.post("/users", response_model=UserRead)
-def create_user(user_in: UserCreate, db:Session = Depends(get_db)):
-    from app.core.security import hash_password
-    hashed_password = hash_password(user_in.password)
-
-
-    db_user = User(
-        email = user_in.email,
-        hashed_password = hashed_password,
-        is_active=user_in.is_active,
-        )
-    
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-
-    return db_user
+async def create_user(user_in: UserCreate, db:Session = Depends(get_db)):
+    #async so the bcrypt hash waits on the password pool instead of pinning a threadpool thread
+    hashed_password = await hash_password_async(user_in.password)
+    return await run_in_threadpool(add_user, db, email=user_in.email, hashed_password=hashed_password,
+                                   is_active=user_in.is_active)
 
 @app.post("/debug/verify",response_model=DBVerify)
 def debug_verify(debug_in: DBVerify_in):
@@ -83,60 +125,57 @@ def debug_verify(debug_in: DBVerify_in):
     return DBVerify(validFlag=verify_password(debug_in.password,  debug_in.hashed_pasword))
 
 @app.post("/auth/login", response_model=Token)
-def login(request:Request,form_data:OAuth2PasswordRequestForm = Depends(), db:Session = Depends(get_db)):
+async def login(request:Request,form_data:OAuth2PasswordRequestForm = Depends(), db:Session = Depends(get_db)):
 
     """OAuth2 endpoint"""
-    user = authenticate_user(db, email=form_data.username, password=form_data.password)
+    user = await authenticate_user_async(db, email=form_data.username, password=form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect Email or Password",
             headers={"WWW-Authenticate":"Bearer"},
         )
-    
-    #token handling + refresh token
-    access_token = create_access_token(subject=user.email)
-    refresh_token = generate_refresh_token()
-    hashed_refresh_token = hash_refresh_token(refresh_token)
-
-    from datetime import datetime, timezone, timedelta
-    now = datetime.now(timezone.utc)
-
-    #make sure we update revoked at correctly
-    stmt = update(AuthSession).where((AuthSession.user_id == user.id) & 
-                                     (AuthSession.revoked_at.is_(None)) & 
-                                     (AuthSession.expires_at > now)).values(revoked_at = now)
-    db.execute(statement=stmt)
-
-    
-    auth_session = AuthSession(
-         user_id = user.id,
-         token_hash = hashed_refresh_token,
-         expires_at = now+timedelta(days=int(config.get('REFRESH_TOKEN_EXPIRE_DAYS'))),
-         last_used_at = now,
-         revoked_at = None,
-         ip = request.client.host if request.client else None
-    )
-    db.add(auth_session)
-    db.commit()
-    
-    return Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+    #revoke the user's live refresh sessions and start a new one
+    return await run_in_threadpool(update_auth_session, user=user, db=db, request=request)
 
 @app.get("/me", response_model=UserRead)
-def get_me(current_user: User = Depends(get_current_user))->User:
+def get_me(current_user: Principal = Depends(get_current_user))->Principal:
         return current_user
 
+@app.post("/me/password")
+def change_password(body: PasswordChange, current_user: Principal = Depends(get_current_user),
+                    db:Session = Depends(get_db))->dict:
+    if not change_user_password(db=db, user_id=current_user.id,
+                                current_password=body.current_password,
+                                new_password=body.new_password):
+         raise HTTPException(status_code=401,
+                             detail="Incorrect Password",
+                             headers={"WWW-Authenticate":"Bearer"}
+                             )
+    return {"ok":True}
+
+@app.post("/me/deactivate")
+def deactivate_me(current_user: Principal = Depends(get_current_user),
+                  db:Session = Depends(get_db))->dict:
+    set_user_active(db=db, user_id=current_user.id, is_active=False)
+    return {"ok":True}
+
 @app.get("/protected/ping")
-def enforce_auth(current_user: User = Depends(get_current_user)):
+def enforce_auth(current_user: Principal = Depends(get_current_user)):
      return {"ok":True}
 
 @app.post("/auth/refresh", response_model=Token)
 def refresh_auth_session(request: Request, body: AuthRefreshRead, db:Session = Depends(get_db))->Token:
      token = verify_session_refresh(db=db, refresh_token=body.refresh_token, request=request)
+     if token is None:
+          raise HTTPException(status_code=401,
+                              detail="Invalid Refresh Token",
+                              headers={"WWW-Authenticate":"Bearer"}
+                              )
      return token
      
 @app.post("/auth/logout")
-def logout_request(body:LogoutRequest, current_user: User = Depends(get_current_user), 
+def logout_request(body:LogoutRequest, current_user: Principal = Depends(get_current_user), 
                    db:Session = Depends(get_db))->dict:
     result = revoke_refresh_session(db=db, 
                                     refresh_token=body.refresh_token, 
@@ -149,24 +188,77 @@ def logout_request(body:LogoutRequest, current_user: User = Depends(get_current_
                               )
     return {"ok":result}
 
-@app.post("/debug/cleanup-sessions")
-def debug_cleanup(current_user: User = Depends(get_current_user), db: Session = Depends(get_db), 
-                  dev: bool = Depends(dev_access), grace_days:int = 2)->dict:
-    if dev:
-        from datetime import datetime
-        now = datetime.utcnow()
-        return {"deleted":cleanup_session(db=db, now=now, grace_days=grace_days)}
-    else:
-         raise HTTPException(status_code=401,
-                             detail="User is Unauthorized", 
-                             headers={"WWW-Authenticate":"bearer"}
-                             )
+@app.post("/debug/cleanup-sessions", dependencies=[Depends(require_dev)])
+def debug_cleanup(current_user: Principal = Depends(get_current_user), grace_days:int = 2)->dict:
+    """run the session reaper now instead of waiting for its next scheduled run"""
+    result = session_reaper.reaper(grace_days=grace_days)
+    return {"deleted":result.deleted, "seconds":result.seconds}
+
+@app.get("/transactions", response_model=TransactionPage)
+def get_transactions(filters: TransactionFilter = Depends(),
+                     cursor: str | None = None,
+                     limit: int = 50,
+                     db:Session = Depends(get_read_db),
+                     current_user:Principal = Depends(get_current_user)):
+    """keyset paginated history, pass next_cursor back as cursor to get the following page"""
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if after is None:
+            raise HTTPException(status_code=400,
+                                detail="Invalid Cursor")
+    items, next_cursor = list_transactions(db, user_id=current_user.id, filters=filters,
+                                           after=after, limit=limit, rows=FAST_JSON)
+    if FAST_JSON:
+        return json_response(TRANSACTION_PAGE, {"items": row_dicts(items), "next_cursor": next_cursor})
+    return TransactionPage(items=items, next_cursor=next_cursor)
+
+@app.get("/transactions/search", response_model=TransactionSearchPage)
+def search_user_transactions(q: str,
+                             filters: TransactionFilter = Depends(),
+                             offset: int = 0,
+                             limit: int = 50,
+                             db:Session = Depends(get_read_db),
+                             current_user:Principal = Depends(get_current_user)):
+    """ranked search over desc, every word must match and word* matches by prefix"""
+    items, next_offset = search_transactions(db, user_id=current_user.id, q=q, filters=filters,
+                                             offset=offset, limit=limit, rows=FAST_JSON)
+    if FAST_JSON:
+        return json_response(TRANSACTION_SEARCH_PAGE, {"items": row_dicts(items), "next_offset": next_offset})
+    return TransactionSearchPage(items=items, next_offset=next_offset)
+
+@app.get("/debug/session-reaper", dependencies=[Depends(require_dev)])
+def debug_session_reaper(current_user: Principal = Depends(get_current_user))->dict:
+    """last background reaper run"""
+    result = session_reaper.reaper.last_result
+    return {"enabled": session_reaper.reaper.enabled,
+            "interval_seconds": session_reaper.reaper.interval_seconds,
+            "last_run": None if result is None else {"deleted": result.deleted, "seconds": result.seconds,
+                                                      "finished_at": result.finished_at.isoformat()}}
+
+@app.get("/debug/principal-cache", dependencies=[Depends(require_dev)])
+def debug_principal_cache(current_user: Principal = Depends(get_current_user))->dict:
+    return principal_cache.stats()
+
+@app.get("/transactions/export")
+def export_transactions(format: str = "csv",
+                        filters: TransactionFilter = Depends(),
+                        db:Session = Depends(get_read_db),
+                        current_user:Principal = Depends(get_current_user)):
+    """stream the full (filtered) history as CSV or NDJSON"""
+    if format not in EXPORT_FORMATS:
+         raise HTTPException(status_code=400,
+                             detail="Unsupported Export Format")
+    rows = iter_transaction_rows(db, user_id=current_user.id, filters=filters)
+    return StreamingResponse(export_chunks(format, EXPORT_COLUMNS, rows),
+                             media_type=EXPORT_FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="transactions.{format}"'})
 
 @app.post("/transactions", response_model=TransactionRead)
 def new_transaction(body: TransactionCreate, 
                    db:Session = Depends(get_db), 
-                   current_user:User = Depends(get_current_user)):
-    txn = create_new_transaction(db, desc=body.desc, amount=body.amount, txn_type=body.txn_type, 
+                   current_user:Principal = Depends(get_current_user)):
+    txn = create_new_transaction(db, desc=body.desc, amount_cents=body.amount, txn_type=body.txn_type, 
                             transaction_date=body.transaction_date, 
                             user_id=current_user.id)
     if txn is None:
@@ -174,5 +266,130 @@ def new_transaction(body: TransactionCreate,
                              detail="Incorrect Transaction Data")
     else:
         return txn
-     
 
+@app.post("/transactions/bulk", response_model=TransactionBulkResult)
+def new_transactions_bulk(body: list[dict[str, Any]],
+                          chunk_size: int | None = None,
+                          db:Session = Depends(get_db),
+                          current_user:Principal = Depends(get_current_user)):
+    """insert a batch of transactions in one commit, rejected items are reported by index"""
+    return create_transactions_bulk(db, items=body, user_id=current_user.id,
+                                    chunk_size=chunk_size or settings.bulk_chunk_size)
+
+@app.post("/transactions/import")
+def import_transactions(file: UploadFile = File(...),
+                        format: str | None = None,
+                        db:Session = Depends(get_db),
+                        current_user:Principal = Depends(get_current_user)):
+    """
+    stream a CSV/OFX bank statement into the transactions table.
+    responds with NDJSON progress, row error and done events while the import runs
+    """
+    fmt = detect_format(file.filename, format)
+    if fmt is None:
+         raise HTTPException(status_code=400,
+                             detail="Unsupported Statement Format")
+    user_id = current_user.id
+
+    def events():
+        #the upload is spooled to disk by starlette, read it back a line at a time
+        stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", errors="strict", newline="")
+        try:
+            for event in import_statement(db, stream, fmt=fmt, user_id=user_id, batch_size=settings.import_batch_size):
+                yield event.model_dump_json(exclude_none=True) + "\n"
+        finally:
+            stream.detach()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.delete("/transactions/{txn_id}")
+def remove_transaction(txn_id: int,
+                       db:Session = Depends(get_db),
+                       current_user:Principal = Depends(get_current_user))->dict:
+    if not delete_transaction(db, txn_id=txn_id, user_id=current_user.id):
+         raise HTTPException(status_code=404,
+                             detail="Transaction Not Found")
+    return {"ok":True}
+
+@app.post("/recurring", response_model=RecurringRuleRead)
+def new_recurring_rule(body: RecurringRuleCreate,
+                       db:Session = Depends(get_db),
+                       current_user:Principal = Depends(get_current_user)):
+    """a transaction repeated on an RRULE schedule, occurrences since dtstart are written by the scheduler"""
+    rule = create_rule(db, body=body, user_id=current_user.id)
+    if rule is None:
+         raise HTTPException(status_code=400,
+                             detail="Incorrect Recurring Rule Data")
+    return rule
+
+@app.get("/recurring", response_model=list[RecurringRuleRead])
+def get_recurring_rules(db:Session = Depends(get_db),
+                        current_user:Principal = Depends(get_current_user)):
+    return list_rules(db, user_id=current_user.id)
+
+@app.get("/recurring/{rule_id}", response_model=RecurringRuleRead)
+def get_recurring_rule(rule_id: int,
+                       db:Session = Depends(get_db),
+                       current_user:Principal = Depends(get_current_user)):
+    rule = get_rule(db, rule_id=rule_id, user_id=current_user.id)
+    if rule is None:
+         raise HTTPException(status_code=404,
+                             detail="Recurring Rule Not Found")
+    return rule
+
+@app.patch("/recurring/{rule_id}", response_model=RecurringRuleRead)
+def change_recurring_rule(rule_id: int,
+                          body: RecurringRuleUpdate,
+                          db:Session = Depends(get_db),
+                          current_user:Principal = Depends(get_current_user)):
+    """change amount, type or desc of future occurrences, or pause/resume the rule with active"""
+    rule = get_rule(db, rule_id=rule_id, user_id=current_user.id)
+    if rule is None:
+         raise HTTPException(status_code=404,
+                             detail="Recurring Rule Not Found")
+    rule = update_rule(db, rule=rule, changes=body)
+    if rule is None:
+         raise HTTPException(status_code=400,
+                             detail="Incorrect Recurring Rule Data")
+    return rule
+
+@app.delete("/recurring/{rule_id}")
+def remove_recurring_rule(rule_id: int,
+                          db:Session = Depends(get_db),
+                          current_user:Principal = Depends(get_current_user))->dict:
+    if not delete_rule(db, rule_id=rule_id, user_id=current_user.id):
+         raise HTTPException(status_code=404,
+                             detail="Recurring Rule Not Found")
+    return {"ok":True}
+
+@app.get("/debug/recurring-scheduler", dependencies=[Depends(require_dev)])
+def debug_recurring_scheduler(current_user: Principal = Depends(get_current_user))->dict:
+    """last background scheduler run"""
+    result = scheduler.last_result
+    return {"enabled": scheduler.enabled,
+            "interval_seconds": scheduler.interval_seconds,
+            "last_run": None if result is None else {"rules": result.rules, "occurrences": result.occurrences,
+                                                      "seconds": result.seconds,
+                                                      "finished_at": result.finished_at.isoformat()}}
+
+@app.post("/debug/run-recurring", dependencies=[Depends(require_dev)])
+def debug_run_recurring(current_user: Principal = Depends(get_current_user))->dict:
+    """run the recurring scheduler now instead of waiting for its next scheduled run"""
+    result = scheduler()
+    return {"rules": result.rules, "occurrences": result.occurrences, "seconds": result.seconds}
+
+@app.get("/summary", response_model=SummaryResponse)
+def get_user_summary(month_from: date | None = None,
+                     month_to: date | None = None,
+                     db:Session = Depends(get_read_db),
+                     current_user:Principal = Depends(get_current_user)):
+    """monthly totals and running balance, served from the rollup table"""
+    return get_summary(db, user_id=current_user.id, month_from=month_from, month_to=month_to)
+
+@app.get("/analytics", response_model=AnalyticsResponse)
+def get_user_analytics(window_days: int = DEFAULT_WINDOW_DAYS,
+                       horizon_days: int = DEFAULT_HORIZON_DAYS,
+                       db:Session = Depends(get_read_db),
+                       current_user:Principal = Depends(get_current_user)):
+    """daily/weekly balances, rolling averages, burn rate and a linear projection, cached until the next write"""
+    return get_analytics(db, user_id=current_user.id, window_days=window_days, horizon_days=horizon_days)
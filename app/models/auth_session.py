@@ -1,5 +1,5 @@
 from app.db.base import Base
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import Mapped,relationship
 from datetime import datetime,UTC
 
@@ -10,11 +10,16 @@ class AuthSession(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer,ForeignKey("users.id"), unique=False , nullable=False)
     token_hash = Column(String(255),nullable=False, index=True, unique=True)
-    expires_at = Column(DateTime, unique=False, nullable=False)
+    expires_at = Column(DateTime, unique=False, nullable=False, index=True)
     created_at = Column(DateTime, nullable=False, default=lambda:datetime.now(UTC))
     last_used_at = Column(DateTime, nullable=True)
-    revoked_at = Column(DateTime, nullable=True)
+    revoked_at = Column(DateTime, nullable=True, index=True)
     ip  = Column(String(45), nullable=True)
 
     user = relationship("User", back_populates="auth_sessions")
-    
+
+    __table_args__ = (
+        #live sessions per user, used by the revoke-all on login and refresh rotation
+        Index("ix_auth_sessions_user_active", "user_id", "expires_at",
+              sqlite_where=revoked_at.is_(None), postgresql_where=revoked_at.is_(None)),
+    )
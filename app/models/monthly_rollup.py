@@ -0,0 +1,13 @@
+from app.db.base import Base
+from sqlalchemy import BigInteger, Column, Date, Integer, String, ForeignKey
+
+
+class MonthlyRollup(Base):
+    """per user, month and txn_type totals kept in step with the transactions table"""
+    __tablename__ = "monthly_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(Date, primary_key=True) #first day of the month
+    txn_type = Column(String, primary_key=True)
+    total_cents = Column(BigInteger, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
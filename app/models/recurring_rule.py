@@ -0,0 +1,34 @@
+from app.db.base import Base
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, String, ForeignKey, Index
+from datetime import datetime
+from decimal import Decimal
+from app.core.money import cents_to_decimal
+
+
+class RecurringRule(Base):
+    """a transaction repeated on an RRULE schedule, materialized into transactions by app.core.recurring_scheduler"""
+    __tablename__ = "recurring_rules"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    amount_cents = Column(BigInteger, nullable=False)
+    txn_type = Column(String, nullable=False)
+    desc = Column(String, nullable=False)
+    rrule = Column(String, nullable=False) #app.core.recurrence.parse_rrule
+    dtstart = Column(DateTime, nullable=False)
+    #next occurrence not yet written as a transaction, NULL once the rule is finished or paused
+    next_due_at = Column(DateTime, nullable=True)
+    occurrences = Column(Integer, nullable=False, default=0) #materialized so far, for COUNT
+    active = Column(Boolean, nullable=False, default=True)
+    last_materialized_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default= lambda: datetime.utcnow())
+
+    @property
+    def amount(self) -> Decimal:
+        return cents_to_decimal(self.amount_cents)
+
+    __table_args__ = (
+        #the scheduler range scans due rules instead of reading every rule
+        Index("ix_recurring_rules_next_due_at", "next_due_at"),
+        Index("ix_recurring_rules_user_id", "user_id"),
+    )
@@ -0,0 +1,16 @@
+from app.db.base import Base
+from sqlalchemy import Column, Date, DateTime, Integer, LargeBinary, ForeignKey
+from datetime import datetime
+
+
+class TransactionArchive(Base):
+    """one compressed partition per user and month of transactions moved out of the hot table"""
+    __tablename__ = "transaction_archives"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(Date, primary_key=True) #first day of the month
+    row_count = Column(Integer, nullable=False)
+    raw_bytes = Column(Integer, nullable=False) #encoded size before compression
+    stored_bytes = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False) #app.core.archive.encode_partition
+    archived_at = Column(DateTime, default= lambda: datetime.utcnow())
@@ -1,7 +1,9 @@
 from app.db.base import Base
-from sqlalchemy import Numeric, Column, DateTime, Integer, String, REAL, ForeignKey
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, UTC
+from decimal import Decimal
+from app.core.money import cents_to_decimal
 
 class Transaction(Base):
     __tablename__ = "transactions"
@@ -9,7 +11,7 @@ class Transaction(Base):
     id = Column(Integer, index=True, primary_key=True)
     
     user_id = Column(Integer, ForeignKey("users.id"), unique=False, nullable=False)
-    amount = Column(Numeric(12,2), nullable=False)
+    amount_cents = Column(BigInteger, nullable=False) #minor units, always positive, txn_type gives the sign
     created_at = Column(DateTime, default= lambda: datetime.utcnow())
     txn_type = Column(String, nullable=False)
     desc = Column(String, nullable=False)
@@ -17,3 +19,14 @@ class Transaction(Base):
 
     user = relationship("User", back_populates="transactions")
 
+    @property
+    def amount(self) -> Decimal:
+        return cents_to_decimal(self.amount_cents)
+
+    __table_args__ = (
+        #per user history ordered by (transaction_date, id), used by keyset pagination
+        Index("ix_transactions_user_date_id", "user_id", "transaction_date", "id"),
+        #ids are never handed out twice on sqlite, archived rows keep theirs after leaving the table
+        {"sqlite_autoincrement": True},
+    )
+
@@ -0,0 +1,128 @@
+import argparse
+from dataclasses import dataclass
+
+from sqlalchemy import delete, insert, select, union
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.base import Base
+from app.db.shards import SHARDED_TABLES, ShardRouter
+from app.init_db import init_schema
+from app.models.monthly_rollup import MonthlyRollup
+from app.models.recurring_rule import RecurringRule
+from app.models.transaction_archive import TransactionArchive
+from app.models.transactions import Transaction
+
+"""move users between shard layouts, run it with the API stopped
+
+python -m app.rebalance_shards --from-count 0 --to-count 4 [--dry-run]
+
+--from-count 0 reads the unsharded layout (transactions in DATABASE_URL). every user whose shard
+changes is copied to the new shard in one transaction and only then deleted from the old one, a
+run that was interrupted can simply be started again. moved transactions and recurring rules get
+new ids on their new shard. set SHARD_COUNT to --to-count once it has finished
+"""
+
+COPY_CHUNK_SIZE = 5000
+TRANSACTION_COLUMNS = ("user_id", "amount_cents", "created_at", "txn_type", "desc", "transaction_date")
+ROLLUP_COLUMNS = ("user_id", "month", "txn_type", "total_cents", "count")
+ARCHIVE_COLUMNS = ("user_id", "month", "row_count", "raw_bytes", "stored_bytes", "data", "archived_at")
+RECURRING_COLUMNS = ("user_id", "amount_cents", "txn_type", "desc", "rrule", "dtstart", "next_due_at",
+                     "occurrences", "active", "last_materialized_at", "created_at")
+#per user tables that move with the user, transactions are streamed separately
+USER_TABLES = ((MonthlyRollup, ROLLUP_COLUMNS), (TransactionArchive, ARCHIVE_COLUMNS),
+               (RecurringRule, RECURRING_COLUMNS))
+
+
+@dataclass
+class RebalanceResult:
+    users_seen: int = 0
+    users_moved: int = 0
+    transactions_moved: int = 0
+
+
+def move_user(source: Session, target: Session, user_id: int) -> int:
+    """copy the user's transactions, rollups, archives and recurring rules to target, then delete them from source. returns transactions moved"""
+    #whatever an interrupted run left on the target is replaced, not duplicated
+    target.execute(delete(Transaction).where(Transaction.user_id == user_id))
+    for model, _ in USER_TABLES:
+        target.execute(delete(model).where(model.user_id == user_id))
+
+    moved = 0
+    rows = select(*(getattr(Transaction, column) for column in TRANSACTION_COLUMNS)) \
+                .where(Transaction.user_id == user_id) \
+                .order_by(Transaction.id) \
+                .execution_options(yield_per=COPY_CHUNK_SIZE)
+    for partition in source.execute(rows).mappings().partitions():
+        target.execute(insert(Transaction), [dict(row) for row in partition])
+        moved += len(partition)
+    for model, columns in USER_TABLES:
+        copied = source.execute(select(*(getattr(model, column) for column in columns))
+                                .where(model.user_id == user_id)).mappings().all()
+        if copied:
+            target.execute(insert(model), [dict(row) for row in copied])
+    target.commit()
+
+    source.execute(delete(Transaction).where(Transaction.user_id == user_id))
+    for model, _ in USER_TABLES:
+        source.execute(delete(model).where(model.user_id == user_id))
+    source.commit()
+    return moved
+
+def rebalance(old: ShardRouter, new: ShardRouter, dry_run: bool = False) -> RebalanceResult:
+    result = RebalanceResult()
+    if not dry_run and new.count:
+        shard_tables = [Base.metadata.tables[name] for name in SHARDED_TABLES]
+        for shard_writer in new.writers():
+            init_schema(shard_writer, shard_tables)
+
+    targets: dict[int, Session] = {}
+    try:
+        for old_shard, url in enumerate(old.urls):
+            source = old.session(old_shard)
+            try:
+                user_ids = source.execute(union(select(Transaction.user_id),
+                                                *(select(model.user_id) for model, _ in USER_TABLES))).scalars().all()
+                for user_id in user_ids:
+                    result.users_seen += 1
+                    new_shard = new.shard_for(user_id)
+                    if new.urls[new_shard] == url:
+                        continue
+                    result.users_moved += 1
+                    if dry_run:
+                        continue
+                    if new_shard not in targets:
+                        targets[new_shard] = new.session(new_shard)
+                    result.transactions_moved += move_user(source, targets[new_shard], user_id)
+            finally:
+                source.close()
+    finally:
+        for target in targets.values():
+            target.close()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move users to the shard they belong to under a new shard count")
+    parser.add_argument("--from-count", type=int, default=settings.shard_count,
+                        help="shard count the data is laid out for now, 0 = unsharded (default: SHARD_COUNT)")
+    parser.add_argument("--to-count", type=int, required=True, help="shard count to move to, 0 = unsharded")
+    parser.add_argument("--url-template", default=settings.shard_url_template,
+                        help="shard database url with a {shard} placeholder (default: SHARD_URL_TEMPLATE)")
+    parser.add_argument("--dry-run", action="store_true", help="only count the users that would move")
+    args = parser.parse_args()
+
+    old = ShardRouter(args.from_count, args.url_template)
+    new = ShardRouter(args.to_count, args.url_template)
+    try:
+        result = rebalance(old, new, dry_run=args.dry_run)
+    finally:
+        old.dispose()
+        new.dispose()
+    verb = "would move" if args.dry_run else "moved"
+    print(f"{verb} {result.users_moved} of {result.users_seen} users"
+          f" ({result.transactions_moved} transactions) from {old.size} to {new.size} shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import argparse
+
+from app.crud.rollups import rebuild_rollups
+from app.db.session import SessionLocal
+from app.init_db import init_db
+
+"""rebuild monthly_rollups from the transactions table
+
+python -m app.rebuild_rollups [--user-id ID]
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recompute monthly rollups from scratch")
+    parser.add_argument("--user-id", type=int, default=None, help="only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        written = rebuild_rollups(db, user_id=args.user_id)
+    finally:
+        db.close()
+    print(f"rebuilt {written} rollup rows")
+
+
+if __name__ == "__main__":
+    main()
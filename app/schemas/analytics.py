@@ -0,0 +1,34 @@
+from datetime import date
+from pydantic import BaseModel
+
+
+class DailyPoint(BaseModel):
+    day: date
+    income: float
+    outcome: float
+    net: float
+    balance: float #running balance at the end of the day
+    avg_7d: float | None = None #rolling mean of net, None until the window is full
+    avg_30d: float | None = None
+
+class WeeklyPoint(BaseModel):
+    week_start: date #monday
+    net: float
+    balance: float
+
+class ProjectedPoint(BaseModel):
+    day: date
+    balance: float
+
+class AnalyticsResponse(BaseModel):
+    as_of: date
+    balance: float
+    window_days: int
+    income_rate_daily: float #mean daily income over the window
+    burn_rate_daily: float #mean daily outcome over the window
+    burn_rate_monthly: float
+    runway_days: float | None = None #days until the balance hits zero at the current net rate, None if not shrinking
+    trend_per_day: float #slope of the least squares line through the window's balances
+    daily: list[DailyPoint]
+    weekly: list[WeeklyPoint]
+    projection: list[ProjectedPoint]
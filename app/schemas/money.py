@@ -0,0 +1,10 @@
+from typing import Annotated
+
+from pydantic import BeforeValidator, PlainSerializer
+
+from app.core.money import cents_to_number, to_cents
+
+#accepts a decimal number or string in major units and holds it as integer cents
+Money = Annotated[int, BeforeValidator(to_cents)]
+#integer cents written out as a decimal number in major units
+CentsOut = Annotated[int, PlainSerializer(cents_to_number, return_type=float)]
@@ -0,0 +1,50 @@
+from datetime import UTC, datetime
+from typing import Annotated
+
+from pydantic import AfterValidator, BaseModel
+
+from app.core.recurrence import parse_rrule
+from app.schemas.money import Money
+
+
+def check_rrule(value: str) -> str:
+    parse_rrule(value) #ValueError becomes a 422 naming the bad part
+    return value.strip().removeprefix("RRULE:").upper()
+
+def naive_utc(value: datetime) -> datetime:
+    return value.astimezone(UTC).replace(tzinfo=None) if value.tzinfo else value
+
+#FREQ=...;INTERVAL=... subset described in app.core.recurrence
+RRule = Annotated[str, AfterValidator(check_rrule)]
+#occurrences are compared with utcnow, aware datetimes are converted to naive UTC
+UtcDatetime = Annotated[datetime, AfterValidator(naive_utc)]
+
+class RecurringRuleCreate(BaseModel):
+    amount: Money
+    txn_type: str
+    desc: str
+    rrule: RRule
+    dtstart: UtcDatetime #first occurrence, occurrences already past are caught up on the next scheduler run
+
+class RecurringRuleUpdate(BaseModel):
+    """the schedule itself cannot change, delete the rule and create a new one instead"""
+    amount: Money | None = None
+    txn_type: str | None = None
+    desc: str | None = None
+    active: bool | None = None #pausing skips the occurrences that fall while paused
+
+class RecurringRuleRead(BaseModel):
+    id: int
+    amount: float
+    txn_type: str
+    desc: str
+    rrule: str
+    dtstart: datetime
+    next_due_at: datetime | None
+    occurrences: int
+    active: bool
+    last_materialized_at: datetime | None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,19 @@
+from datetime import date
+from pydantic import BaseModel
+
+
+class MonthlySummary(BaseModel):
+    month: date
+    income: float
+    outcome: float
+    income_count: int
+    outcome_count: int
+    net: float
+    balance: float #running balance at the end of the month
+
+class SummaryResponse(BaseModel):
+    months: list[MonthlySummary]
+    opening_balance: float
+    total_income: float
+    total_outcome: float
+    balance: float
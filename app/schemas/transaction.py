@@ -1,12 +1,68 @@
 from pydantic import BaseModel
+from typing_extensions import TypedDict
 from datetime import datetime
+from decimal import Decimal
+from app.schemas.money import CentsOut, Money
 
 class TransactionCreate(BaseModel):
-    amount: float
+    amount: Money #decimal number or string, held as cents
     txn_type: str
     desc: str
     transaction_date: datetime
 
 class TransactionRead(TransactionCreate):
+    amount: float
     id:int
-    created_at:datetime
\ No newline at end of file
+    created_at:datetime
+
+    class Config:
+        from_attributes = True
+
+class TransactionRow(TypedDict):
+    """TransactionRead as a plain dict, same keys in the same order, for the fast JSON path"""
+    amount: CentsOut
+    txn_type: str
+    desc: str
+    transaction_date: datetime
+    id: int
+    created_at: datetime
+
+class TransactionFilter(BaseModel):
+    date_from: datetime | None = None
+    date_to: datetime | None = None
+    txn_type: str | None = None
+    #major units, the filter is built as Depends() so the class validates its fields twice, Money would scale twice
+    min_amount: Decimal | None = None
+    max_amount: Decimal | None = None
+
+class TransactionPage(BaseModel):
+    items: list[TransactionRead]
+    next_cursor: str | None = None
+
+class TransactionSearchPage(BaseModel):
+    items: list[TransactionRead]
+    next_offset: int | None = None
+
+class TransactionRowPage(TypedDict):
+    items: list[TransactionRow]
+    next_cursor: str | None
+
+class TransactionRowSearchPage(TypedDict):
+    items: list[TransactionRow]
+    next_offset: int | None
+
+class TransactionReject(BaseModel):
+    index: int
+    reason: str
+
+class TransactionBulkResult(BaseModel):
+    created_ids: list[int]
+    rejected: list[TransactionReject]
+
+class TransactionImportEvent(BaseModel):
+    event: str #progress | error | done
+    row: int | None = None
+    reason: str | None = None
+    rows_read: int | None = None
+    inserted: int | None = None
+    rejected: int | None = None
@@ -13,4 +13,18 @@ class UserRead(UserBase):
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class Principal(BaseModel):
+    """the authenticated user as seen by request handlers, cached between requests"""
+    id: int
+    email: str
+    is_active: bool
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class PasswordChange(BaseModel):
+    current_password: str
+    new_password: str
@@ -0,0 +1,278 @@
+"""
+in-process load/latency benchmark for the API hot paths
+
+seeds a throwaway database, drives app.main.app through httpx's ASGI transport (no network)
+and writes throughput and p50/p95/p99 latency per endpoint to a JSON file.
+
+    python -m benchmarks.api_bench --users 20 --transactions 200 --requests 500 --concurrency 16
+    python -m benchmarks.api_bench --output new.json --compare old.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PASSWORD = "bench-password"
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(latencies: list[float], errors: int, wall: float) -> dict:
+    ms = [value * 1000 for value in latencies]
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "mean_ms": round(statistics.fmean(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3) if ms else 0.0,
+    }
+
+def prepare_workdir(args) -> Path:
+    """the app reads .env from the working directory, so run it from a scratch dir with its own db"""
+    workdir = Path(tempfile.mkdtemp(prefix="finance-bench-"))
+    env = {}
+    for name in (".env.shared", ".env"):
+        path = REPO_ROOT / name
+        if path.exists():
+            shutil.copy(path, workdir / name)
+    env_file = workdir / ".env"
+    lines = env_file.read_text().splitlines() if env_file.exists() else []
+    overrides = {
+        "DATABASE_URL": f"sqlite:///{workdir / 'bench.db'}",
+        "SECRET_KEY": "bench-secret",
+        "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+        "PASSWORD_HASH_WORKERS": str(args.hash_workers),
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+    }
+    lines = [line for line in lines if line.split("=", 1)[0].strip() not in overrides]
+    lines += [f"{key}={value}" for key, value in overrides.items()]
+    env_file.write_text("\n".join(lines) + "\n")
+    return workdir
+
+def seed(args) -> list[str]:
+    """users with transactions and old sessions, returns the seeded emails"""
+    from app.init_db import init_db
+    from app.db.session import SessionLocal
+    from app.core.security import hash_password, generate_refresh_token, hash_refresh_token
+    from app.crud.transactions import insert_transaction_rows
+    from app.db.shards import shard_session
+    from app.models.auth_session import AuthSession
+    from app.models.user import User
+
+    init_db()
+    rng = random.Random(args.seed)
+    hashed = hash_password(PASSWORD) #one hash shared by every seeded user
+    now = datetime.utcnow()
+    emails = [f"bench{i}@example.com" for i in range(args.users)]
+
+    db = SessionLocal()
+    try:
+        users = [User(email=email, hashed_password=hashed, is_active=True) for email in emails]
+        db.add_all(users)
+        db.commit()
+        for user in users:
+            rows = [{
+                "user_id": user.id,
+                "amount_cents": rng.randint(100, 50000),
+                "txn_type": rng.choice(("income", "outcome")),
+                "desc": f"seed {n}",
+                "transaction_date": now - timedelta(days=rng.randint(0, 3 * 365)),
+                "created_at": now,
+            } for n in range(args.transactions)]
+            storage = shard_session(db, user.id)
+            for start in range(0, len(rows), 1000):
+                insert_transaction_rows(storage, rows[start:start + 1000])
+            storage.commit()
+            db.add_all(AuthSession(user_id=user.id, token_hash=hash_refresh_token(generate_refresh_token()),
+                                   expires_at=now - timedelta(days=rng.randint(0, 30)), last_used_at=now)
+                       for _ in range(args.sessions))
+            db.commit()
+    finally:
+        db.close()
+    return emails
+
+
+class VirtualUser:
+    def __init__(self, email: str):
+        self.email = email
+        self.access_token = ""
+        self.refresh_token = ""
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+    def update(self, response: httpx.Response) -> None:
+        if response.status_code == 200:
+            body = response.json()
+            self.access_token = body["access_token"]
+            self.refresh_token = body["refresh_token"]
+
+
+def scenarios() -> dict:
+    async def login(client, user):
+        response = await client.post("/auth/login", data={"username": user.email, "password": PASSWORD})
+        user.update(response)
+        return response
+
+    async def refresh(client, user):
+        response = await client.post("/auth/refresh", json={"refresh_token": user.refresh_token})
+        user.update(response)
+        return response
+
+    async def me(client, user):
+        return await client.get("/me", headers=user.headers)
+
+    async def create_transaction(client, user):
+        return await client.post("/transactions", headers=user.headers, json={
+            "amount": 12.34, "txn_type": "outcome", "desc": "bench",
+            "transaction_date": datetime.utcnow().isoformat()})
+
+    async def list_transactions(client, user):
+        return await client.get("/transactions", headers=user.headers, params={"limit": 50})
+
+    async def summary(client, user):
+        return await client.get("/summary", headers=user.headers)
+
+    return {
+        "POST /auth/login": login,
+        "POST /auth/refresh": refresh,
+        "GET /me": me,
+        "POST /transactions": create_transaction,
+        "GET /transactions": list_transactions,
+        "GET /summary": summary,
+    }
+
+async def run_scenario(client, users: list[VirtualUser], call, total: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker(user: VirtualUser):
+        nonlocal errors
+        for _ in counter:
+            started = time.perf_counter()
+            try:
+                response = await call(client, user)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    #a virtual user is never shared between workers so refresh token chains stay valid
+    await asyncio.gather(*(worker(users[i % len(users)]) for i in range(min(concurrency, len(users)))))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+async def drive(args, emails: list[str]) -> dict:
+    from app.main import app
+
+    users = [VirtualUser(email) for email in emails]
+    calls = scenarios()
+    selected = args.endpoints or list(calls)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for user in users:
+            user.update(await calls["POST /auth/login"](client, user))
+        for name in selected:
+            #warmup outside the measured window
+            await run_scenario(client, users, calls[name], args.warmup, args.concurrency)
+            results[name] = await run_scenario(client, users, calls[name], args.requests, args.concurrency)
+            print(f"{name:<22} {results[name]['throughput_rps']:>9.1f} rps  p50 {results[name]['p50_ms']:>8.2f} ms"
+                  f"  p95 {results[name]['p95_ms']:>8.2f} ms  p99 {results[name]['p99_ms']:>8.2f} ms"
+                  f"  errors {results[name]['errors']}")
+    return results
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: dict, baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text())["endpoints"]
+    print(f"\nchange vs {baseline_path} (negative latency / positive throughput is better)")
+    for name, stats in current.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        deltas = []
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            change = (stats[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            deltas.append(f"{key} {change:+.1f}%")
+        print(f"{name:<22} " + "  ".join(deltas))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="FinanceTrackerService in-process API benchmark")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--transactions", type=int, default=200, help="seeded transactions per user")
+    parser.add_argument("--sessions", type=int, default=5, help="seeded expired sessions per user")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoints", nargs="*", help="subset of endpoint names to run")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--hash-workers", type=int, default=0, help="password pool workers, 0 hashes inline")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--compare", type=Path, default=None, help="earlier results file to diff against")
+    parser.add_argument("--keep-db", action="store_true")
+    args = parser.parse_args()
+
+    output = args.output.resolve()
+    baseline = args.compare.resolve() if args.compare else None
+    workdir = prepare_workdir(args)
+    os.chdir(workdir)
+    sys.path.insert(0, str(REPO_ROOT))
+    try:
+        seed_started = time.perf_counter()
+        emails = seed(args)
+        seed_seconds = time.perf_counter() - seed_started
+        results = asyncio.run(drive(args, emails))
+    finally:
+        os.chdir(REPO_ROOT)
+        if not args.keep_db:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: (str(value) if isinstance(value, Path) else value) for key, value in vars(args).items()},
+        "seed_seconds": round(seed_seconds, 3),
+        "endpoints": results,
+    }
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nresults written to {output}")
+    if baseline:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+microbenchmark for access token verification
+
+times the three ways decode_access_token can verify the same token, per call and per request
+through a throwaway ASGI app whose only dependency is the bearer token check (no database):
+
+    jose      python-jose jwt.decode + TokenData (decode_access_token_jose, the old path)
+    hs256     verify_hs256 with the precomputed HMAC key, no cache
+    cached    decode_access_token, token cache hit
+
+    python -m benchmarks.auth_bench --calls 20000 --requests 2000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def verifiers() -> dict:
+    from app.core.security import decode_access_token, decode_access_token_jose, verify_hs256
+
+    return {"jose": decode_access_token_jose, "hs256": verify_hs256, "cached": decode_access_token}
+
+def time_calls(verify, token: str, calls: int) -> float:
+    """mean microseconds per call"""
+    verify(token)
+    started = time.perf_counter()
+    for _ in range(calls):
+        verify(token)
+    return (time.perf_counter() - started) / calls * 1e6
+
+def build_app(verify):
+    from fastapi import Depends, FastAPI, HTTPException
+    from fastapi.security import OAuth2PasswordBearer
+
+    scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+    app = FastAPI()
+
+    def current_subject(token: str = Depends(scheme)) -> str:
+        decoded = verify(token)
+        if decoded is None:
+            raise HTTPException(status_code=401)
+        return decoded.sub
+
+    @app.get("/ping")
+    def ping(subject: str = Depends(current_subject)):
+        return {"sub": subject}
+    return app
+
+def time_requests(app, token: str, requests: int, warmup: int) -> list[float]:
+    from fastapi.testclient import TestClient
+
+    headers = {"Authorization": f"Bearer {token}"}
+    with TestClient(app) as client:
+        for _ in range(warmup):
+            client.get("/ping", headers=headers)
+        samples = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get("/ping", headers=headers)
+            samples.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise SystemExit(f"token rejected: {response.status_code}")
+    return samples
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="access token verification microbenchmark")
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--output", type=Path, default=None, help="also write the results as JSON")
+    args = parser.parse_args()
+    sys.path.insert(0, str(REPO_ROOT))
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+
+    from app.core.security import create_access_token
+
+    token = create_access_token(subject="bench@example.com")
+    results = {}
+    for name, verify in verifiers().items():
+        per_call_us = time_calls(verify, token, args.calls)
+        ms = [value * 1000 for value in time_requests(build_app(verify), token, args.requests, args.warmup)]
+        results[name] = {"call_us": round(per_call_us, 2),
+                         "request_p50_ms": round(statistics.median(ms), 4),
+                         "request_mean_ms": round(statistics.fmean(ms), 4)}
+
+    baseline = results["jose"]
+    print(f"{args.calls} calls, {args.requests} requests per path")
+    for name, stats in results.items():
+        stats["call_speedup"] = round(baseline["call_us"] / stats["call_us"], 2) if stats["call_us"] else 0.0
+        stats["saved_per_request_us"] = round(baseline["call_us"] - stats["call_us"], 2)
+        print(f"{name:<8} verify {stats['call_us']:>8.2f} us (x{stats['call_speedup']:.1f})"
+              f"  request p50 {stats['request_p50_ms']:>7.3f} ms  mean {stats['request_mean_ms']:>7.3f} ms")
+    if args.output:
+        args.output.write_text(json.dumps({"calls": args.calls, "requests": args.requests, "paths": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+microbenchmark for list response serialization
+
+serves the same page of N TransactionRead rows from three throwaway apps and times full
+requests through the ASGI stack (no database, no network):
+
+    response_model   ORM objects -> TransactionPage -> response_model validation -> stdlib json
+    orjson_class     the same, rendered by ORJSONResponse (FAST_JSON default response class)
+    typeadapter      column tuples -> prebuilt TypeAdapter.dump_json (FAST_JSON list endpoints)
+
+    python -m benchmarks.serialization_bench --rows 10000 --repeat 30
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def build_rows(count: int) -> tuple[list, list]:
+    """the same data as transient ORM objects and as named tuples shaped like TRANSACTION_ROW_COLUMNS (amount in cents)"""
+    import app.init_db  # noqa: F401 - registers every model so the mappers configure
+    from app.models.transactions import Transaction
+
+    Row = namedtuple("Row", ("amount", "txn_type", "desc", "transaction_date", "id", "created_at"))
+    now = datetime(2026, 1, 1)
+    rows = [Row(amount=100 + n % 50000, txn_type="income" if n % 3 else "outcome",
+                desc=f"transaction {n}", transaction_date=now - timedelta(minutes=n), id=n + 1, created_at=now)
+            for n in range(count)]
+    return [Transaction(user_id=1, amount_cents=row.amount, txn_type=row.txn_type, desc=row.desc,
+                        transaction_date=row.transaction_date, id=row.id, created_at=row.created_at)
+            for row in rows], rows
+
+def build_apps(orm_rows: list, tuple_rows: list) -> dict:
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse, ORJSONResponse
+
+    from app.core.serialization import TRANSACTION_PAGE, json_response, row_dicts
+    from app.schemas.transaction import TransactionPage
+
+    def response_model_app(response_class):
+        app = FastAPI(default_response_class=response_class)
+
+        @app.get("/transactions", response_model=TransactionPage)
+        def page():
+            return TransactionPage(items=orm_rows, next_cursor=None)
+        return app
+
+    fast = FastAPI()
+
+    @fast.get("/transactions", response_model=TransactionPage)
+    def fast_page():
+        return json_response(TRANSACTION_PAGE, {"items": row_dicts(tuple_rows), "next_cursor": None})
+
+    return {
+        "response_model": response_model_app(JSONResponse),
+        "orjson_class": response_model_app(ORJSONResponse),
+        "typeadapter": fast,
+    }
+
+def time_requests(app, repeat: int, warmup: int) -> tuple[list[float], bytes]:
+    from fastapi.testclient import TestClient
+
+    with TestClient(app) as client:
+        for _ in range(warmup):
+            body = client.get("/transactions").content
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = client.get("/transactions").content
+            samples.append(time.perf_counter() - started)
+    return samples, body
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="list response serialization microbenchmark")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=None, help="also write the results as JSON")
+    args = parser.parse_args()
+    sys.path.insert(0, str(REPO_ROOT))
+
+    orm_rows, tuple_rows = build_rows(args.rows)
+    results = {}
+    bodies = {}
+    for name, app in build_apps(orm_rows, tuple_rows).items():
+        samples, bodies[name] = time_requests(app, args.repeat, args.warmup)
+        ms = [value * 1000 for value in samples]
+        results[name] = {"mean_ms": round(statistics.fmean(ms), 3),
+                         "p50_ms": round(statistics.median(ms), 3),
+                         "min_ms": round(min(ms), 3),
+                         "bytes": len(bodies[name])}
+
+    #every path has to produce the same document for the comparison to mean anything
+    expected = json.loads(bodies["response_model"])
+    for name, body in bodies.items():
+        if json.loads(body) != expected:
+            raise SystemExit(f"{name} produced a different response body")
+
+    baseline = results["response_model"]["p50_ms"]
+    print(f"{args.rows} rows, {args.repeat} requests per path")
+    for name, stats in results.items():
+        stats["speedup"] = round(baseline / stats["p50_ms"], 2) if stats["p50_ms"] else 0.0
+        print(f"{name:<16} p50 {stats['p50_ms']:>9.2f} ms  mean {stats['mean_ms']:>9.2f} ms"
+              f"  min {stats['min_ms']:>9.2f} ms  x{stats['speedup']:.2f}")
+    if args.output:
+        args.output.write_text(json.dumps({"rows": args.rows, "repeat": args.repeat, "paths": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+#settings and the engines are built when app is first imported, point them at a scratch database
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["SHARD_COUNT"] = "0"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import pytest
+
+from app.db.base import Base
+from app.db.session import SessionLocal, writer_engine
+from app.init_db import init_db
+from app.models.user import User
+
+
+@pytest.fixture(scope="session")
+def schema():
+    init_db()
+
+@pytest.fixture
+def db(schema):
+    session = SessionLocal()
+    yield session
+    session.close()
+    with writer_engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+@pytest.fixture
+def user_id(db) -> int:
+    user = User(email="tests@example.com", hashed_password="x", is_active=True)
+    db.add(user)
+    db.commit()
+    return user.id
@@ -0,0 +1,70 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.core.analytics import compute_analytics
+
+
+def flows(*rows: tuple[str, int, bool]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    days, amounts, is_income = zip(*rows) if rows else ((), (), ())
+    return (np.array(days, dtype="datetime64[D]"), np.array(amounts, dtype=np.int64),
+            np.array(is_income, dtype=bool))
+
+def analytics(*rows, as_of=date(2026, 3, 15), window_days=30, horizon_days=7):
+    return compute_analytics(*flows(*rows), as_of=as_of, window_days=window_days, horizon_days=horizon_days)
+
+
+def test_empty_history():
+    result = analytics()
+    assert result.balance == 0 and result.window_days == 1
+    assert result.income_rate_daily == result.burn_rate_daily == result.trend_per_day == 0
+    assert result.runway_days is None
+    assert [(point.day, point.balance, point.avg_7d) for point in result.daily] == [(date(2026, 3, 15), 0, None)]
+    #2026-03-15 is a sunday
+    assert [(point.week_start, point.balance) for point in result.weekly] == [(date(2026, 3, 9), 0)]
+    assert [point.balance for point in result.projection] == [0] * 7
+
+def test_single_day():
+    result = analytics(("2026-03-15", 10000, True), ("2026-03-15", 2550, False), window_days=90)
+    assert result.balance == 74.5 and result.window_days == 1
+    assert result.income_rate_daily == 100 and result.burn_rate_daily == 25.5
+    assert result.daily[0].net == 74.5 and result.daily[0].avg_30d is None
+    assert result.projection[-1].balance == 74.5
+
+def test_window_is_trailing_and_keeps_older_balance():
+    result = analytics(("2025-01-01", 100000, True), ("2026-03-10", 20000, False))
+    assert result.window_days == 30
+    assert result.daily[0].day == date(2026, 2, 14) and result.daily[0].balance == 1000
+    assert result.balance == 800
+    assert result.burn_rate_daily == pytest.approx(200 / 30, abs=0.01)
+    #weeks start on the monday on or before the window start, not at the start of the history
+    assert result.weekly[0].week_start == date(2026, 2, 9) and result.weekly[0].balance == 1000
+    assert result.weekly[-1].week_start == date(2026, 3, 9) and result.weekly[-1].balance == 800
+    assert len(result.weekly) == 5
+
+def test_future_dated_rows_are_left_out():
+    past = analytics(("2026-03-01", 5000, True))
+    result = analytics(("2026-03-01", 5000, True), ("2027-01-01", 999900, False), ("2100-01-01", 1, True))
+    assert result == past
+    assert result.balance == 50 and result.daily[-1].day == date(2026, 3, 15)
+    assert result.weekly[-1].week_start == date(2026, 3, 9)
+
+def test_runway_and_projection():
+    #1000 in on day one, then 10 spent every day of the window
+    rows = [("2026-02-14", 100000, True)] + [(str(np.datetime64("2026-02-14") + day), 1000, False)
+                                             for day in range(30)]
+    result = analytics(*rows)
+    assert result.balance == 700
+    assert result.burn_rate_daily == 10 and result.income_rate_daily == pytest.approx(33.33)
+    assert result.runway_days is None #income over the window still covers the burn
+
+    result = analytics(*rows[1:], ("2025-12-01", 100000, True))
+    assert result.balance == 700 and result.runway_days == 70
+    assert result.trend_per_day == -10
+    assert [point.day for point in result.projection][:2] == [date(2026, 3, 16), date(2026, 3, 17)]
+    assert [point.balance for point in result.projection] == [690, 680, 670, 660, 650, 640, 630]
+
+def test_overdrawn_balance_has_no_runway_left():
+    result = analytics(("2026-03-10", 5000, False))
+    assert result.balance == -50 and result.runway_days == 0
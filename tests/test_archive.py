@@ -0,0 +1,101 @@
+from datetime import date, datetime
+
+from sqlalchemy import insert, select
+
+from app.crud.archive import archive_user, archive_user_month, delete_archived_row, restore_partitions
+from app.crud.transactions import decode_cursor, delete_transaction, insert_transaction_rows, iter_transaction_rows, \
+    list_transactions, transaction_row
+from app.models.monthly_rollup import MonthlyRollup
+from app.models.transaction_archive import TransactionArchive
+from app.models.transactions import Transaction
+from app.schemas.transaction import TransactionFilter
+
+
+def add_rows(db, user_id: int, *days: datetime) -> list[int]:
+    ids = insert_transaction_rows(db, [transaction_row(f"row {day:%Y-%m-%d}", 1000, "outcome", day, user_id)
+                                       for day in days])
+    db.commit()
+    return ids
+
+def page_ids(db, user_id: int) -> list[int]:
+    items, _ = list_transactions(db, user_id, limit=100)
+    return [item.id for item in items]
+
+def all_pages(db, user_id: int, filters: TransactionFilter | None = None, limit: int = 2) -> list[tuple]:
+    seen, after = [], None
+    while True:
+        items, cursor = list_transactions(db, user_id, filters, after=after, limit=limit)
+        seen.extend((item.id, item.transaction_date, item.txn_type, item.amount_cents, item.desc) for item in items)
+        if cursor is None:
+            return seen
+        after = decode_cursor(cursor)
+
+def exported(db, user_id: int, filters: TransactionFilter | None = None) -> list[tuple]:
+    return [tuple(row) for chunk in iter_transaction_rows(db, user_id, filters, chunk_size=3) for row in chunk]
+
+def partition_count(db, user_id: int) -> int:
+    return len(db.execute(select(TransactionArchive.month).where(TransactionArchive.user_id == user_id)).all())
+
+
+def test_archived_ids_are_not_handed_out_again(db, user_id):
+    old_ids = add_rows(db, user_id, datetime(2024, 1, 5), datetime(2024, 1, 6))
+    assert archive_user_month(db, user_id, date(2024, 1, 1)).rows == 2
+    #the archived rows held the highest ids, the hot table is empty now
+    new_id, = add_rows(db, user_id, datetime(2026, 1, 5))
+    assert new_id > max(old_ids)
+    assert page_ids(db, user_id) == [new_id, old_ids[1], old_ids[0]]
+
+    assert delete_transaction(db, new_id, user_id)
+    assert page_ids(db, user_id) == [old_ids[1], old_ids[0]]
+    assert delete_transaction(db, old_ids[1], user_id)
+    assert page_ids(db, user_id) == [old_ids[0]]
+
+def test_list_and_export_merge_partitions(db, user_id):
+    add_rows(db, user_id, datetime(2024, 1, 5), datetime(2024, 1, 5), datetime(2024, 2, 10),
+             datetime(2024, 3, 1), datetime(2024, 3, 31, 23), datetime(2026, 1, 5))
+    insert_transaction_rows(db, [transaction_row("pay", 50000, "income", datetime(2024, 2, 1), user_id)])
+    db.commit()
+    only_2024 = TransactionFilter(date_from=datetime(2024, 1, 5, 12), date_to=datetime(2024, 12, 31))
+    only_income = TransactionFilter(txn_type="income")
+    before = [(all_pages(db, user_id, filters), exported(db, user_id, filters))
+              for filters in (None, only_2024, only_income)]
+
+    assert [written.rows for written in archive_user(db, user_id, before=date(2024, 4, 1))] == [2, 2, 2]
+    assert db.execute(select(Transaction.id)).scalars().all() == [before[0][0][0][0]]
+    assert [(all_pages(db, user_id, filters), exported(db, user_id, filters))
+            for filters in (None, only_2024, only_income)] == before
+    assert len(before[0][0]) == 7 and len(before[1][0]) == 4 and len(before[2][1]) == 1
+
+def test_restore_keeps_ids_unless_taken(db, user_id):
+    kept_id, taken_id = add_rows(db, user_id, datetime(2024, 1, 5), datetime(2024, 1, 6))
+    archive_user_month(db, user_id, date(2024, 1, 1))
+    #a row that got the archived id in the meantime, e.g. restored from elsewhere with an explicit id
+    db.execute(insert(Transaction), [{"id": taken_id, "user_id": user_id, "amount_cents": 1, "txn_type": "income",
+                                      "desc": "squatter", "transaction_date": datetime(2026, 1, 1)}])
+    db.commit()
+
+    assert restore_partitions(db, user_id) == 2
+    assert partition_count(db, user_id) == 0
+    restored = {row.desc: row.id for row in db.execute(select(Transaction)).scalars()}
+    assert restored["row 2024-01-05"] == kept_id
+    assert restored["squatter"] == taken_id
+    assert restored["row 2024-01-06"] not in (kept_id, taken_id)
+
+def test_delete_archived_row(db, user_id):
+    first_id, second_id = add_rows(db, user_id, datetime(2024, 1, 5), datetime(2024, 1, 6))
+    archive_user_month(db, user_id, date(2024, 1, 1))
+    assert delete_archived_row(db, user_id, txn_id=10**9) is None
+
+    deleted = delete_archived_row(db, user_id, first_id)
+    db.commit()
+    assert (deleted.id, deleted.amount_cents, deleted.transaction_date) == (first_id, 1000, datetime(2024, 1, 5))
+    partition = db.get(TransactionArchive, (user_id, date(2024, 1, 1)))
+    assert partition.row_count == 1
+
+    #through the API path the rollups follow, and the emptied partition goes away
+    assert delete_transaction(db, second_id, user_id)
+    assert not delete_transaction(db, second_id, user_id)
+    assert partition_count(db, user_id) == 0 and page_ids(db, user_id) == []
+    rollup = db.execute(select(MonthlyRollup.total_cents, MonthlyRollup.count)
+                        .where(MonthlyRollup.user_id == user_id)).one()
+    assert tuple(rollup) == (1000, 1)
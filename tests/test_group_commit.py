@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.core.group_commit import GroupCommitBuffer
+from app.crud.transactions import transaction_row, write_transaction_batch
+from app.models.monthly_rollup import MonthlyRollup
+from app.models.transactions import Transaction
+
+
+def row(user_id: int, n: int, **changes) -> dict:
+    return {**transaction_row(f"row {n}", 100 + n, "outcome", datetime(2026, 1, 1 + n % 28), user_id), **changes}
+
+def stored(db) -> dict[str, tuple[int, int]]:
+    return {desc: (txn_id, amount) for txn_id, desc, amount in
+            db.execute(select(Transaction.id, Transaction.desc, Transaction.amount_cents))}
+
+
+def test_concurrent_inserts_get_their_own_ids(db, user_id):
+    buffer = GroupCommitBuffer(partial(write_transaction_batch, 0), window_seconds=0.005, max_batch=64)
+    try:
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            ids = list(pool.map(lambda n: buffer.insert(row(user_id, n)), range(500)))
+    finally:
+        buffer.close()
+
+    assert len(set(ids)) == 500
+    rows = stored(db)
+    assert {desc: txn_id for desc, (txn_id, _) in rows.items()} == {f"row {n}": ids[n] for n in range(500)}
+    total, count = db.execute(select(MonthlyRollup.total_cents, MonthlyRollup.count)
+                              .where(MonthlyRollup.user_id == user_id)).one()
+    assert (total, count) == (sum(100 + n for n in range(500)), 500)
+
+def test_bad_row_fails_only_its_own_future(db, user_id):
+    batches = []
+    def write(rows):
+        batches.append(len(rows))
+        return write_transaction_batch(0, rows)
+    #a long window so every row lands in the first batch
+    buffer = GroupCommitBuffer(write, window_seconds=0.5, max_batch=5)
+    try:
+        futures = [buffer.submit(row(user_id, n, desc=None) if n == 2 else row(user_id, n)) for n in range(5)]
+        with pytest.raises(IntegrityError):
+            futures[2].result(timeout=10)
+        ids = [future.result(timeout=10) for n, future in enumerate(futures) if n != 2]
+    finally:
+        buffer.close()
+
+    assert batches == [5, 1, 1, 1, 1, 1]
+    assert sorted(txn_id for txn_id, _ in stored(db).values()) == sorted(ids)
+    assert db.execute(select(MonthlyRollup.count).where(MonthlyRollup.user_id == user_id)).scalar() == 4
+
+def test_close_drains_the_queue(db, user_id):
+    buffer = GroupCommitBuffer(partial(write_transaction_batch, 0), window_seconds=30, max_batch=1000)
+    futures = [buffer.submit(row(user_id, n)) for n in range(20)]
+    started = time.perf_counter()
+    buffer.close()
+    #flushed on close rather than after the window
+    assert time.perf_counter() - started < 10
+    assert all(future.done() for future in futures)
+    assert sorted(future.result() for future in futures) == sorted(txn_id for txn_id, _ in stored(db).values())
+
+    #a closed buffer starts a new flusher when used again
+    buffer.window_seconds = 0
+    assert buffer.insert(row(user_id, 20)) in {txn_id for txn_id, _ in stored(db).values()}
+    buffer.close()
@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+import pytest
+
+from app.core.money import MAX_CENTS, cents_to_decimal, cents_to_number, to_cents
+
+
+@pytest.mark.parametrize("value, cents", [
+    ("19.99", 1999),
+    (19.99, 1999),
+    (Decimal("0.10"), 10),
+    (12, 1200),
+    (" 7.5 ", 750),
+    ("1E2", 10000),
+    ("1.5e1", 1500),
+    ("0.00", 0),
+    ("-5.50", -550),
+    (-0.01, -1),
+])
+def test_to_cents(value, cents):
+    assert to_cents(value) == cents
+
+@pytest.mark.parametrize("value", ["12.345", "0.001", 0.125, "1e-3", "1e-30"])
+def test_to_cents_rejects_more_than_two_places(value):
+    with pytest.raises(ValueError, match="two decimal places"):
+        to_cents(value)
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan", "NaN", float("inf"), float("nan")])
+def test_to_cents_rejects_non_finite(value):
+    with pytest.raises(ValueError, match="finite"):
+        to_cents(value)
+
+@pytest.mark.parametrize("value", ["abc", "", "1,000", None, True, object()])
+def test_to_cents_rejects_non_numbers(value):
+    with pytest.raises(ValueError, match="must be a number"):
+        to_cents(value)
+
+def test_to_cents_max_boundary():
+    largest = cents_to_decimal(MAX_CENTS - 1)
+    assert to_cents(str(largest)) == MAX_CENTS - 1
+    assert to_cents(str(-largest)) == -(MAX_CENTS - 1)
+    for value in (str(cents_to_decimal(MAX_CENTS)), str(-cents_to_decimal(MAX_CENTS))):
+        with pytest.raises(ValueError, match="too large"):
+            to_cents(value)
+
+@pytest.mark.parametrize("value", ["1e30", "-1e30", "1e13", 1e300, "99999999999999999999999999999.99"])
+def test_to_cents_huge_amounts_are_value_errors(value):
+    #past the decimal context precision quantize raises InvalidOperation, which pydantic would not catch
+    with pytest.raises(ValueError, match="too large"):
+        to_cents(value)
+
+def test_cents_round_trip():
+    assert cents_to_decimal(1999) == Decimal("19.99")
+    assert cents_to_number(1999) == 19.99
+    assert to_cents(cents_to_decimal(-123456)) == -123456
@@ -0,0 +1,105 @@
+from datetime import datetime
+from itertools import islice
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.recurrence import iter_occurrences, parse_rrule
+from app.crud.recurring import _due_occurrences, next_due
+
+
+def occurrences(rrule: str, dtstart: datetime, start: datetime | None = None, n: int = 6) -> list[str]:
+    return [value.isoformat() for value in islice(iter_occurrences(parse_rrule(rrule), dtstart, start), n)]
+
+
+def test_monthly_skips_months_without_the_day():
+    assert occurrences("FREQ=MONTHLY", datetime(2026, 1, 31, 9)) == [
+        "2026-01-31T09:00:00", "2026-03-31T09:00:00", "2026-05-31T09:00:00",
+        "2026-07-31T09:00:00", "2026-08-31T09:00:00", "2026-10-31T09:00:00"]
+
+def test_bymonthday_last_day_of_month():
+    assert occurrences("FREQ=MONTHLY;BYMONTHDAY=-1", datetime(2024, 1, 15), n=4) == [
+        "2024-01-31T00:00:00", "2024-02-29T00:00:00", "2024-03-31T00:00:00", "2024-04-30T00:00:00"]
+    assert occurrences("FREQ=MONTHLY;BYMONTHDAY=1,-1", datetime(2026, 1, 31), n=4) == [
+        "2026-01-31T00:00:00", "2026-02-01T00:00:00", "2026-02-28T00:00:00", "2026-03-01T00:00:00"]
+
+def test_bymonthday_31_with_interval():
+    #january, april (no 31st), july, october
+    assert occurrences("FREQ=MONTHLY;INTERVAL=3;BYMONTHDAY=31", datetime(2026, 1, 1), n=3) == [
+        "2026-01-31T00:00:00", "2026-07-31T00:00:00", "2026-10-31T00:00:00"]
+
+def test_impossible_rule_ends():
+    #every twelfth month from february never has a 30th
+    assert occurrences("FREQ=MONTHLY;INTERVAL=12;BYMONTHDAY=30", datetime(2026, 2, 1)) == []
+
+def test_weekly_byday_interval():
+    assert occurrences("FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR", datetime(2026, 1, 7, 8), n=4) == [
+        "2026-01-09T08:00:00", "2026-01-19T08:00:00", "2026-01-23T08:00:00", "2026-02-02T08:00:00"]
+
+def test_resume_from_start_keeps_the_interval_grid():
+    dtstart = datetime(2026, 1, 15)
+    everything = occurrences("FREQ=MONTHLY;INTERVAL=2", dtstart, n=12)
+    later = occurrences("FREQ=MONTHLY;INTERVAL=2", dtstart, datetime(2026, 4, 20), n=4)
+    assert later == [value for value in everything if value >= "2026-04-20"][:4]
+
+def test_yearly_leap_day():
+    assert occurrences("FREQ=YEARLY", datetime(2024, 2, 29), n=3) == [
+        "2024-02-29T00:00:00", "2028-02-29T00:00:00", "2032-02-29T00:00:00"]
+
+def test_until_date_includes_the_whole_day():
+    assert occurrences("FREQ=DAILY;INTERVAL=3;UNTIL=20260110", datetime(2026, 1, 1, 18), n=10) == [
+        "2026-01-01T18:00:00", "2026-01-04T18:00:00", "2026-01-07T18:00:00", "2026-01-10T18:00:00"]
+
+def test_until_datetime():
+    assert occurrences("FREQ=DAILY;UNTIL=20260103T120000Z", datetime(2026, 1, 1, 12), n=10) == [
+        "2026-01-01T12:00:00", "2026-01-02T12:00:00", "2026-01-03T12:00:00"]
+
+def test_count_is_parsed_and_left_to_the_materializer():
+    rule = parse_rrule("FREQ=WEEKLY;COUNT=3")
+    assert rule.count == 3
+    assert len(occurrences("FREQ=WEEKLY;COUNT=3", datetime(2026, 1, 1), n=5)) == 5
+
+def test_parse_normalizes():
+    rule = parse_rrule("RRULE:freq=weekly;byday=fr,mo,fr;interval=2")
+    assert (rule.freq, rule.interval, rule.by_day) == ("WEEKLY", 2, (0, 4))
+
+@pytest.mark.parametrize("text, reason", [
+    ("FREQ=HOURLY", "FREQ must be one of"),
+    ("INTERVAL=2", "FREQ must be one of"),
+    ("FREQ=DAILY;BYDAY=MO", "only supported with FREQ=WEEKLY"),
+    ("FREQ=WEEKLY;BYMONTHDAY=1", "only supported with FREQ=MONTHLY"),
+    ("FREQ=MONTHLY;BYMONTHDAY=0", "BYMONTHDAY days"),
+    ("FREQ=MONTHLY;BYMONTHDAY=32", "BYMONTHDAY days"),
+    ("FREQ=WEEKLY;BYDAY=1MO", "BYDAY takes"),
+    ("FREQ=DAILY;COUNT=0", "COUNT must be at least 1"),
+    ("FREQ=DAILY;INTERVAL=0", "INTERVAL must be at least 1"),
+    ("FREQ=DAILY;COUNT=2;UNTIL=20260101", "cannot be combined"),
+    ("FREQ=DAILY;UNTIL=2026-01-01", "UNTIL must be"),
+    ("FREQ=DAILY;BYSETPOS=1", "unsupported rule parts: BYSETPOS"),
+    ("FREQ=YEARLY;BYMONTH=3", "unsupported rule parts: BYMONTH"),
+    ("garbage", "expected NAME=VALUE"),
+])
+def test_rejected_rules(text, reason):
+    with pytest.raises(ValueError, match=reason):
+        parse_rrule(text)
+
+def test_count_limits_materialization():
+    dtstart = datetime(2026, 1, 1)
+    schedule = parse_rrule("FREQ=DAILY;COUNT=3")
+    assert next_due(schedule, dtstart, occurrences=0) == dtstart
+    assert next_due(schedule, dtstart, occurrences=3) is None
+
+    rule = SimpleNamespace(rrule="FREQ=DAILY;COUNT=3", dtstart=dtstart, next_due_at=dtstart, occurrences=0)
+    due, following = _due_occurrences(rule, now=datetime(2026, 2, 1), limit=100)
+    assert [value.day for value in due] == [1, 2, 3] and following is None
+    #two already written, one left
+    rule.next_due_at, rule.occurrences = datetime(2026, 1, 3), 2
+    assert _due_occurrences(rule, now=datetime(2026, 2, 1), limit=100) == ([datetime(2026, 1, 3)], None)
+
+def test_catch_up_stops_at_now_and_limit():
+    dtstart = datetime(2026, 1, 1, 9)
+    rule = SimpleNamespace(rrule="FREQ=DAILY", dtstart=dtstart, next_due_at=dtstart, occurrences=0)
+    due, following = _due_occurrences(rule, now=datetime(2026, 1, 5, 8), limit=100)
+    assert len(due) == 4 and following == datetime(2026, 1, 5, 9)
+    due, following = _due_occurrences(rule, now=datetime(2026, 1, 5, 8), limit=2)
+    assert len(due) == 2 and following == datetime(2026, 1, 3, 9)